@@ -2,6 +2,12 @@
 
 from .davclient import DAVClient
 from .objects import *
+from .lib.uidindex import UidIndex
+from .backup import Archive
+from .migrate import Migration
+from .outbox import Outbox
+from .vdir import VdirSync
+from .writebehind import WriteBehind
 
 # possibly a bug in the tBaxter fork of vobject, this one has to be
 # imported explicitly to make sure the attribute behaviour gets
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+"""
+Incremental backups of the calendars of principals to a local archive.
+
+The archive is a SQLite database holding, for each calendar, its ctag,
+and for each object its URL, etag and zlib compressed data.  A backup
+run skips the calendars whose ctag did not change; for the others, it
+lists the etags of the objects and only downloads the new or changed
+objects, with calendar-multiget batches.  One archive can hold the
+backups of many principals, on many servers: calendars and objects are
+recorded by full URL.
+"""
+
+import sqlite3
+import time
+import zlib
+
+from aiocaldav.lib import error
+from aiocaldav.lib.concurrency import (BulkResult, ItemResult, chunked,
+                                       gather_bounded, run_bulk)
+
+# returned by Archive._put() for the objects already present
+_PRESENT = object()
+
+
+class BackupReport:
+    """
+    Counts of a backup run: `calendars` seen, `unchanged` calendars
+    skipped thanks to their ctag, objects `fetched` and objects
+    `deleted` from the archive.
+    """
+    __slots__ = ('calendars', 'unchanged', 'fetched', 'deleted', 'elapsed')
+
+    def __init__(self):
+        self.calendars = 0
+        self.unchanged = 0
+        self.fetched = 0
+        self.deleted = 0
+        self.elapsed = 0.0
+
+    def __str__(self):
+        return ("%d calendars (%d unchanged), %d objects fetched, "
+                "%d deleted in %.1fs" % (
+                    self.calendars, self.unchanged, self.fetched,
+                    self.deleted, self.elapsed))
+
+
+class Archive:
+    """
+    Local backup archive.
+
+    Usage:
+
+        archive = Archive("backups.db")
+        report = await archive.backup(principal)
+        ...
+        await archive.restore(principal)
+
+    Parameters:
+     * path: file name of the SQLite database
+     * concurrency: calendars backed up at a time
+     * batch_size: objects per calendar-multiget
+    """
+
+    def __init__(self, path, concurrency=4, batch_size=50):
+        self.path = path
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self._db = sqlite3.connect(path)
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS calendars ("
+                " href TEXT PRIMARY KEY,"
+                " principal TEXT NOT NULL,"
+                " name TEXT,"
+                " ctag TEXT,"
+                " backed_up REAL)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS objects ("
+                " href TEXT PRIMARY KEY,"
+                " calendar TEXT NOT NULL,"
+                " etag TEXT,"
+                " data BLOB NOT NULL)")
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS objects_calendar"
+                " ON objects (calendar)")
+
+    def close(self):
+        self._db.close()
+
+    def calendars(self, principal):
+        """
+        Returns:
+         * [(URL, name), ...] of the archived calendars of `principal`
+        """
+        return list(self._db.execute(
+            "SELECT href, name FROM calendars WHERE principal = ?"
+            " ORDER BY href", (str(principal.url), )))
+
+    def objects(self, href):
+        """
+        Iterate over the archived objects of the calendar of URL `href`.
+
+        Returns:
+         * iterator of (URL, data)
+        """
+        for obj_href, data in self._db.execute(
+                "SELECT href, data FROM objects WHERE calendar = ?"
+                " ORDER BY href", (href, )):
+            yield obj_href, zlib.decompress(data).decode('utf-8')
+
+    async def backup(self, principal):
+        """
+        Back up all the calendars of `principal`.  Calendars removed
+        from the server are removed from the archive as well.
+
+        Returns:
+         * BackupReport()
+        """
+        report = BackupReport()
+        started = time.perf_counter()
+        calendars = await principal.calendars()
+        report.calendars = len(calendars)
+        await gather_bounded(
+            [self._backup_calendar(principal, c, report) for c in calendars],
+            self.concurrency)
+        current = set(str(c.url) for c in calendars)
+        with self._db:
+            for href, _ in self.calendars(principal):
+                if href not in current:
+                    self._db.execute(
+                        "DELETE FROM objects WHERE calendar = ?", (href, ))
+                    self._db.execute(
+                        "DELETE FROM calendars WHERE href = ?", (href, ))
+        report.elapsed = time.perf_counter() - started
+        return report
+
+    async def _backup_calendar(self, principal, calendar, report):
+        href = str(calendar.url)
+        ctag = await calendar.get_ctag()
+        row = self._db.execute(
+            "SELECT ctag FROM calendars WHERE href = ?", (href, )).fetchone()
+        if ctag is not None and row is not None and row[0] == ctag:
+            report.unchanged += 1
+            return
+        archived = dict(self._db.execute(
+            "SELECT href, etag FROM objects WHERE calendar = ?", (href, )))
+        etags = {str(calendar.url.join(h)): etag
+                 for h, etag in (await calendar.etags()).items()}
+        changed = sorted(h for h, etag in etags.items()
+                         if etag is None or archived.get(h) != etag)
+        for batch in chunked(changed, self.batch_size):
+            objects = await calendar.objects_by_urls(batch)
+            with self._db:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?)",
+                    [(str(o.url), href, o.etag,
+                      zlib.compress(o.data.encode('utf-8')))
+                     for o in objects])
+            report.fetched += len(objects)
+        deleted = [(h, ) for h in archived if h not in etags]
+        with self._db:
+            self._db.executemany("DELETE FROM objects WHERE href = ?",
+                                 deleted)
+            self._db.execute(
+                "INSERT OR REPLACE INTO calendars VALUES (?, ?, ?, ?, ?)",
+                (href, str(principal.url), calendar.name, ctag, time.time()))
+        report.deleted += len(deleted)
+
+    async def restore(self, principal, source=None, concurrency=8):
+        """
+        Recreate the archived calendars of `source` for `principal`,
+        with the same ids, names and object names.  Existing calendars
+        are reused; objects already present are left as they are and
+        reported as skipped.
+
+        Parameters:
+         * principal: Principal to restore to
+         * source: Principal whose backup to restore, by default
+           `principal` itself
+         * concurrency: PUTs in flight at a time
+
+        Returns:
+         * {calendar href: BulkResult()} of the PUTs per calendar
+        """
+        results = {}
+        for href, name in self.calendars(source or principal):
+            cal_id = href.rstrip('/').rsplit('/', 1)[1]
+            try:
+                await principal.make_calendar(name, cal_id)
+            except error.MkcalendarError:
+                pass # already there, reused
+            # the URL of the calendar made lacks the trailing slash
+            calendar = await principal.calendar(cal_id=cal_id)
+            results[href] = BulkResult(
+                ItemResult(r.item, skipped=True) if r.value is _PRESENT
+                else r for r in await run_bulk(
+                    lambda item, calendar=calendar: self._put(
+                        calendar, *item),
+                    self.objects(href), concurrency=concurrency))
+        return results
+
+    @staticmethod
+    async def _put(calendar, href, data):
+        r = await calendar.client.put(
+            calendar.url.join(href.rsplit('/', 1)[1]), data,
+            {"Content-Type": 'text/calendar; charset="utf-8"',
+             "If-None-Match": "*"})
+        if r.status == 412:
+            return _PRESENT
+        if r.status not in (201, 204):
+            raise error.PutError("%s: %s %s" % (href, r.status, r.reason))
+        return r.headers.get('ETag')
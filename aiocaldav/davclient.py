@@ -1,8 +1,10 @@
 #!/usr/bin/env python
 # -*- encoding: utf-8 -*-
 
+import asyncio
 import logging
 import re
+import threading
 from urllib.parse import unquote
 
 import aiohttp
@@ -16,17 +18,35 @@ from aiocaldav.objects import Principal
 
 log = logging.getLogger('caldav')
 
+_parsers = threading.local()
+_XML_START = re.compile(br'\s*<')
+_NOT_PARSED = object()
+
+
+def _xml_parser():
+    """
+    The XML parser for responses: entities are not resolved, nothing is
+    fetched from the network, and comments, processing instructions and
+    ids are not kept.  Parsers are reused, one per thread.
+    """
+    parser = getattr(_parsers, 'parser', None)
+    if parser is None:
+        parser = _parsers.parser = etree.XMLParser(
+            resolve_entities=False, no_network=True, remove_comments=True,
+            remove_pis=True, collect_ids=False)
+    return parser
+
 
 class DAVResponse:
     """
     This class is a response from a DAV request.  It is instantiated from
     the DAVClient class.  End users of the library should not need to
     know anything about this class.  Since we often get XML responses,
-    it tries to parse it into `self.tree`
+    the body is parsed into `self.tree` when that attribute is first
+    accessed, if the response content type is XML.
     """
     raw = ""
     reason = ""
-    tree = None
     headers = {}
     status = 0
 
@@ -35,6 +55,7 @@ class DAVResponse:
         self.headers = None
         self.status = None
         self.reason = None
+        self._tree = _NOT_PARSED
 
     async def load(self, response):
         """Asynchronously read the response content."""
@@ -42,17 +63,50 @@ class DAVResponse:
         self.headers = response.headers
         self.status = response.status
         self.reason = response.reason
-        log.debug("response headers: " + str(self.headers))
-        log.debug("response status: " + str(self.status))
-        log.debug("raw response: " + str(self.raw))
-        print("response headers: " + str(self.headers))
-        print("response status: " + str(self.status))
-        print("raw response: " + str(self.raw))
+        log.debug("response headers: %s", self.headers)
+        log.debug("response status: %s", self.status)
+        log.debug("raw response: %s", self.raw)
 
-        try:
-            self.tree = etree.XML(self.raw)
-        except etree.Error:
-            self.tree = None
+    def is_xml(self):
+        """
+        True if the content type of the response is XML.  Without a
+        content type, the body is checked for a leading '<'.
+        """
+        content_type = (self.headers or {}).get('Content-Type')
+        if content_type:
+            content_type = content_type.split(';', 1)[0].strip().lower()
+            return (content_type.endswith('/xml') or
+                    content_type.endswith('+xml'))
+        return bool(self.raw) and _XML_START.match(self.raw) is not None
+
+    def _parse(self):
+        if self.raw and self.is_xml():
+            try:
+                return etree.fromstring(self.raw, _xml_parser())
+            except etree.Error:
+                pass
+        return None
+
+    async def parse_in_executor(self, executor=None):
+        """
+        Parse the body in `executor` (default: the event loop's default
+        executor) rather than on the event loop thread, at the first
+        access of `self.tree`.  lxml releases the GIL while parsing, so
+        the loop keeps running meanwhile.
+        """
+        if self._tree is _NOT_PARSED:
+            loop = asyncio.get_running_loop()
+            self._tree = await loop.run_in_executor(executor, self._parse)
+
+    def _get_tree(self):
+        if self._tree is _NOT_PARSED:
+            self._tree = self._parse()
+        return self._tree
+
+    def _set_tree(self, tree):
+        self._tree = tree
+    tree = property(_get_tree, _set_tree,
+                    doc="lxml tree of the XML response body, or None")
 
 
 class DAVClient:
@@ -65,9 +119,21 @@ class DAVClient:
     """
     proxy = None
     url = None
+    parse_executor = None
+    xml_parse_threshold = 1 << 20
+    timeout = 30
+    session = None
+    # whether the server honours test="anyof" in calendar-query filters,
+    # None until found out, see Calendar._report_anyof()
+    supports_anyof = None
+    # optional aiocaldav.writebehind.WriteBehind buffering object saves
+    write_behind = None
+    # optional aiocaldav.outbox.Outbox keeping the writes made offline
+    outbox = None
 
     def __init__(self, url, proxy=None, username=None, password=None,
-                 auth=None, ssl_verify_cert=None):
+                 auth=None, ssl_verify_cert=None, parse_executor=None,
+                 xml_parse_threshold=1 << 20, timeout=30, session=None):
         """
         Sets up a HTTPConnection object towards the server in the url.
         Parameters:
@@ -76,6 +142,19 @@ class DAVClient:
          * username and password should be passed as arguments or in the URL
          * auth and ssl_verify_cert is passed to aiohttp.request.
          ** ssl_verify_cert can be None (default verify) or False or a ssl.SSLContext
+         * parse_executor: an optional concurrent.futures executor.  If
+           given, the calendar data of query results is parsed there
+           instead of on the event loop, in worker processes with a
+           ProcessPoolExecutor, see aiocaldav.lib.parsing.
+         * xml_parse_threshold: XML responses of at least this many bytes
+           are parsed in a thread pool, so that a huge multistatus does
+           not freeze the event loop.  None to always parse inline.
+         * timeout: total timeout of a request, in seconds.  None to
+           disable it.
+         * session: an optional aiohttp.ClientSession to send the
+           requests with, so that connections are kept alive and reused
+           between requests.  The caller owns it and closes it.  By
+           default, each request opens its own session.
         """
 
         log.debug("url: " + str(url))
@@ -110,6 +189,10 @@ class DAVClient:
         # TODO: it's possible to force through a specific auth method here,
         # but no test code for this.
         self.ssl_verify_cert = ssl_verify_cert
+        self.parse_executor = parse_executor
+        self.xml_parse_threshold = xml_parse_threshold
+        self.timeout = timeout
+        self.session = session
         self.url = self.url.unauth()
         log.debug("self.url: " + str(url))
 
@@ -206,11 +289,44 @@ class DAVClient:
         """
         return await self.request(url, "PUT", body, headers)
 
-    async def delete(self, url):
+    async def delete(self, url, headers={}):
         """
         Send a delete request.
         """
-        return await self.request(url, "DELETE")
+        return await self.request(url, "DELETE", headers=headers)
+
+    async def copy(self, url, destination, overwrite=False):
+        """
+        Send a copy request.
+
+        Parameters:
+         * url: source URL
+         * destination: target URL, on the same server
+         * overwrite: replace an existing target, or fail with 412
+
+        Returns
+         * DAVResponse
+        """
+        return await self.request(url, "COPY", headers={
+            "Destination": str(destination),
+            "Overwrite": "T" if overwrite else "F"})
+
+    async def move(self, url, destination, overwrite=False):
+        """
+        Send a move request, see copy().
+        """
+        return await self.request(url, "MOVE", headers={
+            "Destination": str(destination),
+            "Overwrite": "T" if overwrite else "F"})
+
+    async def _send(self, client, method, url, body, headers, proxy, auth,
+                    timeout):
+        r = await client.request(
+            method, url, data=to_wire(body), headers=headers, proxy=proxy,
+            auth=auth, ssl=self.ssl_verify_cert, timeout=timeout)
+        response = DAVResponse()
+        await response.load(r)
+        return response
 
     async def request(self, url, method="GET", body="", headers={}):
         """
@@ -233,11 +349,8 @@ class DAVClient:
         if body is None or body == "" and "Content-Type" in combined_headers:
             del combined_headers["Content-Type"]
 
-        log.debug(
-            "sending request - method={0}, url={1}, headers={2}\nbody:\n{3}"
-            .format(method, url, combined_headers, body))
-        print("sending request - method={0}, url={1}, headers={2}\nbody:\n{3}"
-              .format(method, url, combined_headers, body))
+        log.debug("sending request - method=%s, url=%s, headers=%s\nbody:\n%s",
+                  method, url, combined_headers, body)
         auth = None
         # digest auth is not (yet) supported by aiohttp, so skip it for now
         # if self.auth is None and self.username is not None:
@@ -259,16 +372,22 @@ class DAVClient:
             auth = aiohttp.BasicAuth(self.username, self.password)
         else:
             auth = self.auth
-        # TODO: Define total timeout in config ?
-        async with aiohttp.ClientSession(
-                timeout=aiohttp.ClientTimeout(total=30)) as client:
-            r = await client.request(
-                method, url, data=to_wire(body),
-                headers=combined_headers, proxy=proxy,
-                auth=auth, ssl=self.ssl_verify_cert)
-            response = DAVResponse()
-            await response.load(r)
-       
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        if self.session is not None:
+            response = await self._send(
+                self.session, method, url, body, combined_headers, proxy,
+                auth, timeout)
+        else:
+            async with aiohttp.ClientSession(timeout=timeout) as client:
+                response = await self._send(
+                    client, method, url, body, combined_headers, proxy,
+                    auth, timeout)
+
+        if (self.xml_parse_threshold is not None and
+                len(response.raw) >= self.xml_parse_threshold and
+                response.is_xml()):
+            await response.parse_in_executor()
+
         # this is an error condition the application wants to know
         if response.status in (401, 403):  # forbidden or unauthorized
             ex = error.AuthorizationError()
@@ -5,11 +5,19 @@ from lxml import etree
 from aiocaldav.lib.namespace import nsmap
 
 
-class BaseElement(object):
-    children = None
+class _SlottedElementType(type):
+    """
+    Metaclass giving every element class an empty __slots__ unless it
+    declares its own, so element instances never carry a __dict__.
+    """
+    def __new__(mcs, name, bases, namespace):
+        namespace.setdefault('__slots__', ())
+        return super().__new__(mcs, name, bases, namespace)
+
+
+class BaseElement(object, metaclass=_SlottedElementType):
+    __slots__ = ('children', 'attributes', 'value')
     tag = None
-    value = None
-    attributes = None
 
     def __init__(self, name=None, value=None):
         self.children = []
@@ -7,11 +7,22 @@ from aiocaldav.lib.namespace import ns
 from .base import BaseElement, NamedBaseElement, ValuedBaseElement
 
 
+def _time_value(value):
+    """datetimes are formatted, strings (i.e. template slots) kept as is"""
+    if isinstance(value, str):
+        return value
+    return timeToString(value)
+
+
 # Operations
 class CalendarQuery(BaseElement):
     tag = ns("C", "calendar-query")
 
 
+class CalendarMultiget(BaseElement):
+    tag = ns("C", "calendar-multiget")
+
+
 class FreeBusyQuery(BaseElement):
     tag = ns("C", "free-busy-query")
 
@@ -54,15 +65,24 @@ class TimeRange(BaseElement):
     def __init__(self, start=None, end=None):
         super(TimeRange, self).__init__()
         if start is not None:
-            self.attributes['start'] = timeToString(start)
+            self.attributes['start'] = _time_value(start)
         if end is not None:
-            self.attributes['end'] = timeToString(end)
+            self.attributes['end'] = _time_value(end)
 
 
 class NotDefined(BaseElement):
     tag = ns("C", "is-not-defined")
 
 
+# Result limits
+class Limit(BaseElement):
+    tag = ns("C", "limit")
+
+
+class NResults(ValuedBaseElement):
+    tag = ns("C", "nresults")
+
+
 # Components / Data
 class CalendarData(BaseElement):
     tag = ns("C", "calendar-data")
@@ -74,14 +94,39 @@ class Expand(BaseElement):
     def __init__(self, start, end=None):
         super(Expand, self).__init__()
         if start is not None:
-            self.attributes['start'] = timeToString(start)
+            self.attributes['start'] = _time_value(start)
         if end is not None:
-            self.attributes['end'] = timeToString(end)
+            self.attributes['end'] = _time_value(end)
+
+
+class LimitRecurrenceSet(Expand):
+    tag = ns("C", "limit-recurrence-set")
+
+
+class LimitFreebusySet(Expand):
+    tag = ns("C", "limit-freebusy-set")
 
 
 class Comp(NamedBaseElement):
     tag = ns("C", "comp")
 
+
+class AllComp(BaseElement):
+    tag = ns("C", "allcomp")
+
+
+class Prop(NamedBaseElement):
+    tag = ns("C", "prop")
+
+    def __init__(self, name=None, novalue=False):
+        super(Prop, self).__init__(name=name)
+        if novalue:
+            self.attributes['novalue'] = "yes"
+
+
+class AllProp(BaseElement):
+    tag = ns("C", "allprop")
+
 # Uhhm ... can't find any references to calendar-collection in rfc4791.txt
 # and newer versions of baikal gives 403 forbidden when this one is
 # encountered
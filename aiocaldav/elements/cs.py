@@ -0,0 +1,10 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+from aiocaldav.lib.namespace import ns
+from .base import ValuedBaseElement
+
+
+# Properties
+class GetCtag(ValuedBaseElement):
+    tag = ns("CS", "getctag")
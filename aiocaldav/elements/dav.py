@@ -45,6 +45,14 @@ class DisplayName(ValuedBaseElement):
     tag = ns("D", "displayname")
 
 
+class GetEtag(ValuedBaseElement):
+    tag = ns("D", "getetag")
+
+
+class SyncToken(ValuedBaseElement):
+    tag = ns("D", "sync-token")
+
+
 class Href(BaseElement):
     tag = ns("D", "href")
 
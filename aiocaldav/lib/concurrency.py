@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+"""
+Helpers to run many requests concurrently without flooding the server,
+and to report the outcome of bulk operations item by item.
+"""
+
+import asyncio
+
+
+async def gather_bounded(aws, concurrency=None):
+    """
+    Like asyncio.gather(*aws), but with at most `concurrency` of the
+    awaitables running at a time.
+
+    Parameters:
+     * aws: iterable of coroutines (they only start when awaited)
+     * concurrency: int, or None for no bound
+
+    Returns:
+     * list of the results, in order
+    """
+    if concurrency is None:
+        return await asyncio.gather(*aws)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(aw):
+        async with semaphore:
+            return await aw
+    return await asyncio.gather(*[run(aw) for aw in aws])
+
+
+def chunked(items, size):
+    """Split the sequence `items` into lists of at most `size` items"""
+    items = list(items)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+class ItemResult:
+    """
+    Outcome of one item of a bulk operation: `value` is what the
+    operation returned, `error` the exception it raised.  Items not
+    attempted because of stop_on_error are `skipped`.
+    """
+    __slots__ = ('item', 'value', 'error', 'skipped')
+
+    def __init__(self, item, value=None, error=None, skipped=False):
+        self.item = item
+        self.value = value
+        self.error = error
+        self.skipped = skipped
+
+    @property
+    def ok(self):
+        return self.error is None and not self.skipped
+
+    def __repr__(self):
+        if self.skipped:
+            state = "skipped"
+        elif self.error is not None:
+            state = "error=%r" % (self.error,)
+        else:
+            state = "value=%r" % (self.value,)
+        return "ItemResult(%r, %s)" % (self.item, state)
+
+
+class BulkResult(list):
+    """The ItemResult of each item of a bulk operation, in item order"""
+    __slots__ = ()
+
+    @property
+    def succeeded(self):
+        return [r for r in self if r.ok]
+
+    @property
+    def failed(self):
+        return [r for r in self if r.error is not None]
+
+    @property
+    def skipped(self):
+        return [r for r in self if r.skipped]
+
+
+async def run_bulk(func, items, concurrency=8, progress=None,
+                   stop_on_error=False):
+    """
+    Run the coroutine function `func` on each of `items`, with at most
+    `concurrency` calls running at a time.  A failing item does not stop
+    the others unless `stop_on_error` is set: then the items not started
+    yet are skipped.  `stop_on_error` may also be a callable telling
+    from the exception whether to stop.
+
+    Parameters:
+     * func: coroutine function taking one item
+     * items: iterable
+     * concurrency: int
+     * progress: optional callable(done, total), called after each item
+     * stop_on_error: bool, or callable(exception) returning a bool
+
+    Returns:
+     * BulkResult()
+    """
+    items = list(items)
+    results = BulkResult([None] * len(items))
+    pending = iter(enumerate(items))
+    state = {'done': 0, 'stop': False}
+
+    async def worker():
+        for i, item in pending:
+            if state['stop']:
+                results[i] = ItemResult(item, skipped=True)
+                continue
+            try:
+                results[i] = ItemResult(item, value=await func(item))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                results[i] = ItemResult(item, error=e)
+                if (stop_on_error(e) if callable(stop_on_error)
+                        else stop_on_error):
+                    state['stop'] = True
+            state['done'] += 1
+            if progress is not None:
+                progress(state['done'], len(items))
+
+    await asyncio.gather(*[worker() for _ in range(
+        max(1, min(concurrency, len(items))))])
+    return results
@@ -49,6 +49,14 @@ class DeleteError(CaldavError):
     pass
 
 
+class CopyError(CaldavError):
+    pass
+
+
+class MoveError(CaldavError):
+    pass
+
+
 class NotFoundError(CaldavError):
     pass
 
@@ -59,6 +67,6 @@ class ServerError(CaldavError):
 
 exception_by_method = {}
 for method in ('delete', 'put', 'mkcalendar', 'mkcol', 'report', 'propset',
-               'propfind'):
+               'propfind', 'copy', 'move'):
     exception_by_method[method] = \
         locals()[method[0].upper() + method[1:] + 'Error']
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+"""
+A fast line scanner over raw iCalendar data.
+
+Listing, indexing and de-duplication only need a handful of properties
+of a calendar object resource.  Building a full vobject tree for that is
+wasteful, so this module walks the (unfolded) content lines once and
+picks up UID, DTSTART, DTEND, DUE, DURATION, RRULE, SEQUENCE and SUMMARY
+of the main component.
+"""
+
+import datetime
+import re
+
+from aiocaldav.lib.python_utilities import to_local
+
+# components which may be the "main" component of a calendar object
+# resource, ref RFC 4791, section 4.1
+COMPONENTS = frozenset(('VEVENT', 'VTODO', 'VJOURNAL', 'VFREEBUSY',
+                        'VAVAILABILITY'))
+
+# content lines are folded with CRLF (or LF) followed by a single
+# whitespace, ref RFC 5545, section 3.1
+_FOLD = re.compile(r'\r?\n[ \t]')
+_UNESCAPE = re.compile(r'\\([\\;,nN])')
+# properties picked up by scan()
+_WANTED = frozenset(('UID', 'DTSTART', 'DTEND', 'DUE', 'DURATION', 'RRULE',
+                     'SEQUENCE', 'SUMMARY'))
+# ref RFC 5545, section 3.3.6
+_DURATION = re.compile(r'([+-])?P(?:(\d+)W)?(?:(\d+)D)?'
+                       r'(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$')
+
+
+def unfold(data):
+    """Return the iCalendar text `data` with folded lines spliced together."""
+    return _FOLD.sub('', to_local(data) or '')
+
+
+def _unescape_text(value):
+    return _UNESCAPE.sub(
+        lambda m: '\n' if m.group(1) in 'nN' else m.group(1), value)
+
+
+def _split_line(line):
+    """
+    Split a content line into (name, value).  Parameters are dropped,
+    colons inside quoted parameter values are honoured.
+    """
+    colon = line.find(':')
+    if colon < 0:
+        return None, None
+    quote = line.find('"', 0, colon)
+    if quote >= 0:
+        in_quote = False
+        for i in range(quote, len(line)):
+            c = line[i]
+            if c == '"':
+                in_quote = not in_quote
+            elif c == ':' and not in_quote:
+                colon = i
+                break
+        else:
+            return None, None
+    name = line[:colon]
+    semi = name.find(';')
+    if semi >= 0:
+        name = name[:semi]
+    return name.upper(), line[colon + 1:]
+
+
+def date_key(value):
+    """
+    Return a sortable key for a DATE or DATE-TIME value as found in the
+    iCalendar text, i.e. '20200101' and '20200101T100000Z' both give a
+    'YYYYMMDDTHHMMSS' string.  Timezones are ignored, so this is only
+    accurate to the hour for objects in different timezones.
+    """
+    if not value:
+        return ''
+    if len(value) == 8:
+        return value + 'T000000'
+    return value[:15]
+
+
+def add_duration(key, duration):
+    """
+    Return the date_key() `key` moved by the iCalendar DURATION value
+    `duration`, or None if either can not be parsed.
+    """
+    match = _DURATION.match(duration.strip().upper())
+    if match is None:
+        return None
+    try:
+        when = datetime.datetime.strptime(key, '%Y%m%dT%H%M%S')
+    except ValueError:
+        return None
+    weeks, days, hours, minutes, seconds = (
+        int(v or 0) for v in match.groups()[1:])
+    delta = datetime.timedelta(weeks=weeks, days=days, hours=hours,
+                               minutes=minutes, seconds=seconds)
+    if match.group(1) == '-':
+        delta = -delta
+    return (when + delta).strftime('%Y%m%dT%H%M%S')
+
+
+class ObjectHeader:
+    """
+    Lightweight record holding the properties of a calendar object
+    resource that are needed for listing, indexing and de-duplication.
+    Date values are kept as they appear in the iCalendar text.
+    """
+    __slots__ = ('uid', 'component', 'dtstart', 'dtend', 'due', 'duration',
+                 'has_rrule', 'sequence', 'summary', 'etag', 'href')
+
+    def __init__(self, uid=None, component=None, dtstart=None, dtend=None,
+                 due=None, has_rrule=False, sequence=0, summary=None,
+                 etag=None, href=None, duration=None):
+        self.uid = uid
+        self.component = component
+        self.dtstart = dtstart
+        self.dtend = dtend
+        self.due = due
+        self.duration = duration
+        self.has_rrule = has_rrule
+        self.sequence = sequence
+        self.summary = summary
+        self.etag = etag
+        self.href = href
+
+    @property
+    def start_key(self):
+        """Sortable DTSTART (or DUE when there is no DTSTART) key."""
+        return date_key(self.dtstart or self.due)
+
+    @property
+    def end_key(self):
+        """
+        Sortable DTEND (or DUE) key, else DTSTART plus DURATION, else the
+        start_key.
+        """
+        if self.dtend or self.due:
+            return date_key(self.dtend or self.due)
+        if self.dtstart and self.duration:
+            end = add_duration(date_key(self.dtstart), self.duration)
+            if end is not None:
+                return end
+        return self.start_key
+
+    def __eq__(self, other):
+        if not isinstance(other, ObjectHeader):
+            return NotImplemented
+        return all(getattr(self, s) == getattr(other, s)
+                   for s in self.__slots__)
+
+    def __repr__(self):
+        return "%s(%s)" % (self.__class__.__name__, ", ".join(
+            "%s=%r" % (s, getattr(self, s)) for s in self.__slots__))
+
+
+def scan(data, href=None, etag=None):
+    """
+    Scan raw iCalendar data (str or bytes).
+
+    When the resource holds several instances of a recurring component
+    (overridden occurrences), the master component - the one without a
+    RECURRENCE-ID - is the one reported.
+
+    Parameters:
+     * data: the iCalendar text
+     * href, etag: copied into the returned record
+
+    Returns:
+     * ObjectHeader()
+    """
+    header = ObjectHeader(href=href, etag=etag)
+    found = None
+    # None while outside of a main component, else the nesting depth of
+    # sub-components (VALARM, ...) inside it
+    nested = None
+    is_override = False
+    values = {}
+    for line in unfold(data).splitlines():
+        if nested is None:
+            if line[:6].upper() == 'BEGIN:':
+                comp = line[6:].strip().upper()
+                if comp in COMPONENTS and (found is None or
+                                           found == comp):
+                    nested = 0
+                    is_override = False
+                    values = {}
+                    current = comp
+            continue
+        name, value = _split_line(line)
+        if name == 'BEGIN':
+            nested += 1
+        elif name == 'END':
+            if nested:
+                nested -= 1
+                continue
+            nested = None
+            if found is None or not is_override:
+                found = current
+                header.component = current
+                header.uid = values.get('UID')
+                header.dtstart = values.get('DTSTART')
+                header.dtend = values.get('DTEND')
+                header.due = values.get('DUE')
+                header.duration = values.get('DURATION')
+                header.has_rrule = 'RRULE' in values
+                try:
+                    header.sequence = int(values.get('SEQUENCE', 0))
+                except ValueError:
+                    header.sequence = 0
+                summary = values.get('SUMMARY')
+                header.summary = (_unescape_text(summary)
+                                  if summary is not None else None)
+                if not is_override:
+                    break
+        elif nested == 0 and name in _WANTED and name not in values:
+            values[name] = value.strip()
+        elif nested == 0 and name == 'RECURRENCE-ID':
+            is_override = True
+    return header
+
+
+def components(data):
+    """
+    Split raw iCalendar data into its top level components, i.e. the
+    VTIMEZONEs and VEVENTs of a VCALENDAR, without parsing them.
+
+    Returns:
+     * iterator of (component name, text), the text keeping the folded
+       lines of the component, CRLF terminated
+    """
+    depth = 0
+    name = None
+    lines = []
+    for line in (to_local(data) or '').splitlines():
+        if line[:6].upper() == 'BEGIN:':
+            depth += 1
+            if depth == 2:
+                name = line[6:].strip().upper()
+                lines = []
+        if depth >= 2:
+            lines.append(line)
+        if line[:4].upper() == 'END:':
+            if depth == 2:
+                yield name, '\r\n'.join(lines) + '\r\n'
+            depth -= 1
+
+
+def tzid(text):
+    """Return the TZID of the VTIMEZONE component `text`, or None"""
+    for line in unfold(text).splitlines():
+        name, value = _split_line(line)
+        if name == 'TZID':
+            return value
+    return None
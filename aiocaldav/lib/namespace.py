@@ -9,12 +9,14 @@ nsmap = {
     "D": "DAV",
     "C": "urn:ietf:params:xml:ns:caldav",
     "I": "http://apple.com/ns/ical/",
+    "CS": "http://calendarserver.org/ns/",
 }
 
 nsmap2 = {
     "D": "DAV:",
     "C": "urn:ietf:params:xml:ns:caldav",
     "I": "http://apple.com/ns/ical/",
+    "CS": "http://calendarserver.org/ns/",
 }
 
 
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+"""
+Parsing of query results in an executor.
+
+vobject parsing is pure Python and CPU bound; on a large REPORT it would
+stall the event loop.  When a DAVClient is given a `parse_executor`, the
+calendar data of query results is handed to the functions below in
+chunks.  They are module level functions so a ProcessPoolExecutor can
+pickle them.
+
+With a process pool, the vobject trees built by the workers are pickled
+back to the client process.  The timezones and recurrence rules of
+dateutil hold locks and cache generators, which cannot be pickled: the
+workers pickle their results themselves, with reducers which leave them
+out and rebuild them on loading.  The reducers are only known to that
+pickler, pickling elsewhere in the process is left alone.  Should a chunk
+still fail to pickle, its objects are only fixed by the workers and
+parsed when first accessed.
+"""
+
+import asyncio
+import copyreg
+import io
+import pickle
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import vobject
+from dateutil import rrule
+from dateutil.tz import tz
+
+from aiocaldav.lib import icalscan, vcal
+
+# number of objects handed to an executor in one call
+CHUNK_SIZE = 64
+
+
+def _rebuild_cached(cls, state):
+    obj = cls.__new__(cls)
+    obj.__dict__.update(state)
+    obj._cache_lock = threading.Lock()
+    if getattr(obj, '_cache', None) is not None:
+        # restarts the cache generator of rrules
+        obj._invalidate_cache()
+    return obj
+
+
+def _reduce_cached(obj):
+    state = dict(obj.__dict__)
+    state.pop('_cache_lock', None)
+    state.pop('_cache_gen', None)
+    return _rebuild_cached, (type(obj), state)
+
+
+_DISPATCH_TABLE = copyreg.dispatch_table.copy()
+for _cls in (tz._tzicalvtz, rrule.rrule, rrule.rruleset):
+    _DISPATCH_TABLE[_cls] = _reduce_cached
+
+
+def _dumps(obj):
+    f = io.BytesIO()
+    pickler = pickle.Pickler(f, pickle.HIGHEST_PROTOCOL)
+    pickler.dispatch_table = _DISPATCH_TABLE
+    pickler.dump(obj)
+    return f.getvalue()
+
+
+def scan_chunk(items):
+    """[(href, data, etag), ...] -> [ObjectHeader(), ...]"""
+    return [icalscan.scan(data, href=href, etag=etag)
+            for href, data, etag in items]
+
+
+def fix_chunk(items):
+    """[(href, data, etag), ...] -> [fixed data, ...]"""
+    return [vcal.fix(data) for href, data, etag in items]
+
+
+def parse_chunk(items):
+    """[(href, data, etag), ...] -> [(fixed data, vobject instance), ...]"""
+    ret = []
+    for href, data, etag in items:
+        data = vcal.fix(data)
+        ret.append((data, vobject.readOne(data) if data else None))
+    return ret
+
+
+def parse_chunk_pickled(items):
+    """
+    parse_chunk() for a process pool worker: the results pickled with the
+    reducers above, or only the fixed data if they still cannot be pickled
+    """
+    parsed = parse_chunk(items)
+    try:
+        return _dumps(parsed)
+    except (pickle.PicklingError, TypeError):
+        return _dumps([(data, None) for data, instance in parsed])
+
+
+async def _run_chunks(executor, func, items):
+    loop = asyncio.get_running_loop()
+    return await asyncio.gather(*[
+        loop.run_in_executor(executor, func, items[i:i + CHUNK_SIZE])
+        for i in range(0, len(items), CHUNK_SIZE)])
+
+
+async def run_chunked(executor, func, items):
+    """
+    Run `func` over `items` in chunks of CHUNK_SIZE on `executor`, and
+    return the concatenated results in order.
+    """
+    results = await _run_chunks(executor, func, items)
+    return [r for chunk in results for r in chunk]
+
+
+async def parse_chunked(executor, items):
+    """
+    run_chunked() of parse_chunk(), through parse_chunk_pickled() on a
+    process pool
+    """
+    if not is_process_pool(executor):
+        return await run_chunked(executor, parse_chunk, items)
+    results = await _run_chunks(executor, parse_chunk_pickled, items)
+    return [r for chunk in results for r in pickle.loads(chunk)]
+
+
+def is_process_pool(executor):
+    return isinstance(executor, ProcessPoolExecutor)
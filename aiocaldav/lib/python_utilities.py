@@ -25,3 +25,14 @@ def date_to_utc(_dt):
         return _dt.replace(tzinfo=pytz.utc)
     else:  # tzaware datetime: shift to utc
         return pytz.utc.normalize(_dt.astimezone(pytz.utc))
+
+
+def utc_string(_dt):
+    """Format given datetime as a UTC DATE-TIME string (RFC 5545, 3.3.5).
+
+    :param datetime _dt: given datetime, naive datetimes are assumed UTC.
+
+    Much cheaper than vobject.icalendar.timeToString for the time ranges
+    of the queries.
+    """
+    return date_to_utc(_dt).strftime("%Y%m%dT%H%M%SZ")
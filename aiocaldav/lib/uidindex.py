@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+"""
+A local UID -> href index of the objects of a calendar.
+
+CalDAV has no lookup by UID but a text-match REPORT, which some servers
+(DAViCal, Cyrus) answer slowly.  A calendar that is queried regularly
+already tells us the UID and href of its objects; with an index, a
+lookup by UID becomes a plain GET, see Calendar.object_by_uid().
+"""
+
+
+class UidIndex:
+    """
+    Bidirectional UID <-> href mapping.  hrefs are the paths of the
+    objects, as found in the multistatus responses.
+    """
+    __slots__ = ('_hrefs', '_uids')
+
+    def __init__(self):
+        self._hrefs = {}
+        self._uids = {}
+
+    def add(self, uid, href):
+        """Record that the object with the UID `uid` is at `href`"""
+        if uid is None:
+            return
+        self.discard_href(href)
+        old = self._hrefs.get(uid)
+        if old is not None:
+            del self._uids[old]
+        self._hrefs[uid] = href
+        self._uids[href] = uid
+
+    def discard_href(self, href):
+        """Forget the object at `href`"""
+        uid = self._uids.pop(href, None)
+        if uid is not None:
+            del self._hrefs[uid]
+
+    def get(self, uid):
+        """Returns the href of the object with the UID `uid`, or None"""
+        return self._hrefs.get(uid)
+
+    def uid(self, href):
+        """Returns the UID of the object at `href`, or None"""
+        return self._uids.get(href)
+
+    def clear(self):
+        self._hrefs.clear()
+        self._uids.clear()
+
+    def __contains__(self, uid):
+        return uid in self._hrefs
+
+    def __len__(self):
+        return len(self._hrefs)
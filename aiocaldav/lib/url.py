@@ -1,8 +1,20 @@
 #!/usr/bin/env python
 # -*- encoding: utf-8 -*-
 
+import functools
+import sys
 from urllib.parse import ParseResult, SplitResult, urlparse
 
+# Size of the parse, join and canonicalization caches below.  The same
+# collection URL gets joined with every href of every response, so even
+# a small cache saves most of the urlparse work.
+CACHE_SIZE = 8192
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _parse(url):
+    return urlparse(url)
+
 
 class URL:
     """
@@ -33,13 +45,14 @@ class URL:
     accept any kind of URL.
 
     """
+    __slots__ = ('url_raw', 'url_parsed')
 
     def __init__(self, url):
         if isinstance(url, ParseResult) or isinstance(url, SplitResult):
             self.url_parsed = url
             self.url_raw = None
         else:
-            self.url_raw = url
+            self.url_raw = sys.intern(url) if isinstance(url, str) else url
             self.url_parsed = None
 
     def __bool__(self):
@@ -52,13 +65,25 @@ class URL:
         return not self == other
 
     def __eq__(self, other):
-        if str(self) == str(other):
+        if self is other or str(self) == str(other):
             return True
         # The URLs could have insignificant differences
-        me = self.canonical()
-        if hasattr(other, 'canonical'):
-            other = other.canonical()
-        return str(me) == str(other)
+        if isinstance(other, URL):
+            return self.canonical_key() == other.canonical_key()
+        return self.canonical_key() == str(other)
+
+    def __hash__(self):
+        return hash(self.canonical_key())
+
+    def canonical_key(self):
+        """
+        The string form of canonical(), memoized.  Used for comparing and
+        hashing URLs.
+        """
+        try:
+            return _canonical_key(str(self))
+        except NotImplementedError:
+            return str(self)
 
     # TODO: better naming?  Will return url if url is already an URL
     # object, else will instantiate a new URL object
@@ -75,10 +100,10 @@ class URL:
     # class
     def __getattr__(self, attr):
         if self.url_parsed is None:
-            self.url_parsed = urlparse(self.url_raw)
-        if hasattr(self.url_parsed, attr):
+            self.url_parsed = _parse(self.url_raw)
+        try:
             return getattr(self.url_parsed, attr)
-        else:
+        except AttributeError:
             return getattr(self.__unicode__(), attr)
 
     # returns the url in text format
@@ -149,25 +174,41 @@ class URL:
         pathAsString = str(path)
         if not path or not pathAsString:
             return self
-        path = URL.objectify(path)
-        if (
-            (path.scheme and self.scheme and path.scheme != self.scheme) or
-            (path.hostname and self.hostname and
-             path.hostname != self.hostname) or
-            (path.port and self.port and path.port != self.port)
-        ):
-            raise ValueError("%s can't be joined with %s" % (self, path))
-
-        if path.path[0] == '/':
-            ret_path = path.path
-        else:
-            sep = "/"
-            if self.path.endswith("/"):
-                sep = ""
-            ret_path = "%s%s%s" % (self.path, sep, path.path)
-        return URL(ParseResult(
-            self.scheme or path.scheme, self.netloc or path.netloc, ret_path,
-            path.params, path.query, path.fragment))
+        return URL(_join(str(self), str(URL.objectify(path))))
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _join(base, path):
+    """
+    Memoized implementation of URL.join, working on (and keyed by) the
+    string forms of the URLs.  Returns an (immutable) ParseResult.
+    """
+    base = _parse(base)
+    path = _parse(path)
+    if (
+        (path.scheme and base.scheme and path.scheme != base.scheme) or
+        (path.hostname and base.hostname and
+         path.hostname != base.hostname) or
+        (path.port and base.port and path.port != base.port)
+    ):
+        raise ValueError("%s can't be joined with %s" % (
+            base.geturl(), path.geturl()))
+
+    if path.path[0] == '/':
+        ret_path = path.path
+    else:
+        sep = "/"
+        if base.path.endswith("/"):
+            sep = ""
+        ret_path = "%s%s%s" % (base.path, sep, path.path)
+    return ParseResult(
+        base.scheme or path.scheme, base.netloc or path.netloc, ret_path,
+        path.params, path.query, path.fragment)
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _canonical_key(url):
+    return str(URL(url).canonical())
 
 
 def make(url):
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+"""
+Migration of the objects of a calendar to another calendar, usually on
+another server.
+
+The objects go through three concurrent stages linked by bounded queues:
+reading (calendar-multiget batches from the source), normalization
+(UID rewriting, user supplied fixups) and writing (concurrent PUTs to
+the target).  Reads of the next batches thus overlap the writes of the
+previous ones, while the queues bound the memory used.
+
+With a checkpoint database, the objects written are recorded with their
+source etag, so that an interrupted migration resumes where it stopped
+and a later run only copies the objects changed since.
+"""
+
+import asyncio
+import sqlite3
+import time
+import uuid
+
+import vobject
+
+from aiocaldav.lib import error, icalscan
+from aiocaldav.lib.concurrency import chunked
+
+# ends each stage's queue
+_DONE = object()
+
+
+class MigrationReport:
+    """
+    Counts of a migration run: objects `read` from the source, `written`
+    to the target, `skipped` because the target already had them, and
+    `failed` as a list of (source href, exception).
+    """
+    __slots__ = ('read', 'written', 'skipped', 'failed', 'bytes', 'elapsed')
+
+    def __init__(self):
+        self.read = 0
+        self.written = 0
+        self.skipped = 0
+        self.failed = []
+        self.bytes = 0
+        self.elapsed = 0.0
+
+    @property
+    def objects_per_second(self):
+        return self.written / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def bytes_per_second(self):
+        return self.bytes / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return ("%d read, %d written, %d skipped, %d failed in %.1fs "
+                "(%.0f objects/s, %.0f KiB/s)" % (
+                    self.read, self.written, self.skipped, len(self.failed),
+                    self.elapsed, self.objects_per_second,
+                    self.bytes_per_second / 1024))
+
+
+class Migration:
+    """
+    Copy all the objects of `source` to `target`.
+
+    Usage:
+
+        migration = Migration(source, target, checkpoint="tenant.db")
+        report = await migration.run()
+        print(report)
+
+    Parameters:
+     * source, target: Calendar
+     * rewrite_uids: give the objects new UIDs, i.e. when the target
+       server already holds the same objects elsewhere.  The new UIDs
+       are derived from the old ones and the target URL, so that reruns
+       and RELATED-TO references stay consistent.  By default, UIDs and
+       object names are preserved.
+     * normalize: optional callable(data) returning the data to write
+     * checkpoint: optional path of a SQLite database to resume from
+     * batch_size: objects per calendar-multiget of the source
+     * queue_size: objects waiting between two stages at most
+     * concurrency: PUTs in flight at a time
+     * overwrite: replace the objects already in the target, by default
+       they are skipped
+    """
+
+    def __init__(self, source, target, rewrite_uids=False, normalize=None,
+                 checkpoint=None, batch_size=50, queue_size=200,
+                 concurrency=8, overwrite=False):
+        self.source = source
+        self.target = target
+        self.rewrite_uids = rewrite_uids
+        self.normalize = normalize
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.concurrency = concurrency
+        self.overwrite = overwrite
+        self._db = None
+        if checkpoint is not None:
+            self._db = sqlite3.connect(checkpoint)
+            with self._db:
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS migrated ("
+                    " href TEXT PRIMARY KEY, etag TEXT)")
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+
+    def new_uid(self, uid):
+        """The UID given to `uid` by rewrite_uids"""
+        return str(uuid.uuid5(uuid.NAMESPACE_URL,
+                              "%s#%s" % (self.target.url, uid)))
+
+    def _rewrite(self, data):
+        cal = vobject.readOne(data)
+        for comp in cal.components():
+            for line in (comp.contents.get('uid', []) +
+                         comp.contents.get('related-to', [])):
+                line.value = self.new_uid(line.value)
+        return cal.serialize()
+
+    def _migrated(self):
+        if self._db is None:
+            return {}
+        return dict(self._db.execute("SELECT href, etag FROM migrated"))
+
+    async def _read(self, queue, report):
+        done = self._migrated()
+        hrefs = sorted(href for href, etag in
+                       (await self.source.etags()).items()
+                       if etag is None or done.get(href) != etag)
+        for batch in chunked(hrefs, self.batch_size):
+            for obj in await self.source.objects_by_urls(batch):
+                report.read += 1
+                await queue.put(obj)
+        await queue.put(_DONE)
+
+    async def _normalize(self, source, queue, report):
+        while True:
+            obj = await source.get()
+            if obj is _DONE:
+                break
+            try:
+                data = obj.data
+                if self.rewrite_uids:
+                    data = self._rewrite(data)
+                    name = icalscan.scan(data).uid + ".ics"
+                else:
+                    name = obj.url.path.rsplit('/', 1)[1]
+                if self.normalize is not None:
+                    data = self.normalize(data)
+            except Exception as e:
+                report.failed.append((obj.url.path, e))
+                continue
+            await queue.put((obj, name, data))
+        for _ in range(self.concurrency):
+            await queue.put(_DONE)
+
+    async def _write(self, queue, report):
+        headers = {"Content-Type": 'text/calendar; charset="utf-8"'}
+        if not self.overwrite:
+            headers["If-None-Match"] = "*"
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                break
+            obj, name, data = item
+            try:
+                r = await self.target.client.put(
+                    self.target.url.join(name), data, headers)
+                if r.status == 412:
+                    report.skipped += 1
+                elif r.status in (201, 204):
+                    report.written += 1
+                    report.bytes += len(data.encode('utf-8'))
+                else:
+                    raise error.PutError("%s: %s %s" % (
+                        name, r.status, r.reason))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                report.failed.append((obj.url.path, e))
+                continue
+            if self._db is not None:
+                with self._db:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO migrated VALUES (?, ?)",
+                        (obj.url.path, obj.etag))
+
+    async def run(self):
+        """
+        Run the migration.  Failures of single objects are reported,
+        errors reading the source abort the run.
+
+        Returns:
+         * MigrationReport()
+        """
+        report = MigrationReport()
+        started = time.perf_counter()
+        read = asyncio.Queue(self.queue_size)
+        normalized = asyncio.Queue(self.queue_size)
+        tasks = [asyncio.ensure_future(c) for c in [
+            self._read(read, report),
+            self._normalize(read, normalized, report)] + [
+            self._write(normalized, report)
+            for _ in range(self.concurrency)]]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        finally:
+            report.elapsed = time.perf_counter() - started
+        return report
@@ -6,19 +6,34 @@ A "DAV object" is anything we get from the caldav server or push into the
 caldav server, notably principal, calendars and calendar events.
 """
 import asyncio
+import collections
 import datetime
+import functools
+import heapq
+import itertools
+import logging
+import operator
 import re
+import sys
+import time
 import uuid
+from gzip import GzipFile
 
 
 from lxml import etree
 from urllib.parse import unquote
 import vobject
 
-from aiocaldav.elements import dav, cdav
-from aiocaldav.lib import error, vcal
+from aiocaldav.elements import dav, cdav, cs
+from aiocaldav.elements.template import Template, slot
+from aiocaldav.lib import error, icalscan, parsing, vcal
+from aiocaldav.lib.concurrency import chunked, gather_bounded, run_bulk
 from aiocaldav.lib.url import URL
-from aiocaldav.lib.python_utilities import date_to_utc
+from aiocaldav.lib.python_utilities import date_to_utc, utc_string
+from aiocaldav.outbox import OFFLINE_ERRORS
+
+
+log = logging.getLogger('caldav')
 
 
 def errmsg(r):
@@ -26,16 +41,305 @@ def errmsg(r):
     return "%s %s\n\n%s" % (r.status, r.reason, r.raw)
 
 
+def _same_origin(url, other):
+    """True if both URLs are on the same server"""
+    return (url.scheme, url.hostname, url.port) == (
+        other.scheme, other.hostname, other.port)
+
+
+# The request bodies of the common queries are built and serialized only
+# once, see aiocaldav.elements.template.  Only the slots (time ranges,
+# uids) are filled in for each request.
+
+def _is_bare(element):
+    """True if `element` is nothing but its tag (and maybe a name)"""
+    return (element.value is None and not element.children and
+            set(element.attributes) <= {'name'})
+
+
+@functools.lru_cache(maxsize=128)
+def _propfind_template(prop_classes):
+    prop = dav.Prop() + [cls() for cls in prop_classes]
+    return Template(dav.Propfind() + prop)
+
+
+class Projection:
+    """
+    Selection of the calendar data returned by the queries, ref RFC 4791,
+    section 9.6.  List views and indexes rarely need DESCRIPTIONs,
+    attachments or attendee lists; leaving them out on the server side
+    saves transfer and parsing time.
+
+    Objects fetched with a projection hold partial data and are marked
+    `partial`: saving them raises a PutError, load() them first.
+
+    Parameters:
+     * components: {component name: property names}, for instance
+       {"VEVENT": ("DTSTART", "DTEND", "SUMMARY")}.  None as property
+       names returns all the properties of the component.  UID is always
+       returned, VTIMEZONE components are returned in full unless listed.
+       Sub-components (i.e. VALARM) are left out.
+     * limit_recurrence_set: (start, end) datetimes, overridden instances
+       of recurring objects outside of it are left out.
+     * limit_freebusy_set: (start, end) datetimes, FREEBUSY properties
+       outside of it are left out.
+    """
+    __slots__ = ('components', 'limit_recurrence_set', 'limit_freebusy_set')
+
+    def __init__(self, components, limit_recurrence_set=None,
+                 limit_freebusy_set=None):
+        self.components = tuple(sorted(
+            (comp.upper(),
+             None if props is None else tuple(sorted(
+                 set(p.upper() for p in props) | {'UID'})))
+            for comp, props in components.items()))
+        self.limit_recurrence_set = self._times(limit_recurrence_set)
+        self.limit_freebusy_set = self._times(limit_freebusy_set)
+
+    @staticmethod
+    def _times(times):
+        if times is None:
+            return None
+        return tuple(None if t is None else utc_string(t) for t in times)
+
+    def _key(self):
+        return (self.components, self.limit_recurrence_set,
+                self.limit_freebusy_set)
+
+    def __eq__(self, other):
+        if not isinstance(other, Projection):
+            return NotImplemented
+        return self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def comp(self):
+        """The <C:comp> element selecting components and properties"""
+        vcalendar = cdav.Comp("VCALENDAR") + cdav.AllProp()
+        names = [name for name, _ in self.components]
+        if "VTIMEZONE" not in names:
+            vcalendar += cdav.Comp("VTIMEZONE") + [cdav.AllProp(),
+                                                   cdav.AllComp()]
+        for name, props in self.components:
+            if props is None:
+                vcalendar += cdav.Comp(name) + cdav.AllProp()
+            else:
+                vcalendar += cdav.Comp(name) + [cdav.Prop(p) for p in props]
+        return vcalendar
+
+    def limits(self, expand=False):
+        """The limit-recurrence-set and limit-freebusy-set elements"""
+        ret = []
+        # expand and limit-recurrence-set are mutually exclusive
+        if self.limit_recurrence_set is not None and not expand:
+            ret.append(cdav.LimitRecurrenceSet(*self.limit_recurrence_set))
+        if self.limit_freebusy_set is not None:
+            ret.append(cdav.LimitFreebusySet(*self.limit_freebusy_set))
+        return ret
+
+
+def _report_prop(expand=False, projection=None):
+    """The <D:prop> element of the calendar-query REPORTs"""
+    data = cdav.CalendarData()
+    if projection is not None:
+        data += projection.comp()
+    if expand:
+        data += cdav.Expand(slot('start'), slot('end'))
+    if projection is not None:
+        data += projection.limits(expand)
+    return dav.Prop() + [dav.GetEtag(), data]
+
+
+# properties of the objects returned by the calendar-query REPORTs
+_REPORT_PROPS = [dav.GetEtag(), cdav.CalendarData()]
+
+
+def _calendar_query(comp_filter=None, expand=False, limit=False,
+                    projection=None, anyof=False):
+    """
+    calendar-query REPORT, comp_filter goes inside the VCALENDAR one.
+    With `limit`, the number of results is capped by a `limit` slot.
+    With `anyof`, objects matching any of the filters inside VCALENDAR
+    are returned instead of those matching all of them.
+    """
+    vcalendar = cdav.CompFilter("VCALENDAR")
+    if anyof:
+        vcalendar.attributes['test'] = "anyof"
+    if comp_filter is not None:
+        vcalendar += comp_filter
+    query = cdav.CalendarQuery() + [_report_prop(expand, projection),
+                                    cdav.Filter() + vcalendar]
+    if limit:
+        query += cdav.Limit() + cdav.NResults(slot('limit'))
+    return query
+
+
+@functools.lru_cache(maxsize=32)
+def _comp_query_template(comp, projection=None):
+    """All objects of the component type `comp`"""
+    return Template(_calendar_query(cdav.CompFilter(comp),
+                                    projection=projection))
+
+
+@functools.lru_cache(maxsize=32)
+def _date_search_template(comp, with_end, expand, projection=None):
+    """Objects overlapping a time range, slots: start (and end)"""
+    query = cdav.TimeRange(slot('start'), slot('end') if with_end else None)
+    if comp:
+        query = cdav.CompFilter(comp) + query
+    return Template(_calendar_query(query, expand=with_end and expand,
+                                    projection=projection))
+
+
+@functools.lru_cache(maxsize=32)
+def _objects_template(comps, projection=None):
+    """Objects of any of the component types `comps`, all if None"""
+    if comps is None:
+        return Template(_calendar_query(projection=projection))
+    return Template(_calendar_query([cdav.CompFilter(c) for c in comps],
+                                    projection=projection, anyof=True))
+
+
+@functools.lru_cache(maxsize=32)
+def _uid_query_template(comp):
+    """Objects whose UID contains a string, slot: uid"""
+    query = cdav.PropFilter("UID") + cdav.TextMatch(slot('uid'))
+    if comp:
+        query = cdav.CompFilter(comp) + query
+    return Template(_calendar_query(query))
+
+
+@functools.lru_cache(maxsize=1)
+def _anyof_probe_template():
+    """
+    Objects with a VEVENT or without one, etags only: all the objects
+    if the server honours the anyof test, none if it matches all the
+    filters instead.
+    """
+    vcalendar = cdav.CompFilter("VCALENDAR") + [
+        cdav.CompFilter("VEVENT"),
+        cdav.CompFilter("VEVENT") + cdav.NotDefined()]
+    vcalendar.attributes['test'] = "anyof"
+    return Template(cdav.CalendarQuery() + [dav.Prop() + dav.GetEtag(),
+                                            cdav.Filter() + vcalendar])
+
+
+# components searched by the UID lookups when none is given
+_UID_COMPONENTS = ("VEVENT", "VTODO", "VJOURNAL", "VAVAILABILITY")
+
+
+@functools.lru_cache(maxsize=32)
+def _uids_query_template(comp, count):
+    """
+    Objects whose UID contains any of `count` strings, with an anyof
+    test, slots: uid0, uid1, ...
+    """
+    def uid_filter(name):
+        ret = cdav.CompFilter(name) + [
+            cdav.PropFilter("UID") + cdav.TextMatch(slot('uid%d' % i))
+            for i in range(count)]
+        ret.attributes['test'] = "anyof"
+        return ret
+    if comp:
+        return Template(_calendar_query(uid_filter(comp)))
+    return Template(_calendar_query(
+        [uid_filter(c) for c in _UID_COMPONENTS], anyof=True))
+
+
+def _pending_todo_filters(with_status):
+    """
+    Filters for todos which are not completed, with a STATUS other than
+    CANCELLED (with_status=True) or without any STATUS (with_status=False).
+    """
+    vnocompletedate = cdav.PropFilter('COMPLETED') + cdav.NotDefined()
+    if with_status:
+        vstatus = cdav.PropFilter('STATUS') + cdav.TextMatch(
+            'CANCELLED', negate=True)
+    else:
+        vstatus = cdav.PropFilter('STATUS') + cdav.NotDefined()
+    return [vnocompletedate, vstatus]
+
+
+@functools.lru_cache(maxsize=16)
+def _pending_todos_template(with_status, projection=None):
+    """
+    Pending todos, see _pending_todo_filters().  With with_status None,
+    both kinds in one query with an anyof test.
+    """
+    if with_status is None:
+        vtodos = [cdav.CompFilter("VTODO") + _pending_todo_filters(status)
+                  for status in (True, False)]
+        return Template(_calendar_query(vtodos, projection=projection,
+                                        anyof=True))
+    vtodo = cdav.CompFilter("VTODO") + _pending_todo_filters(with_status)
+    return Template(_calendar_query(vtodo, projection=projection))
+
+
+@functools.lru_cache(maxsize=64)
+def _page_template(query, with_start, with_end, limited, projection=None):
+    """
+    One request of a paged query, see QueryCursor.  `query` is a
+    (component name, pending) pair, pending being None or the with_status
+    flag of _pending_todo_filters().  Slots: start, end and limit.
+    """
+    comp, pending = query
+    filters = []
+    if with_start or with_end:
+        filters.append(cdav.TimeRange(slot('start') if with_start else None,
+                                      slot('end') if with_end else None))
+    if pending is not None:
+        filters += _pending_todo_filters(pending)
+    if comp:
+        filters = cdav.CompFilter(comp) + filters
+    return Template(_calendar_query(filters or None, limit=limited,
+                                    projection=projection))
+
+
+def _is_truncated(response):
+    """
+    True if a multistatus response was truncated by the server, which
+    signals it with a 507 status for the request-URI, ref RFC 4918,
+    section 11.5 and RFC 5323, section 5.17.
+    """
+    for status in response.tree.iterfind(
+            dav.Response.tag + '/' + dav.Status.tag):
+        if status.text and ' 507 ' in status.text:
+            return True
+    return False
+
+
+def _split_range(start, end, keys):
+    """
+    Time (a UTC string, like `start` and `end`) at which to split a
+    truncated range: the median start of the objects the server did
+    return, else the middle of the range.  None if it can not be split.
+    """
+    inside = sorted(k + 'Z' for k in keys if k and
+                    (start is None or k + 'Z' > start) and
+                    (end is None or k + 'Z' < end))
+    if inside:
+        return inside[len(inside) // 2]
+    if start is None or end is None:
+        return None
+    fmt = "%Y%m%dT%H%M%SZ"
+    lo = datetime.datetime.strptime(start, fmt)
+    hi = datetime.datetime.strptime(end, fmt)
+    if hi - lo < datetime.timedelta(minutes=2):
+        return None
+    return (lo + (hi - lo) // 2).strftime(fmt)
+
+
 class DAVObject:
     """
     Base class for all DAV objects.  Can be instantiated by a client
     and an absolute or relative URL, or from the parent object.
+
+    DAV objects are slotted: a large calendar may be mirrored as hundreds
+    of thousands of them, so they carry no per-instance __dict__.
     """
-    id = None
-    url = None
-    client = None
-    parent = None
-    name = None
+    __slots__ = ('id', 'url', 'client', 'parent', 'name',
+                 'extra_init_options')
 
     def __init__(self, client=None, url=None, parent=None, name=None, id=None,
                  **extra):
@@ -56,7 +360,8 @@ class DAVObject:
         self.parent = parent
         self.name = name
         self.id = id
-        self.extra_init_options = extra
+        # most objects get no extra options, don't keep an empty dict around
+        self.extra_init_options = extra or None
         # url may be a path relative to the caldav root
         if client and url:
             self.url = client.url.join(url)
@@ -82,6 +387,7 @@ class DAVObject:
         properties = self._handle_prop_response(
             response=response, props=props, type=type, what='tag')
 
+        own_url = self.url.strip_trailing_slash()
         for path in list(properties.keys()):
             resource_type = properties[path][dav.ResourceType.tag]
             resource_name = properties[path][dav.DisplayName.tag]
@@ -93,10 +399,9 @@ class DAVObject:
                 # And why is the strip_trailing_slash-method needed?
                 # The collection URL should always end with a slash according
                 # to RFC 2518, section 5.2.
-                if (self.url.strip_trailing_slash() !=
-                        self.url.join(path).strip_trailing_slash()):
-                    c.append((self.url.join(path), resource_type,
-                              resource_name))
+                url = self.url.join(path)
+                if own_url != url.strip_trailing_slash():
+                    c.append((url, resource_type, resource_name))
 
         return c
 
@@ -108,7 +413,13 @@ class DAVObject:
         """
         root = None
         # build the propfind request
-        if len(props) > 0:
+        # the cached bodies are keyed on the classes only, elements with
+        # attributes (i.e. a name) are serialized each time
+        if len(props) > 0 and all(_is_bare(p) and not p.attributes
+                                  for p in props):
+            root = _propfind_template(
+                tuple(type(p) for p in props)).render()
+        elif len(props) > 0:
             prop = dav.Prop() + props
             root = dav.Propfind() + prop
 
@@ -120,6 +431,9 @@ class DAVObject:
         This is an internal method for doing a query.  It's a
         result of code-refactoring work, attempting to consolidate
         similar-looking code into a common method.
+
+        `root` is either a BaseElement tree or an already serialized
+        request body (bytes).
         """
         # ref https://bitbucket.org/cyrilrbt/caldav/issues/46 -
         # COMPATIBILITY ISSUE. The lines below seems to solve real
@@ -140,7 +454,9 @@ class DAVObject:
                 url = URL(str(url) + '/')
 
         body = ""
-        if root:
+        if isinstance(root, bytes):
+            body = root
+        elif root:
             body = etree.tostring(root.xmlelement(), encoding="utf-8",
                                   xml_declaration=True)
         # print("QUERY: %s, URL:%s, BODY:%s" % (query_method, url, body))
@@ -155,22 +471,27 @@ class DAVObject:
         return ret
 
     def _handle_prop_response(self, response, props=[], type=None,
-                              what='text'):
+                              what='text', truncated=False):
         """
         Internal method to massage an XML response into a dict.  (This
         method is a result of some code refactoring work, attempting
         to consolidate similar-looking code)
+
+        With `truncated`, the 507 entry of a response truncated by the
+        server is skipped, the caller checks it with _is_truncated().
         """
         properties = {}
         # All items should be in a <D:response> element
         for r in response.tree.findall('.//' + dav.Response.tag):
             status = r.find('.//' + dav.Status.tag)
+            if truncated and ' 507 ' in status.text:
+                continue
             if (' 200 ' not in status.text and
                 ' 207 ' not in status.text and
                     ' 404 ' not in status.text):
                 raise error.ReportError(errmsg(response))
                 # TODO: may be wrong error class
-            href = unquote(r.find('.//' + dav.Href.tag).text)
+            href = sys.intern(unquote(r.find('.//' + dav.Href.tag).text))
             properties[href] = {}
             for p in props:
                 t = r.find(".//" + p.tag)
@@ -274,6 +595,8 @@ class DAVObject:
 
 
 class CalendarSet(DAVObject):
+    __slots__ = ()
+
     async def calendars(self):
         """
         List all calendar collections in this set.
@@ -343,6 +666,10 @@ class Principal(DAVObject):
     Additionally, a principal MUST report the DAV:principal XML element
     in the value of the DAV:resourcetype property.
     """
+    __slots__ = ('_calendar_home_set', '_url', '_not_found')
+
+    # seconds during which find_by_uid() remembers UIDs found nowhere
+    not_found_ttl = 30
 
     def __init__(self, client=None, url=None):
         """
@@ -356,8 +683,15 @@ class Principal(DAVObject):
         path from doing propfinds.
         """
         self.client = client
+        self.parent = None
+        self.name = None
+        self.id = None
+        self.extra_init_options = None
+        self.url = None
         self._calendar_home_set = None
         self._url = url
+        # uid -> expiry time, see find_by_uid()
+        self._not_found = {}
 
     async def ainit(self):
         """Method called after construction in order to asynchronously init the object.
@@ -423,15 +757,184 @@ class Principal(DAVObject):
         cal = await self.calendar_home_set()
         return await cal.calendars()
 
-    async def prune(self):
+    async def date_search(self, start, end=None, compfilter="VEVENT",
+                          headers_only=False, expand=True, concurrency=4,
+                          on_error=None):
+        """
+        Search all the calendars of the principal by date, as an async
+        generator yielding the objects of every calendar merged in
+        DTSTART order.
+
+        The calendars are searched concurrently, at most `concurrency`
+        at a time, so the merged results come at the latency of the
+        slowest calendar rather than the sum of all of them.  A calendar
+        whose search fails is left out.
+
+        Parameters:
+         * start, end, compfilter, headers_only, expand = see
+           Calendar.date_search()
+         * concurrency = number of calendars searched concurrently
+         * on_error = callable(calendar, exception) called for each
+           calendar whose search failed, by default it is logged.
+
+        Yields:
+         * CalendarObjectResource() or ObjectHeader()
+        """
+        async def search(calendar):
+            try:
+                found = await calendar.date_search(
+                    start, end, compfilter=compfilter,
+                    headers_only=headers_only, expand=expand)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if on_error is None:
+                    log.warning("date_search failed on %s: %s", calendar, e)
+                else:
+                    on_error(calendar, e)
+                return []
+            stream = []
+            for obj in found:
+                header = obj if headers_only else icalscan.scan(obj.data)
+                stream.append(((header.start_key, str(header.href) if
+                                headers_only else str(obj.url)), obj))
+            stream.sort(key=operator.itemgetter(0))
+            return stream
+
+        calendars = await self.calendars()
+        streams = await gather_bounded(
+            [search(c) for c in calendars], concurrency)
+        for _, obj in heapq.merge(*streams, key=operator.itemgetter(0)):
+            yield obj
+
+    async def find_by_uid(self, uid, comp_filter=None):
+        """
+        Find the object with the UID `uid` in any calendar of the
+        principal, i.e. for an incoming iMIP reply.
+
+        All calendars are searched concurrently, the first match is
+        returned and the outstanding searches are cancelled.  UIDs found
+        nowhere are remembered for `not_found_ttl` seconds, during which
+        they are not searched again.
+
+        Parameters:
+         * uid: the UID
+         * comp_filter: see Calendar.object_by_uid()
+
+        Returns:
+         * CalendarObjectResource(), or raises error.NotFoundError
+        """
+        now = time.monotonic()
+        expiry = self._not_found.get(uid)
+        if expiry is not None:
+            if expiry > now:
+                raise error.NotFoundError("%s not found (cached)" % uid)
+            del self._not_found[uid]
+
+        tasks = [asyncio.ensure_future(c.object_by_uid(uid, comp_filter))
+                 for c in await self.calendars()]
+        failed = False
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    return await next_done
+                except error.NotFoundError:
+                    pass
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    log.warning("find_by_uid failed on a calendar: %s", e)
+                    failed = True
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        # a calendar that failed may hold the UID, don't cache the miss
+        if not failed:
+            if len(self._not_found) >= 1024:
+                self._not_found = {u: t for u, t in self._not_found.items()
+                                   if t > now}
+            self._not_found[uid] = now + self.not_found_ttl
+        raise error.NotFoundError("%s not found in any calendar" % uid)
+
+    async def prune(self, concurrency=8, progress=None, stop_on_error=True):
         """
         Delete all calendars in this Principal.
+
+        Parameters:
+         * concurrency - number of requests running at a time
+         * progress - optional callable(done, total) called after each
+           calendar
+         * stop_on_error - by default, calendars not deleted yet are kept
+           after the first failure
+
+        Returns:
+         * BulkResult()
         """
         try:
-            for cal in await self.calendars():
-                await cal.delete()
+            calendars = await self.calendars()
         except error.NotFoundError:
-            pass # no calendar found, lets pass
+            calendars = [] # no calendar found, lets pass
+
+        async def delete(cal):
+            await cal.delete()
+        return await run_bulk(delete, calendars, concurrency, progress,
+                              stop_on_error)
+
+
+class ResultPage(list):
+    """
+    A page of results of a query made with a `limit`.  `cursor` is a
+    QueryCursor to fetch the next page, or None on the last page.
+    """
+    __slots__ = ('cursor',)
+
+    def __init__(self, items=(), cursor=None):
+        super(ResultPage, self).__init__(items)
+        self.cursor = cursor
+
+
+class QueryCursor:
+    """
+    Continuation of a calendar query made with a `limit`, see
+    Calendar.date_search().  Fetch the next page with next_page().
+
+    The server may return any subset of the matching objects when it
+    truncates the results, so the query is resumed by narrowing its time
+    range: a truncated range is split in two at the median start of the
+    objects returned, and both halves are queried again, earliest first.
+    The hrefs already returned are remembered, so an object matching
+    several ranges is returned once.
+    """
+    __slots__ = ('calendar', 'limit', 'comp_class', 'headers_only',
+                 'projection', 'ranges', 'seen', 'buffer')
+
+    # a range still truncated after this many splits is fetched without
+    # limit; it happens when more than `limit` objects overlap one instant
+    max_depth = 16
+
+    def __init__(self, calendar, limit, comp_class, ranges,
+                 headers_only=False, projection=None):
+        self.calendar = calendar
+        self.limit = limit
+        self.comp_class = comp_class
+        self.headers_only = headers_only
+        self.projection = projection
+        # stack of (query, start, end, depth), the next range last
+        self.ranges = list(reversed(ranges))
+        self.seen = set()
+        self.buffer = []
+
+    @property
+    def exhausted(self):
+        return not self.ranges and not self.buffer
+
+    async def next_page(self):
+        """
+        Returns:
+         * ResultPage()
+        """
+        return await self.calendar._fetch_page(self)
 
 
 class Calendar(DAVObject):
@@ -439,6 +942,20 @@ class Calendar(DAVObject):
     The `Calendar` object is used to represent a calendar collection.
     Refer to the RFC for details: http://www.ietf.org/rfc/rfc4791.txt
     """
+    __slots__ = ('uid_index',)
+
+    def __init__(self, client=None, url=None, parent=None, name=None, id=None,
+                 uid_index=None, **extra):
+        """
+        Calendar has an additional parameter for its constructor:
+         * uid_index = an optional UidIndex.  It is kept up to date by the
+           queries, save() and delete() of the calendar objects, and lets
+           object_by_uid() and objects_by_uids() fetch indexed objects
+           directly instead of searching them.
+        """
+        super().__init__(client=client, url=url, parent=parent, name=name,
+                         id=id, **extra)
+        self.uid_index = uid_index
 
     async def _create(self, name, id=None, supported_calendar_component_set=None):
         """
@@ -515,6 +1032,63 @@ class Calendar(DAVObject):
             # sane server
             pass
 
+    async def add_many(self, icals, concurrency=8, progress=None,
+                       stop_on_error=False):
+        """
+        Add many new objects to the calendar.  The class of each object
+        (Event, Todo, Journal, Availability) follows its data.
+
+        Parameters:
+         * icals - iterable of ical objects (text or vobject)
+         * concurrency - number of requests running at a time
+         * progress - optional callable(done, total) called after each
+           object
+         * stop_on_error - if True, objects not sent yet after the first
+           failure are skipped
+
+        Returns:
+         * BulkResult(), with the saved object as value of each item
+        """
+        async def add(ical):
+            data = ical if isinstance(ical, str) else ical.serialize()
+            obj = self._object_class_by_data(data)(
+                self.client, data=ical, parent=self)
+            return await obj.save(new=True)
+        return await run_bulk(add, icals, concurrency, progress,
+                              stop_on_error)
+
+    async def save_many(self, objects, concurrency=8, progress=None,
+                        stop_on_error=False):
+        """
+        Save many objects (CalendarObjectResource) of the calendar.
+
+        Parameters and return value: see add_many()
+        """
+        async def save(obj):
+            return await obj.save()
+        return await run_bulk(save, objects, concurrency, progress,
+                              stop_on_error)
+
+    async def delete_many(self, objects, concurrency=8, progress=None,
+                          stop_on_error=False):
+        """
+        Delete many objects of the calendar.
+
+        Parameters:
+         * objects - iterable of CalendarObjectResource or URLs
+         * concurrency, progress, stop_on_error - see add_many()
+
+        Returns:
+         * BulkResult()
+        """
+        async def delete(obj):
+            if not isinstance(obj, CalendarObjectResource):
+                obj = CalendarObjectResource(
+                    self.client, url=self.url.join(obj), parent=self)
+            await obj.delete()
+        return await run_bulk(delete, objects, concurrency, progress,
+                              stop_on_error)
+
     async def add_event(self, ical):
         """
         Add a new event to the calendar, with the given ical.
@@ -564,12 +1138,15 @@ class Calendar(DAVObject):
          * self
         """
         if self.url is None:
-            await self._create(name=self.name, id=self.id, **self.extra_init_options)
+            await self._create(name=self.name, id=self.id,
+                               **(self.extra_init_options or {}))
             if not self.url.endswith('/'):
                 self.url = URL.objectify(str(self.url) + '/')
         return self
 
-    async def date_search(self, start, end=None, compfilter="VEVENT"):
+    async def date_search(self, start, end=None, compfilter="VEVENT",
+                          headers_only=False, expand=True, limit=None,
+                          projection=None):
         """
         Search events by date in the calendar. Recurring events are
         expanded if they are occuring during the specified time frame
@@ -580,13 +1157,20 @@ class Calendar(DAVObject):
          * end = same as above.
          * compfilter = defaults to events only.  Set to None to fetch all
            calendar components.
+         * headers_only = if True, return lightweight ObjectHeader records
+           instead of parsing the objects with vobject.
+         * expand = set to False to get recurring events unexpanded even
+           if an end timestamp is given.
+         * limit = maximum number of objects to return.  The result is
+           then a ResultPage, whose cursor fetches the next page.
+           Recurring events are not expanded in paged queries.
+         * projection = a Projection selecting the components and
+           properties to return, by default objects are returned in full.
 
         Returns:
-         * [CalendarObjectResource(), ...]
+         * [CalendarObjectResource(), ...] or [ObjectHeader(), ...]
 
         """
-        matches = []
-
         # build the request
 
         # Some servers will raise an error if we send the expand flag
@@ -594,31 +1178,100 @@ class Calendar(DAVObject):
         # if we have one recurring event describing an indefinite
         # series of events.  Hence, if the end date is not set, we
         # skip asking for expanded events.
-        start = date_to_utc(start)
-
+        start = utc_string(start)
         if end:
-            end = date_to_utc(end)
-            data = cdav.CalendarData() + cdav.Expand(start, end)
-        else:
-            data = cdav.CalendarData()
-        prop = dav.Prop() + data
+            end = utc_string(end)
 
-        query = cdav.TimeRange(start, end)
-        if compfilter:
-            query = cdav.CompFilter(compfilter) + query
-        vcalendar = cdav.CompFilter("VCALENDAR") + query
-        filter = cdav.Filter() + vcalendar
+        if limit is not None:
+            return await QueryCursor(
+                self, limit, Event, [((compfilter or None, None),
+                                      start, end or None, 0)],
+                headers_only, projection).next_page()
 
-        root = cdav.CalendarQuery() + [prop, filter]
+        root = _date_search_template(
+            compfilter or None, bool(end), expand, projection).render(
+                start=start, end=end)
         response = await self._query(root, 1, 'report')
         results = self._handle_prop_response(
-            response=response, props=[cdav.CalendarData()])
-        for r in results:
-            matches.append(
-                Event(self.client, url=self.url.join(r),
-                      data=results[r][cdav.CalendarData.tag], parent=self))
+            response=response, props=_REPORT_PROPS)
+        return await self._objects_from_results(
+            results, Event, headers_only, projection)
 
-        return matches
+    async def iter_date_search(self, start, end,
+                               window=datetime.timedelta(days=30),
+                               compfilter="VEVENT", concurrency=4,
+                               headers_only=False, projection=None):
+        """
+        Search objects by date, like date_search(), as an async generator.
+
+        The range is split into windows of `window` length which are
+        fetched with one REPORT each, at most `concurrency` of them at a
+        time.  Objects are yielded in DTSTART order within each window,
+        window after window, so the first results arrive as soon as the
+        first window is fetched and only a few windows are kept in memory.
+        Objects overlapping several windows are yielded once.  Recurring
+        events are not expanded.
+
+        Parameters:
+         * start, end = datetime
+         * window = datetime.timedelta
+         * compfilter, headers_only, projection = see date_search()
+         * concurrency = number of windows fetched concurrently
+
+        Yields:
+         * CalendarObjectResource() or ObjectHeader()
+        """
+        start = date_to_utc(start)
+        end = date_to_utc(end)
+
+        def windows():
+            s = start
+            while s < end:
+                yield s, min(s + window, end)
+                s += window
+
+        def fetch(bounds):
+            return asyncio.ensure_future(self.date_search(
+                bounds[0], bounds[1], compfilter=compfilter,
+                headers_only=headers_only, expand=False,
+                projection=projection))
+
+        bounds = windows()
+        pending = collections.deque(
+            (b, fetch(b)) for b in itertools.islice(bounds, concurrency))
+        # href -> end key of the objects already yielded, None for
+        # recurring objects which may show up in any later window
+        seen = {}
+        try:
+            while pending:
+                (w_start, w_end), task = pending.popleft()
+                found = await task
+                for b in itertools.islice(bounds, 1):
+                    pending.append((b, fetch(b)))
+
+                # objects ending (a day, for timezone slack) before this
+                # window can not show up again
+                horizon = icalscan.date_key(
+                    utc_string(w_start - datetime.timedelta(days=1)))
+                seen = {h: k for h, k in seen.items()
+                        if k is None or k >= horizon}
+
+                keyed = []
+                for obj in found:
+                    header = obj if headers_only else icalscan.scan(obj.data)
+                    href = header.href if headers_only else str(obj.url)
+                    if href in seen:
+                        continue
+                    seen[href] = None
+                    if not header.has_rrule:
+                        seen[href] = header.end_key or None
+                    keyed.append((header.start_key, href, obj))
+                keyed.sort(key=lambda k: k[:2])
+                for _, _, obj in keyed:
+                    yield obj
+        finally:
+            for _, task in pending:
+                task.cancel()
 
     async def freebusy_request(self, start, end):
         """
@@ -632,15 +1285,14 @@ class Calendar(DAVObject):
          * [FreeBusy(), ...]
 
         """
-        start = date_to_utc(start)
-        end = date_to_utc(end)
-        root = cdav.FreeBusyQuery() + [cdav.TimeRange(start, end)]
+        root = cdav.FreeBusyQuery() + [
+            cdav.TimeRange(utc_string(start), utc_string(end))]
         response = await self._query(root, 1, 'report')
-        print(response.raw)
         return FreeBusy(parent=self, data=response.raw)
 
     async def todos(self, sort_keys=('due', 'priority'), include_completed=False,
-                    sort_key=None):
+                    sort_key=None, headers_only=False, limit=None,
+                    projection=None):
         """
         fetches a list of todo events.
 
@@ -650,91 +1302,77 @@ class Calendar(DAVObject):
          * include_completed: boolean -
            by default, only pending tasks are listed
          * sort_key: DEPRECATED, for backwards compatibility with version 0.4.
+         * headers_only: if True, return ObjectHeader records instead of
+           Todo objects.  Only the fields of ObjectHeader can be used as
+           sort keys then.
+         * limit: maximum number of todos to return, see date_search().
+           Only the returned page is sorted, not the next ones.
+         * projection: a Projection, see date_search().  The sort keys
+           must be among the returned properties.
         """
         # ref https://www.ietf.org/rfc/rfc4791.txt, section 7.8.9
-        matches = []
-
-        # build the request
-        data = cdav.CalendarData()
-        prop = dav.Prop() + data
-
         if sort_key:
             sort_keys = (sort_key,)
 
-        if not include_completed:
-            # == QUERY 1 
-            # vnotcompleted = cdav.TextMatch('COMPLETED', negate=True)
-            vnotcancelled = cdav.TextMatch('CANCELLED', negate=True)
-            # vstatusNotCompleted = cdav.PropFilter(
-            #     'STATUS') + vnotcompleted
-            vstatusNotCancelled = cdav.PropFilter(
-                'STATUS') + vnotcancelled
-            
-            vnocompletedate = cdav.PropFilter('COMPLETED') + cdav.NotDefined()
-            # vnocanceldate = cdav.PropFilter('CANCELLED') + cdav.NotDefined()
-            vtodo = (cdav.CompFilter("VTODO") +
-                     vnocompletedate + vstatusNotCancelled)
-            # vtodo2 = (cdav.CompFilter("VTODO") + vnostatus)
-            vcalendar = cdav.CompFilter("VCALENDAR") + vtodo  # + vtodo2
-            filter1 = cdav.Filter() + vcalendar
-            root = cdav.CalendarQuery() + [prop, filter1]
-
-            response = await self._query(root, 1, 'report')
-            results = self._handle_prop_response(
-                response=response, props=[cdav.CalendarData()])
-            for r in results:
-                matches.append(
-                    Todo(self.client, url=self.url.join(r),
-                         data=results[r][cdav.CalendarData.tag], parent=self))
-
-            # ==  QUERY 2 == Add all TODO without status
-            vnostatus = cdav.PropFilter('STATUS') + cdav.NotDefined()
-            vtodo2 = (cdav.CompFilter("VTODO") + vnocompletedate + vnostatus)
-            vcalendar2 = cdav.CompFilter("VCALENDAR") + vtodo2
-            filter2 = cdav.Filter() + vcalendar2
-            root2 = cdav.CalendarQuery() + [prop, filter2]
-
-            response2 = await self._query(root2, 1, 'report')
-            results2 = self._handle_prop_response(
-                response=response2, props=[cdav.CalendarData()])
-            for r in results2:
-                matches.append(
-                    Todo(self.client, url=self.url.join(r),
-                         data=results2[r][cdav.CalendarData.tag], parent=self))
+        if limit is not None:
+            if include_completed:
+                queries = [("VTODO", None)]
+            else:
+                queries = [("VTODO", True), ("VTODO", False)]
+            matches = await QueryCursor(
+                self, limit, Todo, [(q, None, None, 0) for q in queries],
+                headers_only, projection).next_page()
+        elif not include_completed:
+            # TODO not completed, and either not cancelled or without
+            # status: one anyof query, or two concurrent ones.  A todo
+            # matching both is returned once.
+            results = await self._report_anyof(
+                _pending_todos_template(None, projection).render(),
+                [_pending_todos_template(True, projection).render(),
+                 _pending_todos_template(False, projection).render()])
+            matches = await self._objects_from_results(
+                results, Todo, headers_only, projection)
         else:
-            vtodo = cdav.CompFilter("VTODO")
-            vcalendar = cdav.CompFilter("VCALENDAR") + vtodo
-            filter = cdav.Filter() + vcalendar
+            results = await self._report(
+                _comp_query_template("VTODO", projection).render())
+            matches = await self._objects_from_results(
+                results, Todo, headers_only, projection)
 
-            root = cdav.CalendarQuery() + [prop, filter]
+        def header_sort_key_func(x):
+            ret = []
+            for sort_key in sort_keys:
+                val = getattr(x, sort_key, None)
+                if sort_key in ('due', 'dtstart', 'dtend'):
+                    val = icalscan.date_key(val) or (
+                        '20500101T000000' if sort_key == 'due'
+                        else '19700101T000000')
+                ret.append('0' if val is None else val)
+            return ret
 
-            response = await self._query(root, 1, 'report')
-            results = self._handle_prop_response(
-                response=response, props=[cdav.CalendarData()])
-            for r in results:
-                matches.append(
-                    Todo(self.client, url=self.url.join(r),
-                         data=results[r][cdav.CalendarData.tag], parent=self))
+        # JA: why compare datetime.strftime('%F%H%M%S')
+        # JA: and not simply datetime?
+        now = datetime.datetime.now().strftime('%F%H%M%S')
+        defaults = {
+            'due': '2050-01-01',
+            'dtstart': '1970-01-01',
+            'priority': '0',
+        }
 
         def sort_key_func(x):
+            # called once per todo by list.sort()
             ret = []
             vtodo = x.instance.vtodo
-            defaults = {
-                'due': '2050-01-01',
-                'dtstart': '1970-01-01',
-                'priority': '0',
-                # JA: why compare datetime.strftime('%F%H%M%S')
-                # JA: and not simply datetime?
-                'isnt_overdue':
-                    not (hasattr(vtodo, 'due') and
-                         vtodo.due.value.strftime('%F%H%M%S') <
-                         datetime.datetime.now().strftime('%F%H%M%S')),
-                'hasnt_started':
-                    (hasattr(vtodo, 'dtstart') and
-                     vtodo.dtstart.value.strftime('%F%H%M%S') >
-                     datetime.datetime.now().strftime('%F%H%M%S'))
-            }
             for sort_key in sort_keys:
+                if sort_key == 'isnt_overdue':
+                    ret.append(not (hasattr(vtodo, 'due') and
+                                    vtodo.due.value.strftime('%F%H%M%S') <
+                                    now))
+                    continue
+                if sort_key == 'hasnt_started':
+                    ret.append(hasattr(vtodo, 'dtstart') and
+                               vtodo.dtstart.value.strftime('%F%H%M%S') >
+                               now)
+                    continue
                 val = getattr(vtodo, sort_key, None)
                 if val is None:
                     ret.append(defaults.get(sort_key, '0'))
@@ -746,11 +1384,190 @@ class Calendar(DAVObject):
                     ret.append(val)
             return ret
         if sort_keys:
-            matches.sort(key=sort_key_func)
+            matches.sort(key=header_sort_key_func if headers_only
+                         else sort_key_func)
         return matches
 
+    async def _fetch_page(self, cursor):
+        """
+        Internal method fetching the next page of a paged query, see
+        QueryCursor.
+        """
+        limit = cursor.limit
+        page = ResultPage(cursor.buffer[:limit])
+        del cursor.buffer[:limit]
+        while len(page) < limit and cursor.ranges:
+            query, start, end, depth = cursor.ranges.pop()
+            limited = depth < cursor.max_depth
+            root = _page_template(
+                query, start is not None, end is not None, limited,
+                cursor.projection).render(
+                    start=start, end=end, limit=str(limit))
+            response = await self._query(root, 1, 'report')
+            results = self._handle_prop_response(
+                response=response, props=_REPORT_PROPS, truncated=True)
+
+            if limited and _is_truncated(response):
+                pivot = _split_range(start, end, [
+                    icalscan.scan(r[cdav.CalendarData.tag]).start_key
+                    for r in results.values()])
+                if pivot is None:
+                    cursor.ranges.append(
+                        (query, start, end, cursor.max_depth))
+                else:
+                    cursor.ranges.append((query, pivot, end, depth + 1))
+                    cursor.ranges.append((query, start, pivot, depth + 1))
+
+            new = {}
+            for href, props in results.items():
+                if href not in cursor.seen:
+                    cursor.seen.add(href)
+                    new[href] = props
+            found = await self._objects_from_results(
+                new, cursor.comp_class, cursor.headers_only,
+                cursor.projection)
+            space = limit - len(page)
+            page.extend(found[:space])
+            cursor.buffer.extend(found[space:])
+        if not cursor.exhausted:
+            page.cursor = cursor
+        return page
+
+    async def _report(self, root):
+        """
+        Internal method running the calendar-query `root`, returns the
+        results as a dict, see _handle_prop_response().
+        """
+        response = await self._query(root, 1, 'report')
+        return self._handle_prop_response(response=response,
+                                          props=_REPORT_PROPS)
+
+    async def _report_anyof(self, root, fallbacks, limiter=None):
+        """
+        Internal method running the calendar-query `root`, whose filter
+        uses an anyof test, or else the equivalent `fallbacks` queries
+        concurrently.  With a `limiter` (asyncio.Semaphore), each request
+        holds it while running.
+
+        Servers not knowing the test attribute either reject the query or
+        match all the filters, which gives no result.  A failed or empty
+        anyof query is thus followed by a probe, see _probe_anyof(), and
+        the fallbacks are only run if the probe shows the anyof test is
+        not supported.  The outcome is remembered on the client
+        (supports_anyof).
+
+        Returns the merged results, de-duplicated by href.
+        """
+        async def limited(aw):
+            if limiter is None:
+                return await aw
+            async with limiter:
+                return await aw
+
+        client = self.client
+        if client.supports_anyof is not False:
+            try:
+                results = await limited(self._report(root))
+            except error.ReportError:
+                if (client.supports_anyof or
+                        await limited(self._probe_anyof()) is not False):
+                    raise
+            else:
+                if results or client.supports_anyof:
+                    client.supports_anyof = True
+                    return results
+                if await limited(self._probe_anyof()) is not False:
+                    # nothing matches, or the calendar is empty
+                    return results
+        merged = {}
+        for found in await asyncio.gather(
+                *[limited(self._report(r)) for r in fallbacks]):
+            merged.update(found)
+        return merged
+
+    async def _probe_anyof(self):
+        """
+        Internal method finding out whether the server honours anyof
+        tests, with a query whose answer is known: all the objects if it
+        does.  A 4xx answer means it does not; so does an empty answer,
+        provided the calendar holds objects.
+
+        Returns client.supports_anyof, None if the calendar is empty.
+        """
+        client = self.client
+        r = await client.report(self.url, _anyof_probe_template().render(), 1)
+        if 400 <= r.status < 500:
+            client.supports_anyof = False
+        elif r.status >= 400:
+            raise error.ReportError(errmsg(r))
+        elif self._handle_prop_response(r, props=[dav.GetEtag()]):
+            client.supports_anyof = True
+        elif await self.etags():
+            client.supports_anyof = False
+        return client.supports_anyof
+
+    async def _objects_from_results(self, results, comp_class,
+                                    headers_only=False, projection=None):
+        """
+        Internal method turning the dict returned by _handle_prop_response
+        for a calendar-query into a list of `comp_class` objects, or into
+        a list of ObjectHeader records if `headers_only` is set.  With
+        comp_class None, the class of each object follows its data.
+        Objects fetched with a `projection` are marked partial.
+
+        If the client has a parse_executor, the parsing is done there, see
+        aiocaldav.lib.parsing.
+        """
+        if self.uid_index is not None:
+            self._index_results(results)
+        executor = self.client.parse_executor
+        if executor is None:
+            if headers_only:
+                return [icalscan.scan(results[r][cdav.CalendarData.tag],
+                                      href=r,
+                                      etag=results[r].get(dav.GetEtag.tag))
+                        for r in results]
+            objects = [(comp_class or self._object_class_by_data(
+                           results[r][cdav.CalendarData.tag]))(
+                               self.client, url=self.url.join(r),
+                               data=results[r][cdav.CalendarData.tag],
+                               parent=self,
+                               etag=results[r].get(dav.GetEtag.tag))
+                       for r in results]
+            for obj in objects:
+                obj.partial = projection is not None
+            return objects
+
+        items = [(r, results[r][cdav.CalendarData.tag],
+                  results[r].get(dav.GetEtag.tag))
+                 for r in results]
+        if headers_only:
+            return await parsing.run_chunked(
+                executor, parsing.scan_chunk, items)
+        parsed = await parsing.parse_chunked(executor, items)
+        objects = []
+        for (r, _, etag), (data, instance) in zip(items, parsed):
+            obj = (comp_class or self._object_class_by_data(data))(
+                self.client, url=self.url.join(r), parent=self, etag=etag)
+            obj._data = data
+            obj._instance = instance
+            obj.partial = projection is not None
+            objects.append(obj)
+        return objects
+
+    def _object_class_by_data(self, data):
+        """
+        Like _calendar_comp_class_by_data(), for objects stored in the
+        calendar: free/busy data and unknown components are returned as
+        plain CalendarObjectResource.
+        """
+        cls = self._calendar_comp_class_by_data(data or '')
+        if cls is None or cls is FreeBusy:
+            return CalendarObjectResource
+        return cls
+
     def _calendar_comp_class_by_data(self, data):
-        for line in data.split('\n'):
+        for line in data.splitlines():
             if line == 'BEGIN:VEVENT':
                 return Event
             if line == 'BEGIN:VTODO':
@@ -800,17 +1617,20 @@ class Calendar(DAVObject):
         Returns:
          * Event() or None
         """
-        data = cdav.CalendarData()
-        prop = dav.Prop() + data
-
-        query = cdav.TextMatch(uid)
-        query = cdav.PropFilter("UID") + query
-        if comp_filter:
-            query = comp_filter + query
-        vcalendar = cdav.CompFilter("VCALENDAR") + query
-        filter = cdav.Filter() + vcalendar
-
-        root = cdav.CalendarQuery() + [prop, filter]
+        if self.uid_index is not None and (
+                comp_filter is None or _is_bare(comp_filter)):
+            obj = await self._object_from_index(
+                uid, comp_filter.attributes.get('name') if comp_filter
+                else None)
+            if obj is not None:
+                return obj
+
+        if comp_filter is None or _is_bare(comp_filter):
+            comp = comp_filter.attributes.get('name') if comp_filter else None
+            root = _uid_query_template(comp).render(uid=uid)
+        else:
+            query = cdav.PropFilter("UID") + cdav.TextMatch(uid)
+            root = _calendar_query(comp_filter + query)
 
         response = await self._query(root, 1, 'report')
 
@@ -827,16 +1647,168 @@ class Calendar(DAVObject):
             # uid given in the query is short (i.e. just "0") we're likely to
             # get false positives back from the server.
             #
-            # Long uids are folded, so splice the lines together here before
-            # attempting a match.
-            item_uid = re.search(r'\nUID:((.|\n[ \t])*)\n', data)
-            if (not item_uid or
-                    re.sub(r'\n[ \t]', '', item_uid.group(1)) != uid):
+            # Long uids are folded, the scanner splices the lines together
+            # before we attempt a match.
+            if icalscan.scan(data).uid != uid:
                 continue
+            etag = r.find(".//" + dav.GetEtag.tag)
+            if self.uid_index is not None:
+                self.uid_index.add(uid, self._index_key(href))
             return self._calendar_comp_class_by_data(data)(
-                self.client, url=URL.objectify(href), data=data, parent=self)
+                self.client, url=URL.objectify(href), data=data, parent=self,
+                etag=etag.text if etag is not None else None)
         raise error.NotFoundError(errmsg(response))
 
+    def _index_key(self, href):
+        """hrefs are indexed by path, servers may return full URLs"""
+        return self.url.join(href).path
+
+    def _index_results(self, results):
+        """Record the UIDs of query results in the uid_index"""
+        index = self.uid_index
+        for href, props in results.items():
+            data = props.get(cdav.CalendarData.tag)
+            if data:
+                index.add(icalscan.scan(data).uid, self._index_key(href))
+
+    async def _object_from_index(self, uid, comp=None):
+        """
+        Internal method fetching the object `uid` from the href found in
+        the uid_index with a GET.  Returns None when the UID is not
+        indexed or the entry is stale.
+        """
+        href = self.uid_index.get(uid)
+        if href is None:
+            return None
+        r = await self.client.request(self.url.join(href),
+                                      headers={"Accept": "text/calendar"})
+        data = vcal.fix(r.raw) if r.status == 200 else None
+        header = icalscan.scan(data) if data else None
+        if header is None or header.uid != uid:
+            self.uid_index.discard_href(href)
+            return None
+        if comp is not None and header.component != comp:
+            return None
+        return self._object_class_by_data(data)(
+            self.client, url=self.url.join(href), data=data, parent=self,
+            etag=r.headers.get('ETag'))
+
+    async def objects_by_urls(self, hrefs, headers_only=False):
+        """
+        Get many objects by URL with one calendar-multiget REPORT, ref
+        RFC 4791, section 7.9.
+
+        Parameters:
+         * hrefs: iterable of URLs or paths of objects of this calendar
+         * headers_only: if True, return ObjectHeader records
+
+        Returns:
+         * [CalendarObjectResource(), ...] or [ObjectHeader(), ...],
+           objects not found are left out.
+        """
+        results = await self._multiget(hrefs)
+        if not results:
+            return []
+        return await self._objects_from_results(results, None, headers_only)
+
+    async def _multiget(self, hrefs):
+        """
+        Internal method running a calendar-multiget of `hrefs`, returns
+        the results with calendar data as a dict, see
+        _handle_prop_response().
+        """
+        hrefs = [self._index_key(h) for h in hrefs]
+        if not hrefs:
+            return {}
+        root = cdav.CalendarMultiget() + (
+            [_report_prop()] + [dav.Href(value=h) for h in hrefs])
+        response = await self._query(root, 1, 'report')
+        results = self._handle_prop_response(
+            response=response, props=_REPORT_PROPS)
+        return {h: props for h, props in results.items()
+                if props.get(cdav.CalendarData.tag)}
+
+    async def objects_by_uids(self, uids, compfilter=None, chunk_size=50,
+                              concurrency=4, headers_only=False):
+        """
+        Get many objects by UID at once, i.e. to resolve the UIDs of a
+        batch of iTIP messages.
+
+        The UIDs are looked up in chunks of `chunk_size`, with one REPORT
+        per chunk combining the UID filters with an anyof test, and at
+        most `concurrency` requests at a time.  Servers without anyof
+        support get one REPORT per UID (and per component type if
+        `compfilter` is None).  Servers match substrings, so the results
+        are then matched exactly client-side.
+
+        Parameters:
+         * uids: iterable of UIDs
+         * compfilter: component name, i.e. "VEVENT", or None for any
+         * chunk_size, concurrency: int
+         * headers_only: if True, return ObjectHeader records
+
+        With a uid_index, the indexed UIDs are fetched with one
+        calendar-multiget first, and only the others are searched.
+
+        Returns:
+         * {uid: CalendarObjectResource()} or {uid: ObjectHeader()},
+           UIDs not found are left out.
+        """
+        wanted = set(uids)
+        ret = {}
+        index = self.uid_index
+        if index is not None:
+            indexed = [index.get(uid) for uid in wanted if uid in index]
+            returned = set()
+            for obj in await self.objects_by_urls(indexed, headers_only):
+                header = obj if headers_only else icalscan.scan(obj.data)
+                href = self._index_key(header.href if headers_only
+                                       else obj.url)
+                returned.add(href)
+                # the index was refreshed from the results, stale entries
+                # of hrefs now holding another object are gone already
+                if (header.uid in wanted and (
+                        compfilter is None or
+                        header.component == compfilter)):
+                    wanted.discard(header.uid)
+                    ret[header.uid] = obj
+            # entries of objects gone from the server
+            for href in indexed:
+                if href not in returned:
+                    index.discard_href(href)
+
+        # bounds all the requests, anyof queries and fallbacks alike
+        limiter = asyncio.Semaphore(concurrency)
+
+        async def fetch(chunk):
+            if compfilter is not None and len(chunk) == 1:
+                async with limiter:
+                    return await self._report(
+                        _uid_query_template(compfilter).render(uid=chunk[0]))
+            fallbacks = [_uid_query_template(comp).render(uid=uid)
+                         for uid in chunk
+                         for comp in ((compfilter, ) if compfilter
+                                      else _UID_COMPONENTS)]
+            root = _uids_query_template(compfilter, len(chunk)).render(
+                **{'uid%d' % i: uid for i, uid in enumerate(chunk)})
+            return await self._report_anyof(root, fallbacks, limiter)
+
+        results = {}
+        uid_by_href = {}
+        for found in await asyncio.gather(
+                *[fetch(c) for c in chunked(sorted(wanted), chunk_size)]):
+            for href, props in found.items():
+                uid = icalscan.scan(props[cdav.CalendarData.tag]).uid
+                if uid in wanted:
+                    wanted.discard(uid)
+                    uid_by_href[href] = uid
+                    results[href] = props
+        objects = await self._objects_from_results(
+            results, None, headers_only)
+        ret.update((uid_by_href[href], obj)
+                   for href, obj in zip(results, objects))
+        return ret
+
     async def journal_by_uid(self, uid):
         return await self.object_by_uid(uid, comp_filter=cdav.CompFilter("VJOURNAL"))
 
@@ -852,90 +1824,206 @@ class Calendar(DAVObject):
         return await self.object_by_uid(uid, 
                                         comp_filter=cdav.CompFilter("VAVAILABILITY"))
 
-    async def events(self):
+    async def events(self, headers_only=False, limit=None, projection=None):
         """
         List all events from the calendar.
 
+        Parameters:
+         * headers_only: if True, return ObjectHeader records instead of
+           Event objects.
+         * limit: maximum number of events to return, see date_search().
+         * projection: a Projection, see date_search().
+
         Returns:
-         * [Event(), ...]
+         * [Event(), ...] or [ObjectHeader(), ...]
         """
-        all = []
-
-        data = cdav.CalendarData()
-        prop = dav.Prop() + data
-        vevent = cdav.CompFilter("VEVENT")
-        vcalendar = cdav.CompFilter("VCALENDAR") + vevent
-        filter = cdav.Filter() + vcalendar
-        root = cdav.CalendarQuery() + [prop, filter]
-
+        if limit is not None:
+            return await QueryCursor(
+                self, limit, Event, [(("VEVENT", None), None, None, 0)],
+                headers_only, projection).next_page()
+        root = _comp_query_template("VEVENT", projection).render()
         response = await self._query(root, 1, query_method='report')
         results = self._handle_prop_response(
-            response, props=[cdav.CalendarData()])
-        for r in results:
-            all.append(Event(
-                self.client, url=self.url.join(r),
-                data=results[r][cdav.CalendarData.tag], parent=self))
+            response, props=_REPORT_PROPS)
+        return await self._objects_from_results(
+            results, Event, headers_only, projection)
 
-        return all
-
-    async def journals(self):
+    async def journals(self, headers_only=False, projection=None):
         """
         List all journals from the calendar.
 
+        Parameters:
+         * headers_only: if True, return ObjectHeader records instead of
+           Journal objects.
+         * projection: a Projection, see date_search().
+
         Returns:
-         * [Journal(), ...]
+         * [Journal(), ...] or [ObjectHeader(), ...]
         """
         # TODO: this is basically a copy of events() - can we do more
         # refactoring and consolidation here?  Maybe it's wrong to do
         # separate methods for journals, todos and events?
-        all = []
-
-        data = cdav.CalendarData()
-        prop = dav.Prop() + data
-        vevent = cdav.CompFilter("VJOURNAL")
-        vcalendar = cdav.CompFilter("VCALENDAR") + vevent
-        filter = cdav.Filter() + vcalendar
-        root = cdav.CalendarQuery() + [prop, filter]
-
+        root = _comp_query_template("VJOURNAL", projection).render()
         response = await self._query(root, 1, query_method='report')
         results = self._handle_prop_response(
-            response, props=[cdav.CalendarData()])
-        for r in results:
-            all.append(Journal(
-                self.client, url=self.url.join(r),
-                data=results[r][cdav.CalendarData.tag], parent=self))
-
-        return all
+            response, props=_REPORT_PROPS)
+        return await self._objects_from_results(
+            results, Journal, headers_only, projection)
 
-    async def availabilities(self):
+    async def availabilities(self, headers_only=False, projection=None):
         """
         List all availabilities from the calendar.
 
+        Parameters:
+         * headers_only: if True, return ObjectHeader records instead of
+           Availability objects.
+         * projection: a Projection, see date_search().
+
         Returns:
-         * [Availability(), ...]
+         * [Availability(), ...] or [ObjectHeader(), ...]
         """
         # TODO: this is basically a copy of events() - can we do more
         # refactoring and consolidation here?  Maybe it's wrong to do
         # separate methods for journals, todos and events?
-        all = []
-
-        data = cdav.CalendarData()
-        prop = dav.Prop() + data
-        vevent = cdav.CompFilter("VAVAILABILITY")
-        vcalendar = cdav.CompFilter("VCALENDAR") + vevent
-        filter = cdav.Filter() + vcalendar
-        root = cdav.CalendarQuery() + [prop, filter]
-
+        root = _comp_query_template("VAVAILABILITY", projection).render()
         response = await self._query(root, 1, query_method='report')
         results = self._handle_prop_response(
-            response, props=[cdav.CalendarData()])
-        for r in results:
-            all.append(Availability(
-                self.client, url=self.url.join(r),
-                data=results[r][cdav.CalendarData.tag], parent=self))
+            response, props=_REPORT_PROPS)
+        return await self._objects_from_results(
+            results, Availability, headers_only, projection)
+
+    async def objects(self, types=None, headers_only=False, projection=None):
+        """
+        List the objects of several component types at once, i.e. to
+        mirror a calendar, with one REPORT instead of one per type.
+
+        Parameters:
+         * types: component names, i.e. ("VEVENT", "VTODO"), or None for
+           all the objects of the calendar.
+         * headers_only, projection: see date_search()
+
+        Returns:
+         * [Event(), Todo(), ...] or [ObjectHeader(), ...]
+        """
+        if types is None:
+            results = await self._report(
+                _objects_template(None, projection).render())
+        else:
+            types = tuple(sorted(set(t.upper() for t in types)))
+            if len(types) == 1:
+                results = await self._report(
+                    _comp_query_template(types[0], projection).render())
+            else:
+                results = await self._report_anyof(
+                    _objects_template(types, projection).render(),
+                    [_comp_query_template(t, projection).render()
+                     for t in types])
+        return await self._objects_from_results(
+            results, None, headers_only, projection)
+
+    async def export(self, fileobj, gzip=False, batch_size=100):
+        """
+        Write all the objects of the calendar to `fileobj` as a single
+        VCALENDAR, i.e. to produce a .ics file.  The objects are fetched
+        with calendar-multiget batches, the next batch being fetched
+        while the current one is written, so that the memory used does
+        not depend on the size of the calendar.  The calendar data is
+        copied as is, without being parsed, VTIMEZONEs only once per
+        TZID.
+
+        Parameters:
+         * fileobj: binary file object
+         * gzip: compress the output with gzip
+         * batch_size: objects per calendar-multiget
+
+        Returns:
+         * the number of objects written
+        """
+        out = GzipFile(fileobj=fileobj, mode='wb') if gzip else fileobj
+        timezones = set()
+
+        def write(results):
+            for props in results.values():
+                for name, text in icalscan.components(
+                        props[cdav.CalendarData.tag]):
+                    if name == 'VTIMEZONE':
+                        tzid = icalscan.tzid(text)
+                        if tzid in timezones:
+                            continue
+                        timezones.add(tzid)
+                    out.write(text.encode('utf-8'))
+            return len(results)
+
+        pages = self._etag_pages(batch_size)
+        pending = None
+        count = 0
+        try:
+            out.write(b"BEGIN:VCALENDAR\r\nVERSION:2.0\r\n"
+                      b"PRODID:-//aiocaldav//export//EN\r\n")
+            async for page in pages:
+                previous, pending = pending, asyncio.ensure_future(
+                    self._multiget([href for href, _ in page]))
+                if previous is not None:
+                    count += write(await previous)
+            if pending is not None:
+                count += write(await pending)
+            out.write(b"END:VCALENDAR\r\n")
+        finally:
+            if pending is not None:
+                pending.cancel()
+            await pages.aclose()
+            if gzip:
+                out.close()
+        return count
+
+    async def get_ctag(self):
+        """
+        The collection tag of the calendar, changing with each change
+        to its objects: the CalendarServer getctag property, or the
+        RFC 6578 sync-token for servers without it.
 
-        return all
+        Returns:
+         * str, or None if the server supports neither
+        """
+        props = await self.get_properties([cs.GetCtag(), dav.SyncToken()])
+        return props.get(cs.GetCtag.tag) or props.get(dav.SyncToken.tag)
+
+    async def _etag_pages(self, size):
+        """
+        Internal method listing the objects of the calendar like etags(),
+        as lists of at most `size` (href, etag).  A PROPFIND cannot be
+        paged: the listing comes in one response, whose elements are
+        dropped as they are listed.
+        """
+        response = await self._query_properties([dav.GetEtag()], 1)
+        own_path = self.url.strip_trailing_slash().path
+        page = []
+        for r in list(response.tree.iter(dav.Response.tag)):
+            href = unquote(r.findtext('.//' + dav.Href.tag))
+            if href.rstrip('/') != own_path:
+                page.append((href, r.findtext('.//' + dav.GetEtag.tag)))
+            r.getparent().remove(r)
+            if len(page) == size:
+                yield page
+                page = []
+        if page:
+            yield page
+
+    async def etags(self):
+        """
+        List the objects of the calendar with their etag, with one
+        PROPFIND at depth 1 and without transferring any calendar data.
 
+        Returns:
+         * {path: etag}
+        """
+        props = [dav.GetEtag()]
+        response = await self._query_properties(props, 1)
+        results = self._handle_prop_response(response, props)
+        own_path = self.url.strip_trailing_slash().path
+        return {href: props[dav.GetEtag.tag]
+                for href, props in results.items()
+                if href.rstrip('/') != own_path}
 
 
 class CalendarObjectResource(DAVObject):
@@ -943,15 +2031,26 @@ class CalendarObjectResource(DAVObject):
     Ref RFC 4791, section 4.1, a "Calendar Object Resource" can be an
     event, a todo-item, a journal entry, a free/busy entry, etc.
     """
-    _instance = None
-    _data = None
+    __slots__ = ('_instance', '_data', 'etag', 'partial', 'saving')
 
-    def __init__(self, client=None, url=None, data=None, parent=None, id=None):
+    def __init__(self, client=None, url=None, data=None, parent=None, id=None,
+                 etag=None):
         """
-        CalendarObjectResource has an additional parameter for its constructor:
+        CalendarObjectResource has additional parameters for its constructor:
          * data = "...", vCal data for the event
+         * etag = the entity tag of the object on the server, as returned
+           by the queries, load() and save()
+
+        `partial` is set on the objects fetched with a Projection, which
+        cannot be saved until reloaded.  `saving` is the future of the
+        last save queued in a WriteBehind, see save().
         """
         super().__init__(client=client, url=url, parent=parent, id=id)
+        self._instance = None
+        self._data = None
+        self.etag = etag
+        self.partial = False
+        self.saving = None
         if data is not None:
             self.data = data
 
@@ -960,10 +2059,79 @@ class CalendarObjectResource(DAVObject):
         Events, todos etc can be copied within the same calendar, to another
         calendar or even to another caldav server
         """
-        return self.__class__(
+        obj = self.__class__(
             parent=new_parent or self.parent,
             data=self.data,
             id=self.id if keep_uid else str(uuid.uuid1()))
+        obj.partial = self.partial
+        return obj
+
+    async def copy_to(self, calendar, overwrite=False):
+        """
+        Copy the object to another calendar, keeping its name and UID.
+        On the same server this is a WebDAV COPY and the data does not
+        go through the client, otherwise the object is downloaded if
+        needed and uploaded to the target.
+
+        Parameters:
+         * calendar: target Calendar
+         * overwrite: replace an object of the same name in the target,
+           by default a CopyError is raised
+
+        Returns:
+         * the copy, same class as self
+        """
+        return await self._transfer(calendar, overwrite, move=False)
+
+    async def move_to(self, calendar, overwrite=False):
+        """
+        Move the object to another calendar, see copy_to().  Raises
+        MoveError if the move fails.
+
+        Returns:
+         * the moved object, same class as self
+        """
+        return await self._transfer(calendar, overwrite, move=True)
+
+    async def _transfer(self, calendar, overwrite, move):
+        target = calendar.url.join(self.url.path.rsplit('/', 1)[1])
+        fail = error.MoveError if move else error.CopyError
+        r = None
+        if _same_origin(self.url, target):
+            method = self.client.move if move else self.client.copy
+            r = await method(self.url, target, overwrite)
+        # 502: the server won't copy to another server
+        if r is None or r.status == 502:
+            if self.data is None or self.partial:
+                await self.load()
+            data = self.data
+            headers = {"Content-Type": 'text/calendar; charset="utf-8"'}
+            if not overwrite:
+                headers["If-None-Match"] = "*"
+            r = await calendar.client.put(target, data, headers)
+            if r.status not in (201, 204):
+                raise fail(errmsg(r))
+            etag = r.headers.get('ETag')
+            if move:
+                await self.delete()
+        else:
+            if r.status not in (201, 204):
+                raise fail(errmsg(r))
+            # the server copies the data as is
+            data, etag = self.data, None
+            if move:
+                index = getattr(self.parent, 'uid_index', None)
+                if index is not None:
+                    index.discard_href(self.url.path)
+        obj = self.__class__(client=calendar.client, url=target,
+                             parent=calendar, data=data, id=self.id,
+                             etag=etag)
+        # a server side copy of projected data holds the same data
+        obj.partial = self.partial
+        index = getattr(calendar, 'uid_index', None)
+        if index is not None and isinstance(data, str):
+            index.add(icalscan.scan(data).uid, target.path)
+        return obj
 
     async def load(self):
         """
@@ -975,6 +2143,8 @@ class CalendarObjectResource(DAVObject):
         elif r.status >= 500:
             raise error.ServerError(errmsg(r))
         self.data = vcal.fix(r.raw)
+        self.etag = r.headers.get('ETag')
+        self.partial = False
         return self
 
     async def _create(self, data, id=None, path=None, new=False):
@@ -1002,7 +2172,7 @@ class CalendarObjectResource(DAVObject):
                 if obj is not None:
                     if not hasattr(obj, 'uid'):
                         obj.add('uid')
-                    obj.uid = id
+                    obj.uid.value = id
                     break
         if path is None and id is not None:
             path = id + ".ics"
@@ -1014,7 +2184,16 @@ class CalendarObjectResource(DAVObject):
             headers["If-None-Match"] = "*"
         else:
             headers["If-Match"] = "*"
-        r = await self.client.put(path, data, headers)
+        try:
+            r = await self.client.put(path, data, headers)
+        except OFFLINE_ERRORS:
+            if self.client.outbox is None:
+                raise
+            self.client.outbox.put(path, data, None if new else self.etag,
+                                   new)
+            self.url = URL.objectify(path)
+            self.id = id
+            return
 
         if r.status == 302:
             path = [x[1] for x in r.headers if x[0] == 'location'][0]
@@ -1023,19 +2202,58 @@ class CalendarObjectResource(DAVObject):
 
         self.url = URL.objectify(path)
         self.id = id
+        # servers omit the ETag when they altered the stored data
+        self.etag = r.headers.get('ETag')
+        index = getattr(self.parent, 'uid_index', None)
+        if index is not None:
+            index.add(icalscan.scan(data).uid, self.url.path)
 
     async def save(self, new=False):
         """
         Save the object, can be used for creation and update.
 
+        With a WriteBehind set as `client.write_behind`, the object is
+        only queued and written later, see aiocaldav.writebehind; await
+        `self.saving` to wait for the write and get its outcome.  With
+        an Outbox set as `client.outbox`, the write is recorded there if
+        the server cannot be reached, see aiocaldav.outbox.
+
+        Objects fetched with a Projection hold partial data, saving them
+        raises a PutError until they are reloaded with load().
+
         Returns:
          * self
         """
-        if self._instance is not None:
+        if self.partial:
+            raise error.PutError(
+                "%s holds partial data, load() it before saving" % self.url)
+        write_behind = self.client.write_behind
+        if write_behind is not None and self.instance is not None:
+            self.saving = write_behind.save(self, new)
+            return self
+        return await self._save(new)
+
+    async def _save(self, new=False):
+        if self.instance is not None:
             path = self.url.path if self.url else None
-            await self._create(self._instance.serialize(), self.id, path, new=new)
+            await self._create(self.instance.serialize(), self.id, path, new=new)
         return self
 
+    async def delete(self):
+        """
+        Delete the object.  With an Outbox set as `client.outbox`, the
+        deletion is recorded there if the server cannot be reached.
+        """
+        try:
+            await super().delete()
+        except OFFLINE_ERRORS:
+            if self.client.outbox is None:
+                raise
+            self.client.outbox.delete(self.url, self.etag)
+        index = getattr(self.parent, 'uid_index', None)
+        if index is not None and self.url is not None:
+            index.discard_href(self.url.path)
+
     def __str__(self):
         return "%s: %s" % (self.__class__.__name__, self.url)
 
@@ -1059,6 +2277,10 @@ class CalendarObjectResource(DAVObject):
         return self
 
     def _get_instance(self):
+        if self._instance is None and self._data:
+            # data a process pool parse executor could not send back
+            # parsed is only parsed when needed
+            self._instance = vobject.readOne(self._data)
         return self._instance
     instance = property(_get_instance, _set_instance,
                         doc="vobject instance of the object")
@@ -1068,6 +2290,8 @@ class Event(CalendarObjectResource):
     """
     The `Event` object is used to represent an event (VEVENT).
     """
+    __slots__ = ()
+
     async def load(self):
         """
         Load the object from the caldav server.
@@ -1078,6 +2302,8 @@ class Event(CalendarObjectResource):
         elif r.status >= 500:
             raise error.ServerError(errmsg(r))
         self.data = vcal.fix(r.raw)
+        self.etag = r.headers.get('ETag')
+        self.partial = False
         return self
 
 
@@ -1085,6 +2311,8 @@ class Journal(CalendarObjectResource):
     """
     The `Journal` object is used to represent a journal entry (VJOURNAL).
     """
+    __slots__ = ()
+
     async def load(self):
         """
         Load the object from the caldav server.
@@ -1095,6 +2323,8 @@ class Journal(CalendarObjectResource):
         elif r.status >= 500:
             raise error.ServerError(errmsg(r))
         self.data = vcal.fix(r.raw)
+        self.etag = r.headers.get('ETag')
+        self.partial = False
         return self
 
 
@@ -1102,6 +2332,8 @@ class Availability(CalendarObjectResource):
     """
     The `Availability` object is used to represent an availability (VAVAILABILITY).
     """
+    __slots__ = ()
+
     async def load(self):
         """
         Load the object from the caldav server.
@@ -1112,6 +2344,8 @@ class Availability(CalendarObjectResource):
         elif r.status >= 500:
             raise error.ServerError(errmsg(r))
         self.data = vcal.fix(r.raw)
+        self.etag = r.headers.get('ETag')
+        self.partial = False
         return self
 
 
@@ -1120,6 +2354,7 @@ class FreeBusy(CalendarObjectResource):
     The `FreeBusy` object is used to represent a freebusy response from the
     server.
     """
+    __slots__ = ()
 
     def __init__(self, parent, data):
         """
@@ -1136,6 +2371,7 @@ class Todo(CalendarObjectResource):
     """
     The `Todo` object is used to represent a todo item (VTODO).
     """
+    __slots__ = ()
 
     async def complete(self, completion_timestamp=None):
         """
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+"""
+Durable outbox for the writes made while the server is unreachable.
+
+With an Outbox set as `client.outbox`, a save or delete of a calendar
+object failing because the server cannot be reached is recorded in a
+SQLite database instead of raising.  Once the server is back,
+`Outbox.replay()` sends the recorded writes, in order.
+
+Only the net effect of the writes to one href is kept: saving an object
+three times keeps the last data, creating then deleting an object
+leaves nothing to send.  Each replayed request carries a precondition
+describing the server state the write was made against (If-None-Match
+for creations, If-Match with the known etag otherwise), so that a
+replayed write never overwrites changes made meanwhile by someone else.
+
+The outbox is written synchronously, from the event loop: each recorded
+write and each replayed one commits a small SQLite transaction.  The
+database uses write-ahead logging without a sync per commit, which
+keeps that to a fraction of a millisecond on local disks; keep it off
+network file systems.
+"""
+
+import asyncio
+import sqlite3
+
+import aiohttp
+
+from aiocaldav.lib import error
+from aiocaldav.lib.concurrency import run_bulk
+
+# exceptions meaning the server could not be reached at all
+OFFLINE_ERRORS = (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+
+
+def is_offline(e):
+    """True if the exception `e` means the server is unreachable"""
+    return isinstance(e, OFFLINE_ERRORS + (error.ServerError,))
+
+
+class Operation:
+    """
+    A recorded write.  `new` is set for creations (replayed with
+    If-None-Match: *), `etag` is the etag the write was made against.
+    """
+    __slots__ = ('seq', 'method', 'href', 'data', 'etag', 'new')
+
+    def __init__(self, seq, method, href, data, etag, new):
+        self.seq = seq
+        self.method = method
+        self.href = href
+        self.data = data
+        self.etag = etag
+        self.new = bool(new)
+
+    def headers(self):
+        if self.new:
+            return {"If-None-Match": "*"}
+        return {"If-Match": self.etag or "*"}
+
+    def __repr__(self):
+        return "Operation(%s %s)" % (self.method, self.href)
+
+
+class Outbox:
+    """
+    SQLite backed queue of the writes to replay.
+
+    Parameters:
+     * path: file name of the database, ":memory:" for tests
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._db = sqlite3.connect(path)
+        # commits run on the event loop, don't wait for fsync on each
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.execute("PRAGMA synchronous = NORMAL")
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " href TEXT UNIQUE NOT NULL,"
+                " method TEXT NOT NULL,"
+                " data TEXT,"
+                " etag TEXT,"
+                " new INTEGER NOT NULL)")
+
+    def close(self):
+        self._db.close()
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def operations(self):
+        """
+        Returns:
+         * list of the pending Operation, in replay order
+        """
+        return [Operation(*row) for row in self._db.execute(
+            "SELECT seq, method, href, data, etag, new FROM outbox"
+            " ORDER BY seq")]
+
+    def put(self, href, data, etag=None, new=False):
+        """
+        Record a PUT of `data` to `href`.
+
+        Parameters:
+         * href: URL of the object
+         * data: text of the object
+         * etag: the etag of the object known when saving, if any
+         * new: the object is created, it must not exist on the server
+        """
+        self._record("PUT", str(href), data, etag, new)
+
+    def delete(self, href, etag=None):
+        """Record a DELETE of `href`, made against `etag` if known"""
+        self._record("DELETE", str(href), None, etag, False)
+
+    def _record(self, method, href, data, etag, new):
+        with self._db:
+            row = self._db.execute(
+                "SELECT seq, new FROM outbox WHERE href = ?",
+                (href, )).fetchone()
+            if row is not None:
+                # the server state is the one the first write was made
+                # against, only the last write is worth sending; it
+                # keeps the place of the first one in the replay order
+                if method == "DELETE" and row[1]:
+                    # created and deleted while offline
+                    self._db.execute("DELETE FROM outbox WHERE seq = ?",
+                                     (row[0], ))
+                else:
+                    self._db.execute(
+                        "UPDATE outbox SET method = ?, data = ?"
+                        " WHERE seq = ?", (method, data, row[0]))
+                return
+            self._db.execute(
+                "INSERT INTO outbox (href, method, data, etag, new)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (href, method, data, etag, int(bool(new))))
+
+    def _applied(self, op, etag):
+        """
+        Remove `op` once sent; a write to the same href recorded since
+        is now made against the state `op` left on the server.
+        """
+        with self._db:
+            self._db.execute("DELETE FROM outbox WHERE seq = ?", (op.seq, ))
+            row = self._db.execute(
+                "SELECT seq, method FROM outbox WHERE href = ?",
+                (op.href, )).fetchone()
+            if row is None:
+                return
+            if op.method == "PUT":
+                self._db.execute(
+                    "UPDATE outbox SET new = 0, etag = ? WHERE seq = ?",
+                    (etag, row[0]))
+            elif row[1] == "DELETE":
+                self._db.execute("DELETE FROM outbox WHERE seq = ?",
+                                 (row[0], ))
+            else:
+                self._db.execute(
+                    "UPDATE outbox SET new = 1, etag = NULL WHERE seq = ?",
+                    (row[0], ))
+
+    async def _send(self, client, op):
+        if op.method == "PUT":
+            r = await client.put(op.href, op.data, dict(
+                op.headers(),
+                **{"Content-Type": 'text/calendar; charset="utf-8"'}))
+            # a creation already replayed before a crash finds the object
+            done = r.status in (200, 201, 204) or (
+                r.status == 412 and op.new)
+        else:
+            r = await client.delete(op.href, op.headers())
+            done = r.status in (200, 204, 404)
+        if r.status >= 500:
+            raise error.ServerError("%s %s: %s %s" % (
+                op.method, op.href, r.status, r.reason))
+        if not done:
+            # the object changed on the server meanwhile, the write
+            # is dropped and reported
+            with self._db:
+                self._db.execute("DELETE FROM outbox WHERE seq = ?",
+                                 (op.seq, ))
+            raise error.exception_by_method[op.method.lower()](
+                "%s %s: %s %s" % (op.method, op.href, r.status, r.reason))
+        self._applied(op, r.headers.get('ETag'))
+        return r.status
+
+    async def replay(self, client, concurrency=4, progress=None):
+        """
+        Send the pending writes.  Writes to different hrefs are sent
+        concurrently; if the server is still unreachable, the replay
+        stops and the writes not sent are kept for the next one.
+
+        Parameters:
+         * client: DAVClient
+         * concurrency: int, writes in flight at a time
+         * progress: optional callable(done, total)
+
+        Returns:
+         * BulkResult() of the Operation sent; the failed ones are
+           dropped from the outbox unless the server was unreachable
+        """
+        return await run_bulk(
+            lambda op: self._send(client, op), self.operations(),
+            concurrency=concurrency, progress=progress,
+            stop_on_error=is_offline)
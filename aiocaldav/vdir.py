@@ -0,0 +1,404 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+"""
+Two-way synchronization of a calendar with a local vdir, a directory
+holding one .ics file per object (as used by khal or vdirsyncer).
+
+A status database records, for each object, its href and etag on the
+server and the name, mtime, size and content hash of its file.  Files
+whose mtime and size did not change are not read, and the objects of the
+calendar are not even listed while its ctag did not change: a sync with
+nothing to do costs one directory scan and one PROPFIND.
+
+Objects are downloaded to files named after their href when that is a
+plain .ics file name, and after a hash of their href otherwise.  Only
+the objects whose file was written or read by an earlier sync, then
+removed, are deleted from the server.
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import time
+from urllib.parse import quote, unquote
+
+from aiocaldav.lib import error
+from aiocaldav.lib.concurrency import chunked, gather_bounded, run_bulk
+
+CONFLICT_POLICIES = ('remote', 'local', 'error')
+
+# file names used as they are for the objects downloaded
+_SAFE_NAME = re.compile(r'^[\w@+=-][\w@+=.-]{0,200}\.ics$')
+
+
+class SyncReport:
+    """
+    Counts of a sync run, and the names of the files in `conflicts`
+    left unresolved and of the ones which `failed` with their exception.
+    """
+    __slots__ = ('uploaded', 'downloaded', 'deleted_local', 'deleted_remote',
+                 'conflicts', 'failed', 'elapsed')
+
+    def __init__(self):
+        self.uploaded = 0
+        self.downloaded = 0
+        self.deleted_local = 0
+        self.deleted_remote = 0
+        self.conflicts = []
+        self.failed = []
+        self.elapsed = 0.0
+
+    def __str__(self):
+        return ("%d uploaded, %d downloaded, %d deleted locally, "
+                "%d deleted remotely, %d conflicts, %d failed in %.2fs" % (
+                    self.uploaded, self.downloaded, self.deleted_local,
+                    self.deleted_remote, len(self.conflicts),
+                    len(self.failed), self.elapsed))
+
+
+class _Status:
+    __slots__ = ('name', 'etag', 'mtime', 'size', 'hash')
+
+    def __init__(self, name, etag, mtime, size, hash):
+        self.name = name
+        self.etag = etag
+        self.mtime = mtime
+        self.size = size
+        self.hash = hash
+
+
+def _hash(raw):
+    return hashlib.sha1(raw).hexdigest()
+
+
+class VdirSync:
+    """
+    Keep `calendar` and the directory `path` in sync.
+
+    Usage:
+
+        sync = VdirSync(calendar, "~/.calendars/work", "work.status")
+        report = await sync.sync()
+
+    An object changed on one side only is copied to the other side, a
+    deletion on one side is applied to the other unless the object was
+    changed there.  Objects changed on both sides are conflicts, solved
+    according to `conflict`:
+     * "remote": the server version wins
+     * "local": the local version wins
+     * "error": both are left as they are and the conflict is reported,
+       until one side is changed back
+     * or a callable(name, local data, remote data) returning the data
+       to store on both sides
+
+    Parameters:
+     * calendar: Calendar
+     * path: the vdir
+     * status: path of the SQLite status database
+     * conflict: see above
+     * concurrency: transfers in flight at a time
+     * batch_size: objects per calendar-multiget
+    """
+
+    def __init__(self, calendar, path, status, conflict='error',
+                 concurrency=8, batch_size=50):
+        if not callable(conflict) and conflict not in CONFLICT_POLICIES:
+            raise ValueError("conflict must be one of %s, or a callable" % (
+                ", ".join(CONFLICT_POLICIES)))
+        self.calendar = calendar
+        self.path = os.path.expanduser(path)
+        self.conflict = conflict
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self._db = sqlite3.connect(status)
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS items ("
+                " href TEXT PRIMARY KEY,"
+                " name TEXT UNIQUE NOT NULL,"
+                " etag TEXT,"
+                " mtime INTEGER,"
+                " size INTEGER,"
+                " hash TEXT)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS meta ("
+                " key TEXT PRIMARY KEY, value TEXT)")
+
+    def close(self):
+        self._db.close()
+
+    def _load(self):
+        items = {row[0]: _Status(*row[1:]) for row in self._db.execute(
+            "SELECT href, name, etag, mtime, size, hash FROM items")}
+        row = self._db.execute(
+            "SELECT value FROM meta WHERE key = 'ctag'").fetchone()
+        return items, row[0] if row else None
+
+    def _scan(self, items, names, touched):
+        """
+        Returns:
+         * {name: (data, mtime, size, hash)} of the new and changed files,
+           stat before being read, and the set of the names of the files
+           present
+        """
+        changed = {}
+        seen = set()
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if not entry.name.endswith('.ics') or not entry.is_file():
+                    continue
+                seen.add(entry.name)
+                st = entry.stat()
+                href = names.get(entry.name)
+                status = items[href] if href is not None else None
+                if (status is not None and status.mtime == st.st_mtime_ns
+                        and status.size == st.st_size):
+                    continue
+                with open(entry.path, 'rb') as f:
+                    raw = f.read()
+                digest = _hash(raw)
+                if status is not None and status.hash == digest:
+                    # touched, but the same content
+                    touched.append((st.st_mtime_ns, st.st_size, href))
+                    continue
+                changed[entry.name] = (raw.decode('utf-8'), st.st_mtime_ns,
+                                       st.st_size, digest)
+        return changed, seen
+
+    def _href(self, href):
+        """
+        The key of the object `href` in the status: its unquoted path, the
+        form the listings return
+        """
+        return unquote(self.calendar.url.join(href).path)
+
+    @staticmethod
+    def _name(href, taken):
+        """File name for the new object `href`, not one of `taken`"""
+        name = unquote(href.rstrip('/').rsplit('/', 1)[-1])
+        if not _SAFE_NAME.match(name) or name in taken:
+            name = _hash(href.encode('utf-8')) + ".ics"
+        return name
+
+    async def _remote_changes(self, items, names, ctag):
+        """
+        Returns:
+         * {name: href} of the new and changed objects, and the set of
+           the names of the objects deleted from the server
+        """
+        current = await self.calendar.get_ctag()
+        if current is not None and current == ctag:
+            return {}, set(), current
+        etags = {self._href(href): etag
+                 for href, etag in (await self.calendar.etags()).items()}
+        taken = set(names)
+        changed = {}
+        for href, etag in etags.items():
+            status = items.get(href)
+            if status is None:
+                name = self._name(href, taken)
+                taken.add(name)
+            elif etag is not None and status.etag == etag:
+                continue
+            else:
+                name = status.name
+            changed[name] = href
+        deleted = set(status.name for href, status in items.items()
+                      if href not in etags)
+        return changed, deleted, current
+
+    def _write_file(self, name, data):
+        """
+        Returns:
+         * (mtime, size, hash) of the file written
+        """
+        path = os.path.join(self.path, name)
+        tmp = os.path.join(self.path, ".%s.tmp" % name)
+        raw = data.encode('utf-8')
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(raw)
+            os.replace(tmp, path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size, _hash(raw)
+
+    async def _fetch(self, hrefs):
+        objects = {}
+        batches = await gather_bounded(
+            [self.calendar.objects_by_urls(batch)
+             for batch in chunked(hrefs, self.batch_size)],
+            self.concurrency)
+        for batch in batches:
+            for obj in batch:
+                objects[self._href(obj.url)] = obj
+        return objects
+
+    async def _upload(self, name, data, href, etag):
+        headers = {"Content-Type": 'text/calendar; charset="utf-8"'}
+        if href is None:
+            href = self._href(quote(name))
+            headers["If-None-Match"] = "*"
+        else:
+            headers["If-Match"] = etag or "*"
+        r = await self.calendar.client.put(
+            self.calendar.url.join(href), data, headers)
+        if r.status not in (201, 204):
+            raise error.PutError("%s: %s %s" % (name, r.status, r.reason))
+        return href, r.headers.get('ETag')
+
+    async def _delete(self, name, href, etag):
+        r = await self.calendar.client.delete(
+            self.calendar.url.join(href), {"If-Match": etag or "*"})
+        if r.status not in (200, 204, 404):
+            raise error.DeleteError("%s: %s %s" % (
+                name, r.status, r.reason))
+
+    async def sync(self):
+        """
+        Run one synchronization.  Failures of single objects, including
+        files which could not be written, are reported and retried by the
+        next sync.
+
+        Returns:
+         * SyncReport()
+        """
+        report = SyncReport()
+        started = time.perf_counter()
+        items, ctag = self._load()
+        names = {status.name: href for href, status in items.items()}
+        touched = []
+        local_changed, seen = self._scan(items, names, touched)
+        # only files known from an earlier sync can have been deleted
+        local_deleted = set(names) - seen
+        remote_changed, remote_deleted, ctag = await self._remote_changes(
+            items, names, ctag)
+
+        downloads = {}
+        # name -> (data, href, etag, (mtime, size, hash) of the file)
+        uploads = {}
+        remote_deletes = []
+        conflicts = []
+        for name in (set(local_changed) | set(remote_changed) |
+                     local_deleted | remote_deleted):
+            href = names.get(name)
+            status = items[href] if href is not None else None
+            if name in local_changed and name in remote_changed:
+                conflicts.append(name)
+            elif name in local_changed:
+                data, mtime, size, digest = local_changed[name]
+                if name in remote_deleted:
+                    uploads[name] = (data, None, None, (mtime, size, digest))
+                else:
+                    uploads[name] = (data, href, status and status.etag,
+                                     (mtime, size, digest))
+            elif name in remote_changed:
+                # a change wins over a deletion on the other side
+                downloads[name] = remote_changed[name]
+            elif name in local_deleted and name not in remote_deleted:
+                remote_deletes.append(name)
+
+        remote = await self._fetch(
+            list(downloads.values()) +
+            [remote_changed[name] for name in conflicts])
+
+        rows = []
+        forget = [names[name] for name in local_deleted & remote_deleted]
+
+        def write(name, href, etag, data):
+            try:
+                rows.append((href, name, etag) + self._write_file(name, data))
+            except (OSError, UnicodeError) as e:
+                report.failed.append((name, e))
+                return False
+            return True
+
+        for name, href in downloads.items():
+            obj = remote.get(href)
+            if obj is None:
+                # deleted since listed
+                continue
+            if write(name, href, obj.etag, obj.data):
+                report.downloaded += 1
+        for name in conflicts:
+            obj = remote.get(remote_changed[name])
+            data, mtime, size, digest = local_changed[name]
+            local_stat = (mtime, size, digest)
+            if obj is None:
+                uploads[name] = (data, None, None, local_stat)
+            elif self.conflict == 'error':
+                report.conflicts.append(name)
+            elif self.conflict == 'remote':
+                if write(name, self._href(obj.url), obj.etag, obj.data):
+                    report.downloaded += 1
+            elif self.conflict == 'local':
+                uploads[name] = (data, self._href(obj.url), obj.etag, local_stat)
+            else:
+                merged = self.conflict(name, data, obj.data)
+                try:
+                    merged_stat = self._write_file(name, merged)
+                except (OSError, UnicodeError) as e:
+                    report.failed.append((name, e))
+                    continue
+                uploads[name] = (merged, self._href(obj.url), obj.etag, merged_stat)
+        for name in remote_deleted - local_deleted - set(local_changed):
+            try:
+                os.remove(os.path.join(self.path, name))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                report.failed.append((name, e))
+                continue
+            forget.append(names[name])
+            report.deleted_local += 1
+
+        upload_results = await run_bulk(
+            lambda name: self._upload(name, *uploads[name][:3]),
+            list(uploads), concurrency=self.concurrency)
+        for result in upload_results:
+            if not result.ok:
+                report.failed.append((result.item, result.error))
+                continue
+            name = result.item
+            old = names.get(name)
+            if old is not None and old != result.value[0]:
+                # recreated under another href
+                forget.append(old)
+            # the file as it was before being read: a change made during
+            # the upload is found by the next sync
+            rows.append(result.value[:1] + (name, ) + result.value[1:] +
+                        uploads[name][3])
+            report.uploaded += 1
+        delete_results = await run_bulk(
+            lambda name: self._delete(name, names[name],
+                                      items[names[name]].etag),
+            remote_deletes, concurrency=self.concurrency)
+        for result in delete_results:
+            if result.ok:
+                forget.append(names[result.item])
+                report.deleted_remote += 1
+            else:
+                report.failed.append((result.item, result.error))
+
+        # our own writes changed the ctag, failures must be retried and
+        # conflicts found again: the objects will be listed next time
+        if uploads or remote_deletes or report.failed or report.conflicts:
+            ctag = None
+        with self._db:
+            self._db.executemany(
+                "UPDATE items SET mtime = ?, size = ? WHERE href = ?",
+                touched)
+            self._db.executemany("DELETE FROM items WHERE href = ?",
+                                 [(href, ) for href in forget])
+            self._db.executemany(
+                "INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?, ?)",
+                rows)
+            self._db.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('ctag', ?)", (ctag, ))
+        report.elapsed = time.perf_counter() - started
+        return report
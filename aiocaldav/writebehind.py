@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+"""
+Write-behind buffering of calendar object saves.
+
+Interactive clients often update the same event several times within a
+second (drag, resize, retitle).  With a WriteBehind set on the client,
+CalendarObjectResource.save() only queues the object; the queued objects
+are written after a short flush window, so that all the updates of one
+object within the window become a single PUT.
+"""
+
+import asyncio
+import collections
+import logging
+
+from aiocaldav.lib import error, icalscan
+from aiocaldav.lib.concurrency import gather_bounded
+
+log = logging.getLogger('caldav')
+
+
+class _Entry:
+    __slots__ = ('obj', 'new', 'futures')
+
+    def __init__(self, obj, new):
+        self.obj = obj
+        self.new = new
+        self.futures = []
+
+
+class WriteBehind:
+    """
+    Write-behind buffer for CalendarObjectResource.save().
+
+    Usage:
+
+        client.write_behind = WriteBehind(delay=0.5)
+        ...
+        await event.save()     # queued, returns at once
+        ...
+        await event.saving     # optional, waits for the write
+        ...
+        await client.write_behind.aclose()
+
+    Saved objects are queued by URL; the first save of an object starts
+    a flush window of `delay` seconds, after which all the queued objects
+    are written, at most `concurrency` at a time.  Saves of the same URL
+    are never sent concurrently.  Only saves are buffered, deletions go
+    through at once.
+
+    Failed writes raise from the future of the save, and are passed to
+    `on_error(obj, exception)`, or logged as warnings if it is not set.
+    """
+
+    def __init__(self, delay=0.5, concurrency=8, on_error=None):
+        self.delay = delay
+        self.concurrency = concurrency
+        self.on_error = on_error
+        # key -> _Entry, in the order of the first save
+        self._pending = collections.OrderedDict()
+        # key -> [asyncio.Lock, number of writes using it]
+        self._locks = {}
+        self._timer = None
+        self._tasks = set()
+        self._closed = False
+
+    @staticmethod
+    def _key(obj):
+        if obj.url is not None:
+            return str(obj.url)
+        # new object, its URL is only known once saved
+        data = obj.data
+        if not isinstance(data, str):
+            # built from a vobject
+            data = obj.instance.serialize()
+        return "%s#%s" % (obj.parent.url, icalscan.scan(data).uid)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def save(self, obj, new=False):
+        """
+        Queue `obj` for saving.  A later save of the same object within
+        the flush window replaces this one.
+
+        Parameters:
+         * obj: CalendarObjectResource
+         * new: see CalendarObjectResource.save()
+
+        Returns:
+         * an asyncio future, resolved with `obj` once it is written
+        """
+        if self._closed:
+            raise RuntimeError("WriteBehind is closed")
+        if obj.partial:
+            raise error.PutError(
+                "%s holds partial data, load() it before saving" % obj.url)
+        loop = asyncio.get_running_loop()
+        key = self._key(obj)
+        entry = self._pending.get(key)
+        if entry is None:
+            # a creation followed by updates is still a creation
+            entry = self._pending[key] = _Entry(obj, new)
+        else:
+            entry.obj = obj
+        future = loop.create_future()
+        # the caller may not wait for the future, don't warn about it
+        future.add_done_callback(
+            lambda f: f.cancelled() or f.exception())
+        entry.futures.append(future)
+        if self._timer is None:
+            self._timer = loop.call_later(self.delay, self._on_timer)
+        return future
+
+    def _on_timer(self):
+        self._timer = None
+        task = asyncio.ensure_future(self._flush_pending())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush_pending(self):
+        batch = self._pending
+        self._pending = collections.OrderedDict()
+        await gather_bounded(
+            [self._write(key, entry) for key, entry in batch.items()],
+            self.concurrency)
+
+    async def _write(self, key, entry):
+        lock = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        lock[1] += 1
+        try:
+            async with lock[0]:
+                await entry.obj._save(new=entry.new)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            for future in entry.futures:
+                if not future.done():
+                    future.set_exception(e)
+            if self.on_error is not None:
+                self.on_error(entry.obj, e)
+            else:
+                log.warning("write-behind save of %s failed: %s",
+                            entry.obj.url, e)
+        else:
+            for future in entry.futures:
+                if not future.done():
+                    future.set_result(entry.obj)
+        finally:
+            lock[1] -= 1
+            if not lock[1]:
+                del self._locks[key]
+
+    async def flush(self):
+        """Write the queued objects now, and wait for writes in flight"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self._flush_pending()
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks))
+
+    async def aclose(self):
+        """Flush, then refuse further saves"""
+        self._closed = True
+        await self.flush()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
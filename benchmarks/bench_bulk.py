@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""
+Throughput of bulk writes against the in-memory server of
+tests/memoryserver.py: add_event() in a loop versus Calendar.add_many()
+and delete_many() at several concurrency levels, with and without a
+shared aiohttp session.
+
+Usage: PYTHONPATH=. python benchmarks/bench_bulk.py [count]
+"""
+import asyncio
+import sys
+import time
+from datetime import datetime, timedelta
+
+import aiohttp
+
+from aiocaldav.davclient import DAVClient
+from aiocaldav.objects import Calendar
+
+from tests.memoryserver import CALENDAR, MemoryServer, make_event
+
+
+async def run(count):
+    server = await MemoryServer().start()
+    icals = [make_event("bulk-%d" % i, datetime(2019, 1, 1) + timedelta(i))
+             for i in range(count)]
+
+    async def measure(label, client, write):
+        server.add_calendar(CALENDAR)
+        calendar = Calendar(client, client.url.join(CALENDAR))
+        started = time.perf_counter()
+        await write(calendar)
+        elapsed = time.perf_counter() - started
+        assert len(server.collections[CALENDAR].objects) == count
+        started = time.perf_counter()
+        result = await calendar.delete_many(
+            list(server.collections[CALENDAR].objects), concurrency=16)
+        deleted = time.perf_counter() - started
+        assert not result.failed
+        print("%-34s add %7.0f objects/s, delete_many %7.0f objects/s" % (
+            label, count / elapsed, count / deleted))
+
+    async def sequential(calendar):
+        for ical in icals:
+            await calendar.add_event(ical)
+
+    def bulk(concurrency):
+        async def write(calendar):
+            result = await calendar.add_many(icals, concurrency=concurrency)
+            assert not result.failed
+        return write
+
+    client = DAVClient(server.url)
+    await measure("add_event loop", client, sequential)
+    for concurrency in (1, 8, 32):
+        await measure("add_many, concurrency %d" % concurrency, client,
+                      bulk(concurrency))
+    async with aiohttp.ClientSession() as session:
+        client = DAVClient(server.url, session=session)
+        await measure("add_event loop, shared session", client, sequential)
+        for concurrency in (8, 32):
+            await measure("add_many, %d, shared session" % concurrency,
+                          client, bulk(concurrency))
+    await server.stop()
+
+
+if __name__ == '__main__':
+    asyncio.run(run(*[int(a) for a in sys.argv[1:]] or [1000]))
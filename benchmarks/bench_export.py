@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""
+Peak memory and duration of exporting a calendar to one .ics file:
+events() and joining the vobject trees versus Calendar.export(), against
+the in-memory server of tests/memoryserver.py.  The server runs in the
+same process, its own allocations are part of both peaks.
+
+Usage: PYTHONPATH=. python benchmarks/bench_export.py [count]
+"""
+import asyncio
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import vobject
+
+from aiocaldav.davclient import DAVClient
+from aiocaldav.objects import Calendar
+
+from tests.memoryserver import CALENDAR, MemoryServer, make_event
+
+
+class Discard:
+    """A file object counting and dropping what is written"""
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+
+
+async def run(count):
+    server = await MemoryServer().start()
+    server.add_calendar(CALENDAR)
+    for i in range(count):
+        server.add_object(CALENDAR + "event-%d.ics" % i, make_event(
+            "event-%d" % i, datetime(2019, 1, 1) + timedelta(hours=i)))
+    client = DAVClient(server.url, timeout=None)
+    calendar = Calendar(client, client.url.join(CALENDAR))
+
+    async def events(out):
+        cal = vobject.iCalendar()
+        for event in await calendar.events():
+            cal.add(event.instance.vevent)
+        out.write(cal.serialize().encode('utf-8'))
+
+    async def export(out):
+        await calendar.export(out)
+
+    for label, write in (("events() and serialize", events),
+                         ("export()", export)):
+        out = Discard()
+        tracemalloc.start()
+        started = time.perf_counter()
+        await write(out)
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print("%-24s %7d bytes written in %6.0f ms, peak %6.1f MB" % (
+            label, out.size, elapsed * 1000, peak / (1 << 20)))
+    await server.stop()
+
+
+if __name__ == '__main__':
+    asyncio.run(run(*[int(a) for a in sys.argv[1:]] or [5000]))
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+"""
+Compare the header scanner with a full vobject parse.
+
+Usage: python benchmarks/bench_icalscan.py [iterations]
+"""
+import glob
+import os
+import sys
+import timeit
+
+import vobject
+
+from aiocaldav.lib import icalscan, vcal
+
+
+def main(iterations=200):
+    static = os.path.join(os.path.dirname(__file__), '..', 'tests', 'static')
+    files = sorted(glob.glob(os.path.join(static, '*_ok_*.ics')))
+    data = []
+    for f in files:
+        with open(f) as fd:
+            data.append(fd.read())
+
+    def run_vobject():
+        for d in data:
+            inst = vobject.readOne(vcal.fix(d))
+            for comp in inst.components():
+                getattr(comp, 'uid', None)
+
+    def run_scan():
+        for d in data:
+            icalscan.scan(d)
+
+    n = len(data) * iterations
+    t_vobject = timeit.timeit(run_vobject, number=iterations)
+    t_scan = timeit.timeit(run_scan, number=iterations)
+    print("%d objects" % n)
+    print("vobject.readOne: %8.1f us/object" % (t_vobject / n * 1e6))
+    print("icalscan.scan:   %8.1f us/object" % (t_scan / n * 1e6))
+    print("speedup:         %8.1fx" % (t_vobject / t_scan))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
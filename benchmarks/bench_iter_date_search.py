@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""
+Time to first result and peak memory of Calendar.date_search versus
+Calendar.iter_date_search over a multi-year range, against the in-memory
+server of tests/memoryserver.py.  The server runs on the same event
+loop and evaluates the filter over the whole collection for every
+REPORT, so the windowed total is pessimistic.
+
+Usage: PYTHONPATH=. python benchmarks/bench_iter_date_search.py [years]
+"""
+import asyncio
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from aiocaldav.davclient import DAVClient
+from aiocaldav.objects import Calendar
+
+from tests.memoryserver import CALENDAR, MemoryServer, make_event
+
+
+async def run(years):
+    server = await MemoryServer().start()
+    server.add_calendar(CALENDAR)
+    start = datetime(2015, 1, 1)
+    for i in range(years * 365):
+        server.add_object(CALENDAR + "event-%d.ics" % i,
+                          make_event("event-%d" % i, start + timedelta(i)))
+    client = DAVClient(server.url, timeout=None)
+    calendar = Calendar(client, client.url.join(CALENDAR))
+    end = start + timedelta(days=years * 365)
+
+    async def whole():
+        return await calendar.date_search(start, end, expand=False)
+
+    async def windowed():
+        first = None
+        count = 0
+        async for _ in calendar.iter_date_search(start, end):
+            count += 1
+            if first is None:
+                first = time.perf_counter()
+        return first, count
+
+    for label, search in (("date_search", whole),
+                          ("iter_date_search", windowed)):
+        tracemalloc.start()
+        started = time.perf_counter()
+        result = await search()
+        total = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        if isinstance(result, list):
+            first, count = started + total, len(result)
+        else:
+            first, count = result
+        print("%-17s %5d objects, first after %7.0f ms, total %7.0f ms, "
+              "peak %6.1f MB" % (label, count, (first - started) * 1000,
+                                 total * 1000, peak / (1 << 20)))
+    await server.stop()
+
+
+if __name__ == '__main__':
+    asyncio.run(run(*[int(a) for a in sys.argv[1:]] or [3]))
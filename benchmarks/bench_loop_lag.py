@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+Event loop lag while a large multistatus response is parsed, inline
+versus in a thread pool (DAVResponse.parse_in_executor).
+
+A ticker coroutine sleeps 1 ms in a loop and records how late it wakes
+up; the worst delay is the time the loop was frozen.
+
+Usage: python benchmarks/bench_loop_lag.py [size_in_mb]
+"""
+import asyncio
+import os
+import sys
+import time
+
+from aiocaldav.davclient import DAVResponse
+
+
+class FakeResponse:
+    status = 207
+    reason = "Multi-Status"
+    headers = {'Content-Type': 'application/xml; charset="utf-8"'}
+
+    def __init__(self, body):
+        self.body = body
+
+    async def read(self):
+        return self.body
+
+
+def multistatus(size):
+    static = os.path.join(os.path.dirname(__file__), '..', 'tests', 'static')
+    with open(os.path.join(static, 'event_ok_caldav_1.ics')) as fd:
+        data = fd.read().replace('&', '&amp;').replace('<', '&lt;')
+    chunks = ['<?xml version="1.0" encoding="utf-8"?>\n'
+              '<D:multistatus xmlns:D="DAV:" '
+              'xmlns:C="urn:ietf:params:xml:ns:caldav">']
+    i = 0
+    total = 0
+    while total < size:
+        chunk = ('<D:response><D:href>/cal/%d.ics</D:href><D:propstat>'
+                 '<D:prop><C:calendar-data>%s</C:calendar-data></D:prop>'
+                 '<D:status>HTTP/1.1 200 OK</D:status></D:propstat>'
+                 '</D:response>' % (i, data))
+        chunks.append(chunk)
+        total += len(chunk)
+        i += 1
+    chunks.append('</D:multistatus>')
+    return ''.join(chunks).encode('utf-8')
+
+
+async def measure(body, in_executor):
+    lags = []
+    done = False
+
+    async def ticker():
+        while not done:
+            before = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lags.append(time.perf_counter() - before - 0.001)
+
+    task = asyncio.ensure_future(ticker())
+    await asyncio.sleep(0.01)
+    started = time.perf_counter()
+    response = DAVResponse()
+    await response.load(FakeResponse(body))
+    if in_executor:
+        await response.parse_in_executor()
+    assert response.tree is not None
+    elapsed = time.perf_counter() - started
+    done = True
+    await task
+    return elapsed, max(lags)
+
+
+def main(size_mb=50):
+    body = multistatus(size_mb << 20)
+    print("multistatus of %.1f MB" % (len(body) / (1 << 20)))
+    for label, in_executor in (("inline", False), ("executor", True)):
+        elapsed, lag = asyncio.run(measure(body, in_executor))
+        print("%-8s parse %6.0f ms, max loop lag %6.1f ms" % (
+            label, elapsed * 1000, lag * 1000))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
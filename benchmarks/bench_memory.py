@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+"""
+Measure the memory held by cached query results with tracemalloc.
+
+Objects are built the way Calendar.events() builds them from a REPORT
+response, without talking to a server.
+
+Usage: python benchmarks/bench_memory.py [count]
+"""
+import asyncio
+import gc
+import os
+import sys
+import tracemalloc
+
+from aiocaldav.davclient import DAVClient
+from aiocaldav.elements import cdav
+from aiocaldav.objects import Calendar, Event
+
+
+def fake_results(count):
+    static = os.path.join(os.path.dirname(__file__), '..', 'tests', 'static')
+    with open(os.path.join(static, 'event_ok_caldav_1.ics')) as fd:
+        template = fd.read()
+    uid = '20010712T182145Z-123401@example.com'
+    return {'/calendars/user/main/event-%d.ics' % i:
+            {cdav.CalendarData.tag: template.replace(uid, 'event-%d' % i)}
+            for i in range(count)}
+
+
+def measure(build, count):
+    results = fake_results(count)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    cached = asyncio.run(build(results))
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    assert len(cached) == count
+    return (after - before) / count
+
+
+def main(count=2000):
+    client = DAVClient('http://calendar.example/')
+    calendar = Calendar(client, '/calendars/user/main/')
+
+    per_event = measure(
+        lambda r: calendar._objects_from_results(r, Event), count)
+    per_header = measure(
+        lambda r: calendar._objects_from_results(r, Event, True), count)
+    print("%d cached events" % count)
+    print("Event objects (with vobject tree): %8d bytes/event" % per_event)
+    print("ObjectHeader records:              %8d bytes/event" % per_header)
+    print("Event.__dict__ present: %s" % hasattr(
+        Event(client, url='/x.ics'), '__dict__'))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+"""
+Throughput of query result parsing with a parse executor, by number of
+workers.
+
+Usage: python benchmarks/bench_parse_pool.py [count] [max_workers]
+"""
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from aiocaldav.davclient import DAVClient
+from aiocaldav.objects import Calendar, Event
+
+from bench_memory import fake_results
+
+
+def run(executor, results, headers_only):
+    client = DAVClient('http://calendar.example/', parse_executor=executor)
+    calendar = Calendar(client, '/calendars/user/main/')
+
+    async def parse():
+        return await calendar._objects_from_results(
+            results, Event, headers_only)
+
+    started = time.perf_counter()
+    assert len(asyncio.run(parse())) == len(results)
+    return len(results) / (time.perf_counter() - started)
+
+
+def main(count=5000, max_workers=None):
+    max_workers = max_workers or os.cpu_count()
+    results = fake_results(count)
+    print("%d objects, %d cpus" % (count, os.cpu_count()))
+    print("inline vobject parse:      %8.0f objects/s" % run(
+        None, results, False))
+    print("inline header scan:        %8.0f objects/s" % run(
+        None, results, True))
+    workers = 1
+    while workers <= max_workers:
+        rates = []
+        for executor_class in (ProcessPoolExecutor, ThreadPoolExecutor):
+            with executor_class(workers) as executor:
+                # start the workers before measuring
+                run(executor, fake_results(workers), False)
+                rates.append((run(executor, results, False),
+                              run(executor, results, True)))
+        print("%2d workers: process pool %8.0f parse %8.0f scan objects/s, "
+              "thread pool %8.0f parse %8.0f scan objects/s" % (
+                  (workers, ) + rates[0] + rates[1]))
+        workers *= 2
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+"""
+Compare building and serializing the date_search() request body as an
+element tree with rendering the cached template.
+
+Usage: python benchmarks/bench_query_build.py [iterations]
+"""
+import datetime
+import sys
+import timeit
+
+import pytz
+from lxml import etree
+
+from aiocaldav import objects
+from aiocaldav.elements import cdav, dav
+from aiocaldav.lib.python_utilities import utc_string
+
+
+def main(iterations=20000):
+    start = datetime.datetime(2020, 1, 1, tzinfo=pytz.utc)
+    end = datetime.datetime(2020, 2, 1, tzinfo=pytz.utc)
+
+    def build_tree():
+        data = cdav.CalendarData() + cdav.Expand(start, end)
+        prop = dav.Prop() + data
+        query = cdav.CompFilter("VEVENT") + cdav.TimeRange(start, end)
+        vcalendar = cdav.CompFilter("VCALENDAR") + query
+        root = cdav.CalendarQuery() + [prop, cdav.Filter() + vcalendar]
+        return etree.tostring(root.xmlelement(), encoding="utf-8",
+                              xml_declaration=True)
+
+    def render_template():
+        return objects._date_search_template("VEVENT", True, True).render(
+            start=utc_string(start), end=utc_string(end))
+
+    assert etree.XML(build_tree()) is not None
+    t_tree = timeit.timeit(build_tree, number=iterations)
+    t_template = timeit.timeit(render_template, number=iterations)
+    print("element tree + tostring: %6.1f us/query" % (
+        t_tree / iterations * 1e6))
+    print("cached template:         %6.1f us/query" % (
+        t_template / iterations * 1e6))
+    print("speedup:                 %6.1fx" % (t_tree / t_template))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+"""
+Duration of a VdirSync with nothing to do, against the in-memory server
+of tests/memoryserver.py, after an initial sync of `count` objects.
+
+Usage: PYTHONPATH=. python benchmarks/bench_vdir_sync.py [count]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from aiocaldav.davclient import DAVClient
+from aiocaldav.objects import Calendar
+from aiocaldav.vdir import VdirSync
+
+from tests.memoryserver import CALENDAR, MemoryServer, make_event
+
+
+async def run(count):
+    server = await MemoryServer().start()
+    server.add_calendar(CALENDAR)
+    for i in range(count):
+        server.add_object(CALENDAR + "event-%06d.ics" % i, make_event(
+            "event-%06d" % i, datetime(2019, 1, 1) + timedelta(hours=i)))
+    client = DAVClient(server.url)
+    calendar = Calendar(client, client.url.join(CALENDAR))
+    with tempfile.TemporaryDirectory() as tmp:
+        vdir = os.path.join(tmp, "vdir")
+        os.mkdir(vdir)
+        sync = VdirSync(calendar, vdir, os.path.join(tmp, "status.db"),
+                        concurrency=16, batch_size=200)
+        report = await sync.sync()
+        print("initial sync: %s" % report)
+        for _ in range(3):
+            started = time.perf_counter()
+            report = await sync.sync()
+            print("no-op sync of %d objects: %.3fs" % (
+                count, time.perf_counter() - started))
+        sync.close()
+    await server.stop()
+
+
+if __name__ == '__main__':
+    asyncio.run(run(*[int(a) for a in sys.argv[1:]] or [100000]))
@@ -21,7 +21,7 @@ if __name__ == '__main__':
                      "License :: OSI Approved :: Apache Software License",
                      "Operating System :: OS Independent",
                      "Programming Language :: Python",
-                     "Programming Language :: Python :: 3.6",
+                     "Programming Language :: Python :: 3.7",
                      "Topic :: Office/Business :: Scheduling",
                      "Topic :: Software Development :: Libraries "
                      ":: Python Modules"],
@@ -35,5 +35,6 @@ if __name__ == '__main__':
         packages=find_packages(exclude=['tests']),
         include_package_data=True,
         zip_safe=False,
+        python_requires='>=3.7',
         install_requires=['vobject', 'lxml', 'aiohttp', 'pytz'],
     )
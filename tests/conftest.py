@@ -1,4 +1,26 @@
 import pytest
+import pytest_asyncio
+
+from aiocaldav.davclient import DAVClient
+from aiocaldav.objects import Calendar
+
+from .memoryserver import CALENDAR, MemoryServer
+
+
+@pytest_asyncio.fixture
+async def server():
+    """A started MemoryServer with a "main" calendar"""
+    server = MemoryServer()
+    await server.start()
+    server.add_calendar(CALENDAR, "main")
+    yield server
+    await server.stop()
+
+
+@pytest.fixture
+def calendar(server):
+    client = DAVClient(server.url)
+    return Calendar(client, client.url.join(CALENDAR))
 
 
 def pytest_addoption(parser):
@@ -0,0 +1,565 @@
+"""A minimal in-memory CalDAV server for the offline tests and the benchmarks.
+
+It implements just enough of RFC 4918 and RFC 4791 for aiocaldav to run
+against it without docker: PROPFIND, PROPPATCH, MKCALENDAR, GET, PUT,
+DELETE, COPY, MOVE, and the calendar-query and calendar-multiget
+REPORTs.  Filters are evaluated loosely (time ranges compare the date
+strings, timezones are ignored); it is a stand-in, not a reference
+implementation.
+
+Usage:
+
+    server = MemoryServer()
+    await server.start()
+    client = DAVClient(server.url)
+    ...
+    await server.stop()
+
+The tests get a started server with a "main" calendar from the `server`
+and `calendar` fixtures of tests/conftest.py.
+"""
+import asyncio
+import hashlib
+import re
+from datetime import datetime, timedelta
+from urllib.parse import unquote, urlparse
+
+from aiohttp import web
+from lxml import etree
+
+from aiocaldav.lib import icalscan
+
+D = "DAV:"
+C = "urn:ietf:params:xml:ns:caldav"
+CS = "http://calendarserver.org/ns/"
+NSMAP = {"D": D, "C": C, "CS": CS}
+
+PRINCIPAL = "/principals/user/"
+HOME = "/calendars/user/"
+
+
+def _tag(ns, name):
+    return "{%s}%s" % (ns, name)
+
+
+def parse_ical(data):
+    """
+    Returns the main component of an iCalendar text as
+    (name, {property name: [(params, value), ...]})
+    """
+    lines = re.sub(r'\r?\n[ \t]', '', data).splitlines()
+    comp = None
+    props = {}
+    depth = 0
+    for line in lines:
+        if line.startswith('BEGIN:'):
+            name = line[6:].strip()
+            if comp is None and name not in ('VCALENDAR', 'VTIMEZONE'):
+                comp = name
+                depth = 0
+                continue
+            depth += 1
+            continue
+        if line.startswith('END:'):
+            depth -= 1
+            if comp is not None and depth < 0:
+                break
+            continue
+        if comp is None or depth > 0 or ':' not in line:
+            continue
+        head, value = line.split(':', 1)
+        name, _, params = head.partition(';')
+        props.setdefault(name.upper(), []).append((params, value))
+    return comp, props
+
+
+def project(data, comp):
+    """
+    Apply the <C:comp name="VCALENDAR"> selection `comp` of a
+    calendar-data element to an iCalendar text.
+    """
+    lines = re.sub(r'\r?\n[ \t]', '', data).splitlines()
+    selections = [comp]
+    skip = 0
+    out = []
+    for line in lines:
+        name, _, value = line.partition(':')
+        name = name.partition(';')[0].upper()
+        if skip:
+            if name == 'BEGIN':
+                skip += 1
+            elif name == 'END':
+                skip -= 1
+            continue
+        if name == 'BEGIN':
+            if not out:
+                out.append(line)
+                continue
+            current = selections[-1]
+            if current is None or current.find(_tag(C, 'allcomp')) is not None:
+                selections.append(None)
+                out.append(line)
+                continue
+            sub = [c for c in current.findall(_tag(C, 'comp'))
+                   if c.get('name') == value.strip()]
+            if not sub:
+                skip = 1
+                continue
+            selections.append(sub[0])
+            out.append(line)
+        elif name == 'END':
+            selections.pop()
+            out.append(line)
+        else:
+            current = selections[-1]
+            if (current is None or
+                    current.find(_tag(C, 'allprop')) is not None or
+                    name in [p.get('name').upper() for p in
+                             current.findall(_tag(C, 'prop'))]):
+                out.append(line)
+    return '\r\n'.join(out) + '\r\n'
+
+
+def _date(value):
+    if value is None:
+        return None
+    value = value.rstrip('Z')
+    if len(value) == 8:
+        value += 'T000000'
+    return value
+
+
+class CalendarObject:
+    def __init__(self, data, etag):
+        self.data = data
+        self.etag = etag
+
+
+class Collection:
+    def __init__(self, name=None, components=None):
+        self.name = name
+        self.components = components
+        self.objects = {}
+        self.ctag = 0
+
+    def touch(self):
+        self.ctag += 1
+
+
+class MemoryServer:
+    def __init__(self):
+        self.collections = {}
+        # (method, path, body) of each request
+        self.requests = []
+        # requests being answered, and the most at a time
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.url = None
+        self.port = None
+        # when set, calendar-query REPORTs honour <C:limit>
+        self.support_limit = True
+        # when set, calendar-query REPORTs never return more results,
+        # asked to or not
+        self.max_results = None
+        # when False, comp-filters ignore test="anyof"
+        self.support_anyof = True
+        # paths answering every request with a 500 error
+        self.failing = set()
+        # seconds to wait before answering, per path
+        self.delays = {}
+        self._runner = None
+        self._counter = 0
+
+    async def start(self, port=0):
+        """Start listening, on a free port unless restarting on `port`"""
+        app = web.Application(client_max_size=1 << 30)
+        app.router.add_route('*', '/{tail:.*}', self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        self.url = "http://127.0.0.1:%d%s" % (self.port, PRINCIPAL)
+        return self
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+    # helpers for the tests
+    def add_calendar(self, path, name=None):
+        self.collections[path] = Collection(name)
+        return self.collections[path]
+
+    def add_object(self, path, data):
+        collection, _ = self._split(path)
+        self._counter += 1
+        etag = '"%s"' % hashlib.md5(
+            ("%d%s" % (self._counter, data)).encode('utf-8')).hexdigest()
+        self.collections[collection].objects[path] = CalendarObject(
+            data, etag)
+        self.collections[collection].touch()
+        return etag
+
+    def count(self, method):
+        return len([r for r in self.requests if r[0] == method])
+
+    def _split(self, path):
+        collection = path.rsplit('/', 1)[0] + '/'
+        return collection, self.collections.get(collection)
+
+    def _find(self, path):
+        collection, coll = self._split(path)
+        if coll is None:
+            return None
+        return coll.objects.get(path)
+
+    # request handling
+    async def handle(self, request):
+        path = unquote(request.path)
+        body = await request.read()
+        self.requests.append((request.method, path, body))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if path in self.delays:
+                await asyncio.sleep(self.delays[path])
+            if path in self.failing:
+                return web.Response(status=500)
+            handler = getattr(self, 'do_' + request.method.lower(), None)
+            if handler is None:
+                return web.Response(status=405)
+            return handler(request, path, body)
+        finally:
+            self.in_flight -= 1
+
+    def _multistatus(self, responses, status=207):
+        root = etree.Element(_tag(D, 'multistatus'), nsmap=NSMAP)
+        for r in responses:
+            root.append(r)
+        return web.Response(
+            status=status, body=etree.tostring(
+                root, encoding='utf-8', xml_declaration=True),
+            content_type='application/xml', charset='utf-8')
+
+    def _response(self, href, found, missing=(), status=None):
+        response = etree.Element(_tag(D, 'response'))
+        etree.SubElement(response, _tag(D, 'href')).text = href
+        if status is not None:
+            etree.SubElement(response, _tag(D, 'status')).text = status
+            return response
+        for props, text in ((found, "HTTP/1.1 200 OK"),
+                            (missing, "HTTP/1.1 404 Not Found")):
+            if not len(props):
+                continue
+            propstat = etree.SubElement(response, _tag(D, 'propstat'))
+            prop = etree.SubElement(propstat, _tag(D, 'prop'))
+            for p in props:
+                prop.append(p)
+            etree.SubElement(propstat, _tag(D, 'status')).text = text
+        return response
+
+    def _props(self, path, wanted):
+        found = []
+        missing = []
+        coll = self.collections.get(path)
+        obj = None if coll else self._find(path)
+        for tag in wanted:
+            el = etree.Element(tag)
+            if tag == _tag(D, 'resourcetype'):
+                if path == PRINCIPAL:
+                    etree.SubElement(el, _tag(D, 'principal'))
+                elif coll is not None or path == HOME:
+                    etree.SubElement(el, _tag(D, 'collection'))
+                    if coll is not None:
+                        etree.SubElement(el, _tag(C, 'calendar'))
+            elif tag == _tag(D, 'displayname') and coll is not None:
+                if coll.name is None:
+                    missing.append(el)
+                    continue
+                el.text = coll.name
+            elif tag == _tag(D, 'current-user-principal'):
+                etree.SubElement(el, _tag(D, 'href')).text = PRINCIPAL
+            elif tag == _tag(C, 'calendar-home-set'):
+                etree.SubElement(el, _tag(D, 'href')).text = HOME
+            elif tag == _tag(CS, 'getctag') and coll is not None:
+                el.text = str(coll.ctag)
+            elif tag == _tag(D, 'sync-token') and coll is not None:
+                el.text = "http://example.com/sync/%d" % coll.ctag
+            elif tag == _tag(D, 'getetag') and obj is not None:
+                el.text = obj.etag
+            elif tag == _tag(D, 'getcontenttype') and obj is not None:
+                el.text = 'text/calendar; charset="utf-8"'
+            else:
+                missing.append(el)
+                continue
+            found.append(el)
+        return self._response(path, found, missing)
+
+    def do_propfind(self, request, path, body):
+        depth = request.headers.get('Depth', '0')
+        tree = etree.fromstring(body) if body else None
+        if tree is not None and tree.find(_tag(D, 'prop')) is not None:
+            wanted = [p.tag for p in tree.find(_tag(D, 'prop'))]
+        else:
+            wanted = [_tag(D, 'resourcetype'), _tag(D, 'displayname')]
+        if not (path in (PRINCIPAL, HOME) or path in self.collections or
+                self._find(path)):
+            return web.Response(status=404)
+        paths = [path]
+        if depth == '1':
+            if path == HOME:
+                paths += sorted(self.collections)
+            elif path in self.collections:
+                paths += list(self.collections[path].objects)
+        return self._multistatus([self._props(p, wanted) for p in paths])
+
+    def do_proppatch(self, request, path, body):
+        coll = self.collections.get(path)
+        if coll is None:
+            return web.Response(status=404)
+        tree = etree.fromstring(body)
+        name = tree.find('.//' + _tag(D, 'displayname'))
+        if name is not None:
+            coll.name = name.text
+        return self._multistatus([self._response(
+            path, [etree.Element(_tag(D, 'displayname'))])])
+
+    def do_mkcalendar(self, request, path, body):
+        if not path.endswith('/'):
+            path += '/'
+        if path in self.collections:
+            return web.Response(status=405)
+        name = None
+        if body:
+            el = etree.fromstring(body).find('.//' + _tag(D, 'displayname'))
+            if el is not None:
+                name = el.text
+        self.add_calendar(path, name)
+        return web.Response(status=201)
+
+    def do_get(self, request, path, body):
+        if path in self.collections or path in (PRINCIPAL, HOME):
+            return web.Response(status=200, text="collection")
+        obj = self._find(path)
+        if obj is None:
+            return web.Response(status=404)
+        return web.Response(status=200, text=obj.data,
+                            content_type='text/calendar',
+                            headers={'ETag': obj.etag})
+
+    def _precondition(self, request, obj):
+        if_match = request.headers.get('If-Match')
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match == '*' and obj is not None:
+            return False
+        if if_match is not None:
+            if obj is None:
+                return False
+            if if_match != '*' and if_match != obj.etag:
+                return False
+        return True
+
+    def do_put(self, request, path, body):
+        collection, coll = self._split(path)
+        if coll is None:
+            return web.Response(status=409)
+        existing = coll.objects.get(path)
+        if not self._precondition(request, existing):
+            return web.Response(status=412)
+        etag = self.add_object(path, body.decode('utf-8'))
+        return web.Response(status=204 if existing else 201,
+                            headers={'ETag': etag})
+
+    def do_delete(self, request, path, body):
+        if path in self.collections:
+            del self.collections[path]
+            return web.Response(status=204)
+        collection, coll = self._split(path)
+        obj = self._find(path)
+        if obj is None:
+            return web.Response(status=404)
+        if not self._precondition(request, obj):
+            return web.Response(status=412)
+        del coll.objects[path]
+        coll.touch()
+        return web.Response(status=204)
+
+    def _transfer(self, request, path, move):
+        obj = self._find(path)
+        if obj is None:
+            return web.Response(status=404)
+        destination = unquote(urlparse(request.headers['Destination']).path)
+        target, coll = self._split(destination)
+        if coll is None:
+            return web.Response(status=409)
+        existing = coll.objects.get(destination)
+        if existing is not None and request.headers.get('Overwrite') == 'F':
+            return web.Response(status=412)
+        self.add_object(destination, obj.data)
+        if move:
+            source, source_coll = self._split(path)
+            del source_coll.objects[path]
+            source_coll.touch()
+        return web.Response(status=204 if existing else 201)
+
+    def do_copy(self, request, path, body):
+        return self._transfer(request, path, False)
+
+    def do_move(self, request, path, body):
+        return self._transfer(request, path, True)
+
+    # REPORT
+    def do_report(self, request, path, body):
+        coll = self.collections.get(path)
+        if coll is None:
+            return web.Response(status=404)
+        tree = etree.fromstring(body)
+        prop = tree.find(_tag(D, 'prop'))
+        if tree.tag == _tag(C, 'calendar-multiget'):
+            hrefs = [unquote(h.text) for h in tree.findall(_tag(D, 'href'))]
+            responses = []
+            for href in hrefs:
+                obj = coll.objects.get(href)
+                if obj is None:
+                    responses.append(self._response(
+                        href, [], status="HTTP/1.1 404 Not Found"))
+                else:
+                    responses.append(self._object_response(href, obj, prop))
+            return self._multistatus(responses)
+        if tree.tag != _tag(C, 'calendar-query'):
+            return web.Response(status=400)
+        vcalendar = tree.find(_tag(C, 'filter') + '/' + _tag(C, 'comp-filter'))
+        matches = [(href, obj) for href, obj in coll.objects.items()
+                   if self._match_vcalendar(vcalendar, obj.data)]
+        nresults = tree.find('.//' + _tag(C, 'nresults'))
+        truncated = False
+        if (self.support_limit and nresults is not None and
+                len(matches) > int(nresults.text)):
+            matches = matches[:int(nresults.text)]
+            truncated = True
+        if (self.max_results is not None and
+                len(matches) > self.max_results):
+            matches = matches[:self.max_results]
+            truncated = True
+        responses = [self._object_response(href, obj, prop)
+                     for href, obj in matches]
+        if truncated:
+            responses.append(self._response(
+                path, [], status="HTTP/1.1 507 Insufficient Storage"))
+        return self._multistatus(responses)
+
+    def _object_response(self, href, obj, prop):
+        found = []
+        for p in (prop if prop is not None else []):
+            el = etree.Element(p.tag)
+            if p.tag == _tag(D, 'getetag'):
+                el.text = obj.etag
+            elif p.tag == _tag(C, 'calendar-data'):
+                el.text = obj.data
+                comp = p.find(_tag(C, 'comp'))
+                if comp is not None:
+                    el.text = project(obj.data, comp)
+            found.append(el)
+        return self._response(href, found)
+
+    def _match_vcalendar(self, vcalendar, data):
+        comp, props = parse_ical(data)
+        filters = vcalendar.findall(_tag(C, 'comp-filter'))
+        if not filters:
+            return True
+        results = [self._match_comp(f, comp, props) for f in filters]
+        if self.support_anyof and vcalendar.get('test') == 'anyof':
+            return any(results)
+        return all(results)
+
+    def _match_comp(self, comp_filter, comp, props):
+        if comp_filter.find(_tag(C, 'is-not-defined')) is not None:
+            return comp_filter.get('name') != comp
+        if comp_filter.get('name') != comp:
+            return False
+        results = []
+        for child in comp_filter:
+            if child.tag == _tag(C, 'time-range'):
+                results.append(self._match_time(child, props))
+            elif child.tag == _tag(C, 'prop-filter'):
+                results.append(self._match_prop(child, props))
+        if not results:
+            return True
+        if self.support_anyof and comp_filter.get('test') == 'anyof':
+            return any(results)
+        return all(results)
+
+    def _match_time(self, time_range, props):
+        start = _date(time_range.get('start'))
+        end = _date(time_range.get('end'))
+        first = lambda name: _date(props[name][0][1]) if name in props \
+            else None
+        dtstart = first('DTSTART') or first('DUE')
+        if dtstart is None:
+            # undated todos match every range
+            return True
+        dtend = first('DTEND') or first('DUE')
+        if dtend is None and 'DURATION' in props:
+            dtend = icalscan.add_duration(dtstart, props['DURATION'][0][1])
+        dtend = dtend or dtstart
+        if 'RRULE' in props:
+            dtend = '99991231T235959'
+        if end is not None and dtstart >= end:
+            return False
+        if start is not None and dtend < start and dtend != dtstart:
+            return False
+        if start is not None and dtend == dtstart and dtstart < start:
+            return False
+        return True
+
+    def _match_prop(self, prop_filter, props):
+        values = props.get(prop_filter.get('name').upper())
+        if prop_filter.find(_tag(C, 'is-not-defined')) is not None:
+            return values is None
+        if values is None:
+            return False
+        text_match = prop_filter.find(_tag(C, 'text-match'))
+        if text_match is None:
+            return True
+        found = any(text_match.text in value for _, value in values)
+        if text_match.get('negate-condition') == 'yes':
+            return not found
+        return found
+
+
+# test data
+CALENDAR = HOME + "main/"
+
+EVENT = """BEGIN:VCALENDAR
+VERSION:2.0
+PRODID:-//Example Corp.//CalDAV Client//EN
+BEGIN:VEVENT
+UID:{uid}
+DTSTAMP:20060712T182145Z
+DTSTART:{start:%Y%m%dT%H%M%SZ}
+DTEND:{end:%Y%m%dT%H%M%SZ}
+SUMMARY:{uid}
+END:VEVENT
+END:VCALENDAR
+"""
+
+TODO = """BEGIN:VCALENDAR
+VERSION:2.0
+PRODID:-//Example Corp.//CalDAV Client//EN
+BEGIN:VTODO
+UID:{uid}
+DTSTAMP:20190101T000000Z
+{extra}END:VTODO
+END:VCALENDAR
+"""
+
+
+def make_event(uid, start, hours=1):
+    return EVENT.format(uid=uid, start=start,
+                        end=start + timedelta(hours=hours))
+
+
+def add_events(server, count, start=datetime(2019, 1, 1), step=1):
+    for i in range(count):
+        server.add_object(CALENDAR + "event-%03d.ics" % i, make_event(
+            "event-%03d" % i, start + timedelta(days=i * step)))
@@ -0,0 +1,64 @@
+"""Backups and restores against the in-memory server"""
+from datetime import datetime
+
+import pytest
+
+from aiocaldav.davclient import DAVClient
+from aiocaldav import Archive
+from aiocaldav.objects import Principal
+
+from .memoryserver import (CALENDAR, TODO, MemoryServer, add_events,
+                           make_event)
+
+
+@pytest.mark.asyncio
+async def test_backup(server, calendar, tmp_path):
+    add_events(server, 12)
+    server.add_calendar("/calendars/user/todos/", "Todos")
+    server.add_object("/calendars/user/todos/todo.ics",
+                      TODO.format(uid="todo", extra=""))
+    principal = await Principal(calendar.client, server.url).ainit()
+    archive = Archive(str(tmp_path / "backup.db"), batch_size=5)
+
+    report = await archive.backup(principal)
+    assert (report.calendars, report.fetched, report.unchanged) == (2, 13, 0)
+
+    # unchanged calendars are skipped without listing their objects
+    reports = server.count("REPORT")
+    report = await archive.backup(principal)
+    assert (report.unchanged, report.fetched) == (2, 0)
+    assert server.count("REPORT") == reports
+
+    # only the changes are fetched
+    objects = server.collections[CALENDAR].objects
+    server.add_object(CALENDAR + "event-001.ics",
+                      make_event("event-001", datetime(2019, 6, 1)))
+    del objects[CALENDAR + "event-002.ics"]
+    server.collections[CALENDAR].touch()
+    report = await archive.backup(principal)
+    assert (report.unchanged, report.fetched, report.deleted) == (1, 1, 1)
+
+    remote = await MemoryServer().start()
+    try:
+        client = DAVClient(remote.url)
+        target = await Principal(client, remote.url).ainit()
+        results = await archive.restore(target, source=principal)
+        assert [len(r.succeeded) for r in results.values()] == [11, 1]
+        assert remote.collections["/calendars/user/todos/"].name == "Todos"
+        assert sorted(remote.collections[CALENDAR].objects) == sorted(
+            objects)
+        assert "20190601" in remote.collections[CALENDAR].objects[
+            CALENDAR + "event-001.ics"].data
+
+        # objects already there are skipped
+        results = await archive.restore(target, source=principal)
+        assert [(len(r.skipped), len(r.failed))
+                for r in results.values()] == [(11, 0), (1, 0)]
+
+        # the same paths on another server are another backup
+        report = await archive.backup(target)
+        assert report.fetched == 12
+        assert len(archive.calendars(principal)) == 2
+        assert len(list(archive.objects(str(calendar.url)))) == 11
+    finally:
+        await remote.stop()
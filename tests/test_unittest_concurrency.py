@@ -0,0 +1,28 @@
+import asyncio
+
+import pytest
+
+from aiocaldav.lib.concurrency import chunked, gather_bounded
+
+
+@pytest.mark.asyncio
+async def test_gather_bounded():
+    running = []
+    peak = []
+
+    async def work(i):
+        running.append(i)
+        peak.append(len(running))
+        await asyncio.sleep(0.001)
+        running.remove(i)
+        return i * 2
+
+    assert await gather_bounded([work(i) for i in range(10)], 3) == \
+        [i * 2 for i in range(10)]
+    assert max(peak) == 3
+    assert await gather_bounded([work(i) for i in range(4)]) == [0, 2, 4, 6]
+
+
+def test_chunked():
+    assert chunked(range(5), 2) == [[0, 1], [2, 3], [4]]
+    assert chunked([], 2) == []
@@ -0,0 +1,67 @@
+"""DAVResponse parses XML bodies lazily, and only XML bodies"""
+import pytest
+
+from aiocaldav.davclient import DAVResponse, _NOT_PARSED
+
+MULTISTATUS = (b'<?xml version="1.0" encoding="utf-8"?>\n'
+               b'<D:multistatus xmlns:D="DAV:"><D:response>'
+               b'<D:href>/cal/</D:href></D:response></D:multistatus>')
+
+
+class FakeResponse:
+    def __init__(self, body, content_type=None, status=207):
+        self.body = body
+        self.headers = {}
+        if content_type:
+            self.headers['Content-Type'] = content_type
+        self.status = status
+        self.reason = "Multi-Status"
+
+    async def read(self):
+        return self.body
+
+
+async def load(body, content_type=None):
+    response = DAVResponse()
+    await response.load(FakeResponse(body, content_type))
+    return response
+
+
+@pytest.mark.asyncio
+async def test_xml_response():
+    response = await load(MULTISTATUS, 'application/xml; charset="utf-8"')
+    # nothing is parsed until the tree is needed
+    assert response._tree is _NOT_PARSED
+    assert response.tree.tag == '{DAV:}multistatus'
+    assert response.tree is response.tree
+
+
+@pytest.mark.asyncio
+async def test_calendar_response():
+    response = await load(b'BEGIN:VCALENDAR\r\nEND:VCALENDAR\r\n',
+                          'text/calendar; charset="utf-8"')
+    assert response.is_xml() is False
+    assert response.tree is None
+
+
+@pytest.mark.asyncio
+async def test_no_content_type():
+    assert (await load(MULTISTATUS)).tree is not None
+    assert (await load(b'')).tree is None
+    assert (await load(b'<broken')).tree is None
+
+
+@pytest.mark.asyncio
+async def test_no_entity_expansion():
+    body = (b'<?xml version="1.0"?><!DOCTYPE d [<!ENTITY e "expanded">]>'
+            b'<D:href xmlns:D="DAV:">&e;</D:href>')
+    response = await load(body, 'text/xml')
+    assert response.tree.text != 'expanded'
+
+
+@pytest.mark.asyncio
+async def test_parse_in_executor():
+    response = await load(MULTISTATUS, 'text/xml')
+    await response.parse_in_executor()
+    assert response._tree is not _NOT_PARSED
+    assert response.tree.tag == '{DAV:}multistatus'
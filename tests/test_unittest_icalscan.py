@@ -0,0 +1,88 @@
+"""Exercising the iCalendar header scanner"""
+import pickle
+
+from aiocaldav.lib import icalscan
+
+from .fixtures import get_one_static_file
+
+FOLDED = (
+    "BEGIN:VCALENDAR\r\n"
+    "VERSION:2.0\r\n"
+    "BEGIN:VTIMEZONE\r\n"
+    "TZID:Europe/Paris\r\n"
+    "BEGIN:STANDARD\r\n"
+    "DTSTART:19701025T030000\r\n"
+    "END:STANDARD\r\n"
+    "END:VTIMEZONE\r\n"
+    "BEGIN:VEVENT\r\n"
+    "UID:a-very-long-uid-that-has-been-folded-by-the-server-because-it-is-\r\n"
+    " longer-than-seventy-five-octets\r\n"
+    "SUMMARY;ALTREP=\"http://example.com/x:y\":Lunch\\, with friends\r\n"
+    "DTSTART;TZID=Europe/Paris:20200101T120000\r\n"
+    "DTEND;TZID=Europe/Paris:20200101T130000\r\n"
+    "BEGIN:VALARM\r\n"
+    "UID:alarm-uid\r\n"
+    "TRIGGER:-PT15M\r\n"
+    "END:VALARM\r\n"
+    "END:VEVENT\r\n"
+    "END:VCALENDAR\r\n")
+
+
+def test_scan_folded():
+    header = icalscan.scan(FOLDED, href="/cal/1.ics", etag='"1"')
+    assert header.uid == ("a-very-long-uid-that-has-been-folded-by-the-server-"
+                          "because-it-is-longer-than-seventy-five-octets")
+    assert header.component == "VEVENT"
+    assert header.summary == "Lunch, with friends"
+    assert header.dtstart == "20200101T120000"
+    assert header.dtend == "20200101T130000"
+    assert header.has_rrule is False
+    assert header.href == "/cal/1.ics"
+    assert header.etag == '"1"'
+
+
+def test_scan_bytes():
+    assert icalscan.scan(FOLDED.encode('utf-8')) == icalscan.scan(FOLDED)
+
+
+def test_scan_master_after_override():
+    # the override comes first, the master component must still win
+    data = get_one_static_file("event_ok_radicale_2.ics", full_path=False)
+    override, master = data.split("BEGIN:VEVENT")[2], data.split(
+        "BEGIN:VEVENT")[1]
+    data = data.split("BEGIN:VEVENT")[0] + "BEGIN:VEVENT" + override.replace(
+        "END:VCALENDAR", "") + "BEGIN:VEVENT" + master + "END:VCALENDAR\n"
+    header = icalscan.scan(data)
+    assert header.uid == "event2"
+    assert header.dtstart == "20130902T180000"
+    assert header.has_rrule is True
+    assert header.sequence == 1
+
+
+def test_scan_todo():
+    data = get_one_static_file("todo_ok_caldav_1.ics", full_path=False)
+    header = icalscan.scan(data)
+    assert header.component == "VTODO"
+    assert header.due == "20070501"
+    assert header.start_key == "20070501T000000"
+
+
+def test_end_key():
+    header = icalscan.scan(FOLDED.replace(
+        "DTEND;TZID=Europe/Paris:20200101T130000", "DURATION:P1W2DT1H"))
+    assert header.duration == "P1W2DT1H"
+    assert header.end_key == "20200110T130000"
+    assert icalscan.scan(FOLDED).end_key == "20200101T130000"
+    header.duration = "bogus"
+    assert header.end_key == header.start_key
+
+
+def test_scan_empty():
+    header = icalscan.scan(None)
+    assert header.uid is None
+    assert header.component is None
+
+
+def test_header_pickle():
+    header = icalscan.scan(FOLDED)
+    assert pickle.loads(pickle.dumps(header)) == header
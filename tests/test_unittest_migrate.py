@@ -0,0 +1,54 @@
+"""Calendar migrations against the in-memory server"""
+from datetime import datetime
+
+import pytest
+
+from aiocaldav import Migration
+from aiocaldav.objects import Calendar
+
+from .memoryserver import CALENDAR, add_events, make_event
+
+
+@pytest.mark.asyncio
+async def test_migration(server, calendar, tmp_path):
+    add_events(server, 30)
+    other = "/calendars/user/other/"
+    server.add_calendar(other)
+    target = Calendar(calendar.client, calendar.client.url.join(other))
+    checkpoint = str(tmp_path / "checkpoint.db")
+    server.failing.add(other + "event-007.ics")
+
+    report = await Migration(calendar, target, checkpoint=checkpoint,
+                             batch_size=7, queue_size=3).run()
+    assert (report.read, report.written, len(report.failed)) == (30, 29, 1)
+    assert report.failed[0][0] == CALENDAR + "event-007.ics"
+    assert sorted(server.collections[other].objects) == [
+        p.replace(CALENDAR, other)
+        for p in sorted(server.collections[CALENDAR].objects)
+        if not p.endswith("007.ics")]
+
+    # resuming only reads the objects not migrated, or changed since
+    server.failing.clear()
+    server.add_object(CALENDAR + "event-003.ics",
+                      make_event("event-003", datetime(2019, 2, 1)))
+    report = await Migration(calendar, target, checkpoint=checkpoint,
+                             overwrite=True).run()
+    assert (report.read, report.written) == (2, 2)
+    assert "20190201" in server.collections[other].objects[
+        other + "event-003.ics"].data
+    assert "objects/s" in str(report)
+
+    # UIDs rewritten consistently
+    server.add_calendar("/calendars/user/third/")
+    third = Calendar(calendar.client,
+                     calendar.client.url.join("/calendars/user/third/"))
+    migration = Migration(calendar, third, rewrite_uids=True,
+                          normalize=lambda data: data.replace("event", "\xe9"))
+    report = await migration.run()
+    assert report.written == 30
+    uid = migration.new_uid("event-000")
+    objects = server.collections["/calendars/user/third/"].objects
+    data = objects["/calendars/user/third/%s.ics" % uid].data
+    assert "UID:%s" % uid in data and "SUMMARY:\xe9-000" in data
+    assert report.bytes == sum(len(o.data.encode('utf-8'))
+                               for o in objects.values())
@@ -0,0 +1,51 @@
+"""The offline outbox against the in-memory server"""
+from datetime import datetime
+
+import pytest
+
+from aiocaldav.lib import error
+from aiocaldav import Outbox
+
+from .memoryserver import CALENDAR, make_event
+
+
+@pytest.mark.asyncio
+async def test_outbox(server, calendar):
+    calendar.client.outbox = outbox = Outbox(":memory:")
+    objects = server.collections[CALENDAR].objects
+    first = await calendar.add_event(make_event("first", datetime(2019, 1, 1)))
+    second = await calendar.add_event(
+        make_event("second", datetime(2019, 1, 2)))
+    await server.stop()
+
+    # the writes made offline are compacted per href
+    for summary in ("one", "two"):
+        first.instance.vevent.summary.value = summary
+        await first.save()
+    await second.delete()
+    gone = await calendar.add_event(make_event("gone", datetime(2019, 1, 4)))
+    await gone.delete()
+    await calendar.add_event(make_event("later", datetime(2019, 1, 5)))
+    # a later write keeps the place of the first one
+    first.instance.vevent.summary.value = "three"
+    await first.save()
+    operations = outbox.operations()
+    assert [(op.method, op.new) for op in operations] == [
+        ("PUT", False), ("DELETE", False), ("PUT", True)]
+    assert "SUMMARY:three" in operations[0].data
+
+    # still offline: nothing is lost
+    result = await outbox.replay(calendar.client, concurrency=1)
+    assert len(result.failed) == 1 and len(result.skipped) == 2
+    assert len(outbox) == 3
+
+    await server.start(server.port)
+    # an object changed meanwhile is not overwritten
+    server.add_object(first.url.path, objects[first.url.path].data)
+
+    result = await outbox.replay(calendar.client)
+    assert [r.ok for r in result] == [False, True, True]
+    assert isinstance(result[0].error, error.PutError)
+    assert len(outbox) == 0
+    assert second.url.path not in objects
+    assert "later" in str(list(objects))
@@ -0,0 +1,68 @@
+"""Query results parsed in a parse executor"""
+import copyreg
+import pickle
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+from dateutil import rrule
+from dateutil.tz import tz
+
+from aiocaldav.davclient import DAVClient
+from aiocaldav.elements import cdav
+from aiocaldav.lib import parsing
+from aiocaldav.lib.icalscan import ObjectHeader
+from aiocaldav.objects import Calendar, Event
+
+from .fixtures import get_one_static_file
+
+
+def results(count=100):
+    data = get_one_static_file("event_ok_caldav_1.ics", full_path=False)
+    return {'/cal/%d.ics' % i: {cdav.CalendarData.tag: data}
+            for i in range(count)}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("executor_class",
+                         [ThreadPoolExecutor, ProcessPoolExecutor])
+async def test_parse_executor(executor_class):
+    with executor_class(2) as executor:
+        client = DAVClient("http://calendar.example/",
+                           parse_executor=executor)
+        calendar = Calendar(client, "/cal/")
+        events = await calendar._objects_from_results(results(), Event)
+        headers = await calendar._objects_from_results(
+            results(), Event, headers_only=True)
+    assert [str(e.url) for e in events] == [
+        "http://calendar.example/cal/%d.ics" % i for i in range(100)]
+    assert all(e.instance.vevent.uid.value ==
+               "20010712T182145Z-123401@example.com" for e in events)
+    assert all(isinstance(h, ObjectHeader) for h in headers)
+    assert headers[42].href == "/cal/42.ics"
+
+
+@pytest.mark.asyncio
+async def test_process_pool_parses_timezones():
+    data = get_one_static_file("event_ok_radicale_1.ics", full_path=False)
+    with ProcessPoolExecutor(1) as executor:
+        client = DAVClient("http://calendar.example/",
+                           parse_executor=executor)
+        calendar = Calendar(client, "/cal/")
+        events = await calendar._objects_from_results(
+            {'/cal/1.ics': {cdav.CalendarData.tag: data}}, Event)
+    # parsed in the worker, timezones included
+    assert events[0]._instance is not None
+    expected = Event(client, data=data).instance
+    assert events[0].instance.serialize() == expected.serialize()
+    assert (events[0].instance.vevent.dtstart.value ==
+            expected.vevent.dtstart.value)
+
+
+def test_reducers_are_private():
+    # pickling outside of the parse workers is left alone
+    assert not set(copyreg.dispatch_table) & {
+        tz._tzicalvtz, rrule.rrule, rrule.rruleset}
+    data = get_one_static_file("event_ok_radicale_1.ics", full_path=False)
+    fixed, instance = pickle.loads(parsing.parse_chunk_pickled(
+        [('/cal/1.ics', data, None)]))[0]
+    assert instance.serialize() == Event(None, data=data).instance.serialize()
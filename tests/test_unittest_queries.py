@@ -0,0 +1,569 @@
+"""
+Calendar queries against the in-memory server of tests/memoryserver.py,
+no docker backend needed.
+"""
+import asyncio
+import gzip
+import io
+from datetime import datetime, timedelta
+
+import aiohttp
+import pytest
+import vobject
+
+from aiocaldav.davclient import DAVClient
+from aiocaldav.lib import error
+from aiocaldav import UidIndex, WriteBehind
+from aiocaldav.objects import Calendar, Principal, Projection
+
+from .memoryserver import (CALENDAR, TODO, MemoryServer, add_events,
+                           make_event)
+
+
+@pytest.mark.asyncio
+async def test_iter_date_search(server, calendar):
+    add_events(server, 100, step=3)
+    # spans the 2019-01-31 window boundary
+    server.add_object(CALENDAR + "long.ics", make_event(
+        "long", datetime(2019, 1, 30), hours=72))
+
+    found = [e async for e in calendar.iter_date_search(
+        datetime(2019, 1, 1), datetime(2020, 1, 1), concurrency=3)]
+    uids = [e.instance.vevent.uid.value for e in found]
+    assert len(uids) == len(set(uids)) == 101
+    starts = [e.instance.vevent.dtstart.value for e in found]
+    assert starts == sorted(starts)
+    assert server.count('REPORT') == 13
+
+    headers = [h async for h in calendar.iter_date_search(
+        datetime(2019, 1, 1), datetime(2019, 3, 1), headers_only=True)]
+    assert [h.uid for h in headers] == \
+        [e.instance.vevent.uid.value for e in found[:len(headers)]]
+
+
+@pytest.mark.asyncio
+async def test_iter_date_search_duration(server, calendar):
+    server.add_object(CALENDAR + "duration.ics", make_event(
+        "duration", datetime(2019, 1, 1)).replace(
+            "DTEND:20190101T010000Z", "DURATION:P10D"))
+    found = [e async for e in calendar.iter_date_search(
+        datetime(2019, 1, 1), datetime(2019, 1, 15),
+        window=timedelta(days=2))]
+    assert len(found) == 1
+
+
+@pytest.mark.asyncio
+async def test_iter_date_search_early_exit(server, calendar):
+    add_events(server, 100, step=3)
+    gen = calendar.iter_date_search(
+        datetime(2019, 1, 1), datetime(2020, 1, 1), concurrency=2)
+    first = await gen.__anext__()
+    await gen.aclose()
+    assert first.instance.vevent.uid.value == "event-000"
+    # only the first windows were requested
+    assert server.count('REPORT') <= 3
+
+
+@pytest.mark.asyncio
+async def test_date_search_limit(server, calendar):
+    add_events(server, 50)
+    hrefs = set()
+    page = await calendar.date_search(
+        datetime(2019, 1, 1), datetime(2020, 1, 1), limit=8)
+    pages = 1
+    while True:
+        assert 0 < len(page) <= 8
+        hrefs.update(str(e.url) for e in page)
+        if page.cursor is None:
+            break
+        page = await page.cursor.next_page()
+        pages += 1
+    assert len(hrefs) == 50
+    assert pages >= 7
+
+
+@pytest.mark.asyncio
+async def test_truncated_results(server, calendar):
+    add_events(server, 20)
+    server.max_results = 5
+    # only a paged search can go on after a truncated response
+    with pytest.raises(error.ReportError):
+        await calendar.date_search(datetime(2019, 1, 1),
+                                   datetime(2020, 1, 1))
+    page = await calendar.events(limit=10)
+    assert len(page) == 10 and page.cursor is not None
+
+
+@pytest.mark.asyncio
+async def test_events_limit_without_server_support(server, calendar):
+    add_events(server, 20)
+    server.support_limit = False
+    page = await calendar.events(limit=15, headers_only=True)
+    assert len(page) == 15
+    assert server.count('REPORT') == 1
+    page = await page.cursor.next_page()
+    assert len(page) == 5
+    assert page.cursor is None
+    assert server.count('REPORT') == 1
+
+
+@pytest.mark.asyncio
+async def test_todos_limit(server, calendar):
+    todo = ("BEGIN:VCALENDAR\nVERSION:2.0\nPRODID:-//x//y//EN\n"
+            "BEGIN:VTODO\nUID:todo-%d\nDTSTAMP:20190101T000000Z\n"
+            "DUE:201902%02dT000000Z\n%sEND:VTODO\nEND:VCALENDAR\n")
+    for i in range(12):
+        status = ("STATUS:NEEDS-ACTION\n", "", "STATUS:CANCELLED\n")[i % 3]
+        server.add_object(CALENDAR + "todo-%d.ics" % i,
+                          todo % (i, i + 1, status))
+    uids = []
+    page = await calendar.todos(limit=3, headers_only=True)
+    while True:
+        uids += [h.uid for h in page]
+        if page.cursor is None:
+            break
+        page = await page.cursor.next_page()
+    assert sorted(uids) == sorted("todo-%d" % i for i in range(12)
+                                  if i % 3 != 2)
+
+
+@pytest.mark.asyncio
+async def test_projection(server, calendar):
+    data = make_event("projected", datetime(2019, 1, 1)).replace(
+        "SUMMARY:projected\n",
+        "SUMMARY:projected\nDESCRIPTION:%s\nBEGIN:VALARM\nACTION:DISPLAY\n"
+        "TRIGGER:-PT15M\nEND:VALARM\n" % ("x" * 1000))
+    server.add_object(CALENDAR + "projected.ics", data)
+    projection = Projection({"VEVENT": ("DTSTART", "SUMMARY")})
+
+    events = await calendar.events(projection=projection)
+    vevent = events[0].instance.vevent
+    assert vevent.uid.value == "projected"
+    assert vevent.summary.value == "projected"
+    assert not hasattr(vevent, "description")
+    assert not hasattr(vevent, "dtend")
+    assert not hasattr(vevent, "valarm")
+
+    found = await calendar.date_search(
+        datetime(2018, 12, 1), datetime(2019, 2, 1), projection=projection,
+        headers_only=True)
+    assert found[0].summary == "projected"
+    assert found[0].dtend is None
+
+    # partial data is never written back
+    requests = len(server.requests)
+    assert events[0].partial
+    with pytest.raises(error.PutError):
+        await events[0].save()
+    result = await calendar.save_many(events)
+    assert isinstance(result[0].error, error.PutError)
+    calendar.client.write_behind = WriteBehind(delay=0)
+    try:
+        with pytest.raises(error.PutError):
+            await events[0].save()
+    finally:
+        calendar.client.write_behind = None
+    assert len(server.requests) == requests
+    await events[0].load()
+    assert not events[0].partial
+    assert events[0].instance.vevent.description.value == "x" * 1000
+    await events[0].save()
+
+
+@pytest.mark.asyncio
+async def test_etags(server, calendar):
+    add_events(server, 3)
+    etags = {path: obj.etag for path, obj in
+             server.collections[CALENDAR].objects.items()}
+
+    events = await calendar.events()
+    assert {e.url.path: e.etag for e in events} == etags
+    headers = await calendar.date_search(
+        datetime(2019, 1, 1), datetime(2019, 2, 1), headers_only=True)
+    assert {h.href: h.etag for h in headers} == etags
+    event = await calendar.event_by_uid("event-001")
+    assert event.etag == etags[CALENDAR + "event-001.ics"]
+
+    event.instance.vevent.summary.value = "changed"
+    await event.save()
+    assert event.etag == \
+        server.collections[CALENDAR].objects[event.url.path].etag
+    assert event.etag != etags[CALENDAR + "event-001.ics"]
+    reloaded = await calendar.event_by_url(event.url)
+    assert reloaded.etag == event.etag
+
+
+JOURNAL = """BEGIN:VCALENDAR
+VERSION:2.0
+PRODID:-//Example Corp.//CalDAV Client//EN
+BEGIN:VJOURNAL
+UID:{uid}
+DTSTAMP:20190101T000000Z
+DTSTART;VALUE=DATE:20190101
+SUMMARY:{uid}
+END:VJOURNAL
+END:VCALENDAR
+"""
+
+
+def add_mixed(server):
+    add_events(server, 3)
+    for i in range(2):
+        server.add_object(CALENDAR + "todo-%d.ics" % i, TODO.format(
+            uid="todo-%d" % i, extra=""))
+    server.add_object(CALENDAR + "journal.ics", JOURNAL.format(uid="journal"))
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("anyof", [True, False])
+async def test_objects(server, calendar, anyof):
+    add_mixed(server)
+    server.support_anyof = anyof
+
+    found = await calendar.objects(["VEVENT", "VTODO"])
+    assert sorted(type(o).__name__ for o in found) == \
+        ["Event"] * 3 + ["Todo"] * 2
+    assert calendar.client.supports_anyof is anyof
+    reports = server.count('REPORT')
+    # without anyof support: the query, the probe and the fallbacks
+    assert reports == (1 if anyof else 4)
+
+    # the outcome is remembered
+    await calendar.objects(["VEVENT", "VTODO"], headers_only=True)
+    assert server.count('REPORT') - reports == (1 if anyof else 2)
+
+    found = await calendar.objects()
+    assert sorted(type(o).__name__ for o in found) == \
+        ["Event"] * 3 + ["Journal"] + ["Todo"] * 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("anyof", [True, False])
+async def test_anyof_empty_results(server, calendar, anyof):
+    server.support_anyof = anyof
+    # empty calendar: nothing to find out, no fallbacks
+    assert await calendar.objects(["VTODO", "VJOURNAL"]) == []
+    assert calendar.client.supports_anyof is None
+    assert server.count('REPORT') == 2
+
+    # no match is not taken for a lack of support
+    add_events(server, 3)
+    assert await calendar.objects(["VTODO", "VJOURNAL"]) == []
+    assert calendar.client.supports_anyof is anyof
+    assert server.count('REPORT') == (4 if anyof else 6)
+    await calendar.objects(["VTODO", "VJOURNAL"])
+    assert server.count('REPORT') == (5 if anyof else 8)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("anyof", [True, False])
+async def test_todos_pending(server, calendar, anyof):
+    server.support_anyof = anyof
+    extras = ["STATUS:NEEDS-ACTION\nDUE:20190301T000000Z\n",
+              "DUE:20190201T000000Z\n",
+              "STATUS:CANCELLED\n",
+              "STATUS:COMPLETED\nCOMPLETED:20190101T000000Z\n",
+              "PRIORITY:1\n"]
+    for i, extra in enumerate(extras):
+        server.add_object(CALENDAR + "todo-%d.ics" % i, TODO.format(
+            uid="todo-%d" % i, extra=extra))
+
+    todos = await calendar.todos()
+    assert [t.instance.vtodo.uid.value for t in todos] == \
+        ["todo-1", "todo-0", "todo-4"]
+    assert server.count('REPORT') == (1 if anyof else 4)
+
+    todos = await calendar.todos(sort_keys=('isnt_overdue', 'priority'))
+    assert [t.instance.vtodo.uid.value for t in todos] == \
+        ["todo-0", "todo-1", "todo-4"]
+    todos = await calendar.todos(include_completed=True, headers_only=True)
+    assert len(todos) == 5
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("anyof", [True, False])
+async def test_objects_by_uids(server, calendar, anyof):
+    add_mixed(server)
+    add_events(server, 30, start=datetime(2019, 6, 1))
+    server.support_anyof = anyof
+    uids = ["event-%03d" % i for i in range(0, 30, 2)] + \
+        ["todo-1", "journal", "missing", "event-0"]
+
+    server.delays[CALENDAR] = 0.01
+    found = await calendar.objects_by_uids(uids, chunk_size=4,
+                                           concurrency=3)
+    assert sorted(found) == sorted(uids[:-2])
+    assert found["todo-1"].instance.vtodo.uid.value == "todo-1"
+    assert type(found["journal"]).__name__ == "Journal"
+    # one limit for the chunks and their fallbacks
+    assert server.max_in_flight <= 3
+    if anyof:
+        assert server.count('REPORT') == 5
+    else:
+        # one fallback per UID and component type, each filtering on
+        # the UID inside a component
+        fallbacks = [body for method, _, body in server.requests
+                     if method == 'REPORT' and b'anyof' not in body]
+        assert len(fallbacks) == 19 * 4
+        assert all(b'<C:comp-filter name="V' in body.split(b'VCALENDAR')[1]
+                   for body in fallbacks)
+    del server.delays[CALENDAR]
+
+    found = await calendar.objects_by_uids(
+        ["event-001", "todo-0"], compfilter="VEVENT", headers_only=True)
+    assert list(found) == ["event-001"]
+    assert found["event-001"].uid == "event-001"
+
+
+@pytest.mark.asyncio
+async def test_uid_index(server, calendar):
+    add_mixed(server)
+    calendar.uid_index = UidIndex()
+    await calendar.objects()
+    assert len(calendar.uid_index) == 6
+    assert calendar.uid_index.get("todo-1") == CALENDAR + "todo-1.ics"
+
+    reports = server.count('REPORT')
+    event = await calendar.event_by_uid("event-001")
+    assert event.instance.vevent.uid.value == "event-001"
+    assert event.etag is not None
+    assert server.count('REPORT') == reports
+    assert server.count('GET') == 1
+
+    # several UIDs: one multiget
+    found = await calendar.objects_by_uids(["event-000", "todo-0"])
+    assert sorted(found) == ["event-000", "todo-0"]
+    assert server.count('REPORT') == reports + 1
+
+    # stale entry: the object moved to another href
+    data = server.collections[CALENDAR].objects.pop(CALENDAR + "todo-0.ics")
+    server.add_object(CALENDAR + "moved.ics", data.data)
+    todo = await calendar.todo_by_uid("todo-0")
+    assert todo.url.path == CALENDAR + "moved.ics"
+    assert calendar.uid_index.get("todo-0") == CALENDAR + "moved.ics"
+
+    # save and delete keep the index up to date
+    new = await calendar.add_event(make_event("new", datetime(2019, 5, 1)))
+    assert calendar.uid_index.get("new") == new.url.path
+    await new.delete()
+    assert "new" not in calendar.uid_index
+
+
+@pytest.mark.asyncio
+async def test_principal_date_search(server):
+    client = DAVClient(server.url)
+    principal = await Principal(client, server.url).ainit()
+    paths = ["/calendars/user/cal%d/" % i for i in range(3)]
+    for i, path in enumerate(paths):
+        server.add_calendar(path)
+        for j in range(5):
+            server.add_object(path + "event-%d.ics" % j, make_event(
+                "event-%d-%d" % (i, j), datetime(2019, 1, 1 + i + 3 * j)))
+    server.add_calendar("/calendars/user/broken/")
+    server.failing.add("/calendars/user/broken/")
+    errors = []
+
+    found = [e async for e in principal.date_search(
+        datetime(2019, 1, 1), datetime(2019, 2, 1), concurrency=2,
+        on_error=lambda calendar, e: errors.append(calendar.url.path))]
+    starts = [e.instance.vevent.dtstart.value for e in found]
+    assert len(found) == 15
+    assert starts == sorted(starts)
+    assert errors == ["/calendars/user/broken/"]
+
+
+@pytest.mark.asyncio
+async def test_principal_find_by_uid(server):
+    client = DAVClient(server.url)
+    principal = await Principal(client, server.url).ainit()
+    for i in range(4):
+        path = "/calendars/user/cal%d/" % i
+        server.add_calendar(path)
+        server.add_object(path + "event.ics", make_event(
+            "event-%d" % i, datetime(2019, 1, 1)))
+    server.delays["/calendars/user/cal3/"] = 0.5
+
+    started = asyncio.get_running_loop().time()
+    event = await principal.find_by_uid("event-1")
+    assert event.instance.vevent.uid.value == "event-1"
+    assert event.parent.url.path == "/calendars/user/cal1/"
+    # the slow calendar was not waited for
+    assert asyncio.get_running_loop().time() - started < 0.4
+
+    del server.delays["/calendars/user/cal3/"]
+    with pytest.raises(error.NotFoundError):
+        await principal.find_by_uid("missing")
+    reports = server.count('REPORT')
+    with pytest.raises(error.NotFoundError):
+        await principal.find_by_uid("missing")
+    assert server.count('REPORT') == reports
+
+
+@pytest.mark.asyncio
+async def test_prune(server):
+    client = DAVClient(server.url)
+    principal = await Principal(client, server.url).ainit()
+    for i in range(4):
+        server.add_calendar("/calendars/user/cal%d/" % i)
+    server.failing.add("/calendars/user/cal1/")
+
+    result = await principal.prune(concurrency=1)
+    assert [r.item.url.path for r in result.failed] == [
+        "/calendars/user/cal1/"]
+    # the deletions not started yet were not sent
+    assert set(r.item.url.path for r in result.skipped) | {
+        "/calendars/user/cal1/"} == set(
+            p for p in server.collections if p.startswith("/calendars/"))
+
+    server.failing.clear()
+    result = await principal.prune()
+    assert not result.failed
+    assert not [p for p in server.collections if p.startswith("/calendars/")]
+
+
+@pytest.mark.asyncio
+async def test_bulk(server, calendar):
+    icals = [make_event("bulk-%d" % i, datetime(2019, 1, 1 + i))
+             for i in range(20)]
+    icals.insert(5, TODO.format(uid="bulk-todo", extra=""))
+    progress = []
+
+    result = await calendar.add_many(
+        icals, concurrency=4, progress=lambda done, total: progress.append(
+            (done, total)))
+    assert len(result.succeeded) == 21
+    assert type(result[5].value).__name__ == "Todo"
+    assert progress[-1] == (21, 21)
+    assert len(server.collections[CALENDAR].objects) == 21
+
+    # objects that already exist fail, the others go through
+    result = await calendar.add_many(
+        [icals[0], make_event("bulk-new", datetime(2019, 3, 1))])
+    assert [r.ok for r in result] == [False, True]
+    assert isinstance(result[0].error, error.PutError)
+
+    result = await calendar.add_many(
+        icals[:4], concurrency=1, stop_on_error=True)
+    assert len(result.failed) == 1
+    assert len(result.skipped) == 3
+
+    events = await calendar.events()
+    result = await calendar.save_many(events, concurrency=3)
+    assert len(result.succeeded) == 21
+
+    result = await calendar.delete_many(
+        [e.url for e in events[:10]] + events[10:], concurrency=5)
+    assert len(result.succeeded) == 21
+    assert len(server.collections[CALENDAR].objects) == 1
+
+
+@pytest.mark.asyncio
+async def test_shared_session(server):
+    async with aiohttp.ClientSession() as session:
+        client = DAVClient(server.url, session=session)
+        calendar = Calendar(client, client.url.join(CALENDAR))
+        await calendar.add_event(make_event("shared", datetime(2019, 1, 1)))
+        assert len(await calendar.events()) == 1
+        assert not session.closed
+
+
+@pytest.mark.asyncio
+async def test_copy_move(server, calendar):
+    other = "/calendars/user/other/"
+    server.add_calendar(other)
+    target = Calendar(calendar.client, calendar.client.url.join(other))
+    event = await calendar.add_event(make_event("moved", datetime(2019, 1, 1)))
+    name = event.url.path.rsplit('/', 1)[1]
+
+    # same server: the data does not go through the client
+    copy = await event.copy_to(target)
+    assert copy.url.path == other + name
+    assert isinstance(copy, type(event)) and copy.data == event.data
+    assert server.count("COPY") == 1 and server.count("GET") == 0
+    with pytest.raises(error.CopyError):
+        await event.copy_to(target)
+    await event.copy_to(target, overwrite=True)
+    await event.move_to(target, overwrite=True)
+    assert server.count("PUT") == 1
+    assert list(server.collections[CALENDAR].objects) == []
+    assert list(server.collections[other].objects) == [other + name]
+
+    # a copy of projected data is as partial as its source
+    projected = (await target.events(
+        projection=Projection({"VEVENT": ("SUMMARY", )})))[0]
+    copy = await projected.copy_to(calendar)
+    assert copy.partial
+    with pytest.raises(error.PutError):
+        await copy.save()
+
+    # another server: downloaded and uploaded
+    remote = await MemoryServer().start()
+    try:
+        remote.add_calendar(CALENDAR)
+        client = DAVClient(remote.url)
+        remote_calendar = Calendar(client, client.url.join(CALENDAR))
+        source = type(event)(target.client, url=target.url.join(name),
+                             parent=target)
+        moved = await source.move_to(remote_calendar)
+        assert moved.etag is not None and moved.client is client
+        assert list(remote.collections[CALENDAR].objects) == [
+            CALENDAR + name]
+        assert server.collections[other].objects == {}
+    finally:
+        await remote.stop()
+
+
+TZ_EVENT = """BEGIN:VCALENDAR
+VERSION:2.0
+PRODID:-//Example Corp.//CalDAV Client//EN
+BEGIN:VTIMEZONE
+TZID:Europe/Paris
+BEGIN:STANDARD
+DTSTART:19701025T030000
+TZOFFSETFROM:+0200
+TZOFFSETTO:+0100
+END:STANDARD
+END:VTIMEZONE
+BEGIN:VEVENT
+UID:{uid}
+DTSTAMP:20060712T182145Z
+DTSTART;TZID=Europe/Paris:20190101T100000
+SUMMARY:{uid}
+BEGIN:VALARM
+ACTION:DISPLAY
+TRIGGER:-PT15M
+END:VALARM
+END:VEVENT
+END:VCALENDAR
+"""
+
+
+@pytest.mark.asyncio
+async def test_export(server, calendar, monkeypatch):
+    add_events(server, 5)
+    for i in range(7):
+        server.add_object(CALENDAR + "tz-%d.ics" % i,
+                          TZ_EVENT.format(uid="tz-%d" % i))
+    # the calendar data is copied without building objects
+    monkeypatch.delattr(Calendar, "_objects_from_results")
+
+    out = io.BytesIO()
+    assert await calendar.export(out, batch_size=3) == 12
+    data = out.getvalue().decode('utf-8')
+    assert data.count("BEGIN:VCALENDAR") == 1
+    assert data.count("BEGIN:VTIMEZONE") == 1
+    assert data.count("BEGIN:VEVENT") == 12
+    assert data.count("BEGIN:VALARM") == 7
+    parsed = vobject.readOne(data)
+    assert len(parsed.vevent_list) == 12
+
+    compressed = io.BytesIO()
+    await calendar.export(compressed, gzip=True)
+    assert gzip.decompress(compressed.getvalue()) == out.getvalue()
+
+    server.add_calendar("/calendars/user/empty/")
+    empty = Calendar(calendar.client,
+                     calendar.client.url.join("/calendars/user/empty/"))
+    out = io.BytesIO()
+    assert await empty.export(out) == 0
+    assert vobject.readOne(out.getvalue().decode('utf-8'))
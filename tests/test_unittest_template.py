@@ -0,0 +1,80 @@
+"""Pre-serialized request bodies must match the element trees they replace"""
+import asyncio
+import datetime
+
+import pytz
+from lxml import etree
+
+from aiocaldav import objects
+from aiocaldav.elements import cdav, dav
+from aiocaldav.elements.template import Template, slot
+from aiocaldav.lib.url import URL
+
+
+def serialize(root):
+    return etree.tostring(root.xmlelement(), encoding="utf-8",
+                          xml_declaration=True)
+
+
+def test_static_template():
+    root = cdav.CalendarQuery() + [
+        dav.Prop() + [dav.GetEtag(), cdav.CalendarData()],
+        cdav.Filter() + (cdav.CompFilter("VCALENDAR") +
+                         cdav.CompFilter("VEVENT"))]
+    assert objects._comp_query_template("VEVENT").render() == serialize(root)
+
+
+def test_date_search_template():
+    start = datetime.datetime(2020, 1, 1, tzinfo=pytz.utc)
+    end = datetime.datetime(2020, 2, 1, tzinfo=pytz.utc)
+    root = cdav.CalendarQuery() + [
+        dav.Prop() + [dav.GetEtag(),
+                      cdav.CalendarData() + cdav.Expand(start, end)],
+        cdav.Filter() + (cdav.CompFilter("VCALENDAR") + (
+            cdav.CompFilter("VEVENT") + cdav.TimeRange(start, end)))]
+    body = objects._date_search_template("VEVENT", True, True).render(
+        start="20200101T000000Z", end="20200201T000000Z")
+    assert body == serialize(root)
+
+
+def test_slot_escaping():
+    template = Template(cdav.PropFilter("UID") + cdav.TextMatch(slot('uid')))
+    uid = 'a<b>&"c"'
+    tree = etree.XML(template.render(uid=uid))
+    assert tree[0].text == uid
+
+
+def test_page_template():
+    root = cdav.CalendarQuery() + [
+        dav.Prop() + [dav.GetEtag(), cdav.CalendarData()],
+        cdav.Filter() + (cdav.CompFilter("VCALENDAR") + (
+            cdav.CompFilter("VEVENT") +
+            cdav.TimeRange(end="20200201T000000Z"))),
+        cdav.Limit() + cdav.NResults("50")]
+    body = objects._page_template(
+        ("VEVENT", None), False, True, True).render(
+            start=None, end="20200201T000000Z", limit="50")
+    assert body == serialize(root)
+
+
+class _RecordingClient:
+    url = URL("http://example.com/")
+
+    def __init__(self):
+        self.bodies = []
+
+    async def propfind(self, url, body, depth):
+        self.bodies.append(body)
+        return type("Response", (), {"status": 207})()
+
+
+def test_propfind_keeps_attributes():
+    client = _RecordingClient()
+    obj = objects.DAVObject(client, url="http://example.com/cal/")
+    named = cdav.Comp("VEVENT")
+    asyncio.run(obj._query_properties([named]))
+    props = etree.fromstring(client.bodies[0])[0]
+    assert props[0].get("name") == "VEVENT"
+    plain = [dav.DisplayName()]
+    asyncio.run(obj._query_properties(plain))
+    assert client.bodies[1] == serialize(dav.Propfind() + (dav.Prop() + plain))
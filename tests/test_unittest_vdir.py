@@ -0,0 +1,113 @@
+"""Vdir synchronization against the in-memory server"""
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from aiocaldav import VdirSync
+
+from .memoryserver import CALENDAR, add_events, make_event
+
+
+@pytest.mark.asyncio
+async def test_vdir_sync(server, calendar, tmp_path):
+    add_events(server, 5)
+    objects = server.collections[CALENDAR].objects
+    vdir = tmp_path / "vdir"
+    vdir.mkdir()
+    status = str(tmp_path / "status.db")
+    sync = VdirSync(calendar, str(vdir), status)
+
+    report = await sync.sync()
+    assert report.downloaded == 5
+    assert sorted(p.name for p in vdir.iterdir()) == [
+        "event-%03d.ics" % i for i in range(5)]
+
+    # nothing to do: no listing, no transfer
+    requests = len(server.requests)
+    report = await sync.sync()
+    assert (report.downloaded, report.uploaded) == (0, 0)
+    assert [r[0] for r in server.requests[requests:]] == ["PROPFIND"]
+
+    (vdir / "event-001.ics").write_text(
+        make_event("event-001", datetime(2019, 7, 1), hours=10))
+    (vdir / "local.ics").write_text(make_event("local", datetime(2019, 7, 2)))
+    (vdir / "event-002.ics").unlink()
+    server.add_object(CALENDAR + "event-003.ics",
+                      make_event("event-003", datetime(2019, 8, 1), hours=10))
+    del objects[CALENDAR + "event-004.ics"]
+    server.collections[CALENDAR].touch()
+    report = await sync.sync()
+    assert (report.uploaded, report.downloaded, report.deleted_remote,
+            report.deleted_local) == (2, 1, 1, 1)
+    assert sorted(objects) == [CALENDAR + name for name in (
+        "event-000.ics", "event-001.ics", "event-003.ics", "local.ics")]
+    assert "20190701" in objects[CALENDAR + "event-001.ics"].data
+    assert "20190801" in (vdir / "event-003.ics").read_text()
+    assert not (vdir / "event-004.ics").exists()
+
+    # changes on both sides
+    (vdir / "event-000.ics").write_text(
+        make_event("event-000", datetime(2019, 9, 1), hours=10))
+    server.add_object(CALENDAR + "event-000.ics",
+                      make_event("event-000", datetime(2019, 10, 1)))
+    for _ in range(2):
+        report = await sync.sync()
+        assert report.conflicts == ["event-000.ics"]
+    sync.close()
+    report = await VdirSync(calendar, str(vdir), status,
+                            conflict="remote").sync()
+    assert report.downloaded == 1 and not report.conflicts
+    assert "20191001" in (vdir / "event-000.ics").read_text()
+    with pytest.raises(ValueError):
+        VdirSync(calendar, str(vdir), status, conflict="newest")
+
+
+
+@pytest.mark.asyncio
+async def test_vdir_sync_names(server, calendar, tmp_path):
+    objects = server.collections[CALENDAR].objects
+    for name in ("plain.ics", "noext", "with space.ics", "blocked.ics"):
+        server.add_object(CALENDAR + name, make_event(name, datetime(2019, 1, 1)))
+    vdir = tmp_path / "vdir"
+    vdir.mkdir()
+    (vdir / "blocked.ics").mkdir()
+    sync = VdirSync(calendar, str(vdir), str(tmp_path / "status.db"))
+
+    # odd hrefs get hashed .ics names, a file failing to be written is
+    # reported and does not stop the others
+    report = await sync.sync()
+    assert report.downloaded == 3
+    assert [name for name, _ in report.failed] == ["blocked.ics"]
+    files = sorted(p.name for p in vdir.iterdir() if p.is_file())
+    assert len(files) == 3 and "plain.ics" in files
+    assert all(name.endswith(".ics") for name in files)
+
+    # the objects of unusual names are not taken for local deletions
+    (vdir / "blocked.ics").rmdir()
+    report = await sync.sync()
+    assert report.downloaded == 1 and not report.failed
+    assert server.count("DELETE") == 0 and len(objects) == 4
+
+    # a change made while uploading is uploaded by the next sync
+    (vdir / "plain.ics").write_text(
+        make_event("plain.ics", datetime(2019, 2, 1)))
+    server.delays[CALENDAR + "plain.ics"] = 0.1
+    task = asyncio.ensure_future(sync.sync())
+    await asyncio.sleep(0.05)
+    (vdir / "plain.ics").write_text(
+        make_event("plain.ics", datetime(2019, 3, 1), hours=10))
+    assert (await task).uploaded == 1
+    assert (await sync.sync()).uploaded == 1
+    assert "20190301" in objects[CALENDAR + "plain.ics"].data
+
+    # local names needing quoting in URLs keep their file
+    names = ["my event.ics", "\xe9t\xe9.ics"]
+    for name in names:
+        (vdir / name).write_text(make_event(name, datetime(2019, 4, 1)))
+    assert (await sync.sync()).uploaded == 2
+    assert CALENDAR + "my event.ics" in objects
+    report = await sync.sync()
+    assert (report.uploaded, report.downloaded, report.deleted_local,
+            report.deleted_remote) == (0, 0, 0, 0)
+    assert all((vdir / name).exists() for name in names)
@@ -0,0 +1,85 @@
+"""Write-behind saves against the in-memory server"""
+import asyncio
+from datetime import datetime
+
+import pytest
+import vobject
+
+from aiocaldav.davclient import DAVClient
+from aiocaldav.lib import error
+from aiocaldav import WriteBehind
+from aiocaldav.objects import Calendar
+
+from .memoryserver import CALENDAR, make_event
+
+
+@pytest.mark.asyncio
+async def test_write_behind(server):
+    client = DAVClient(server.url)
+    calendar = Calendar(client, client.url.join(CALENDAR))
+    errors = []
+    client.write_behind = WriteBehind(
+        delay=0.05, on_error=lambda obj, e: errors.append((obj, e)))
+
+    # creation and updates within the window become one PUT
+    event = await calendar.add_event(make_event("wb", datetime(2019, 1, 1)))
+    assert server.count("PUT") == 0
+    for summary in ("one", "two", "three"):
+        event.instance.vevent.summary.value = summary
+        await event.save()
+    assert len(client.write_behind) == 1
+    await client.write_behind.flush()
+    assert server.count("PUT") == 1
+    assert "SUMMARY:three" in server.collections[CALENDAR].objects[
+        event.url.path].data
+
+    # the timer flushes on its own
+    event.instance.vevent.summary.value = "four"
+    future = client.write_behind.save(event)
+    assert await asyncio.wait_for(future, 1) is event
+    assert server.count("PUT") == 2
+
+    # writes to one URL wait for the one in flight
+    server.delays[event.url.path] = 0.1
+    event.instance.vevent.summary.value = "five"
+    first = client.write_behind.save(event)
+    await asyncio.sleep(0.07)
+    event.instance.vevent.summary.value = "six"
+    await event.save()
+    await client.write_behind.flush()
+    assert first.done()
+    assert "SUMMARY:six" in server.collections[CALENDAR].objects[
+        event.url.path].data
+
+    # errors go to the callback and to the future
+    server.failing.add(event.url.path)
+    future = client.write_behind.save(event)
+    await client.write_behind.flush()
+    assert len(errors) == 1 and errors[0][0] is event
+    assert isinstance(future.exception(), error.PutError)
+
+    await client.write_behind.aclose()
+    with pytest.raises(RuntimeError):
+        await event.save()
+
+
+@pytest.mark.asyncio
+async def test_write_behind_future(server, calendar, caplog):
+    calendar.client.write_behind = WriteBehind(delay=0.01)
+    event = await calendar.add_event(make_event("wb", datetime(2019, 1, 1)))
+    assert await event.saving is event
+    assert server.count("PUT") == 1
+
+    # objects built from a vobject
+    event = await calendar.add_event(vobject.readOne(
+        make_event("wb-vobject", datetime(2019, 1, 2))))
+    assert await event.saving is event
+    assert server.count("PUT") == 2
+
+    # without on_error, failures are logged
+    server.failing.add(event.url.path)
+    await event.save()
+    with pytest.raises(error.PutError):
+        await event.saving
+    assert "write-behind save of %s failed" % event.url in caplog.text
+    await calendar.client.write_behind.aclose()